@@ -0,0 +1,64 @@
+import asyncio, functools, os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from langchain_core.tools import StructuredTool
+from telemetry import log_event, run_in_context, span
+
+
+TOOL_TIMEOUT_DEFAULT = float(os.getenv("TOOL_TIMEOUT_DEFAULT", "20"))
+
+# Sync calls run here so they can be abandoned on timeout instead of blocking the turn
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("TOOL_THREADS", "16")), thread_name_prefix="tool")
+
+
+def _timeout_message(name: str, timeout: float) -> str:
+    return f"Error: the tool {name} did not answer within {timeout:g} seconds."
+
+
+def with_timeout(fn, timeout: float = TOOL_TIMEOUT_DEFAULT) -> StructuredTool:
+    """Wraps a plain tool function into a StructuredTool with sync and async entry points.
+
+    Name, description and argument schema come from `fn`. Both entry points
+    give up after `timeout` seconds and return an error text to the model,
+    so one hung upstream never stalls the whole agent turn. The async entry
+    point runs the blocking call in a thread, so several tool calls of one
+    turn proceed concurrently under `graph.ainvoke`.
+    """
+    base = StructuredTool.from_function(fn)
+
+    def run(**kwargs):
+        # The worker thread joins the request's trace, so HANA / LLM spans inside the tool count too
+        with span("tool", base.name):
+            future = _executor.submit(run_in_context(fn), **kwargs)
+            try:
+                return future.result(timeout=timeout)
+            except FutureTimeout:
+                log_event("tool_timeout", level="warning", tool=base.name, timeout=timeout)
+                return _timeout_message(base.name, timeout)
+
+    async def arun(**kwargs):
+        # Shared executor, not the loop's default one: asyncio.run() would wait for a hung call
+        with span("tool", base.name):
+            call = asyncio.get_running_loop().run_in_executor(
+                _executor, functools.partial(run_in_context(fn), **kwargs)
+            )
+            try:
+                return await asyncio.wait_for(call, timeout)
+            except asyncio.TimeoutError:
+                log_event("tool_timeout", level="warning", tool=base.name, timeout=timeout)
+                return _timeout_message(base.name, timeout)
+
+    return StructuredTool(
+        name=base.name,
+        description=base.description,
+        args_schema=base.args_schema,
+        func=run,
+        coroutine=arun,
+    )
+
+
+def build_tools(functions, timeouts=None):
+    timeouts = timeouts or {}
+    return [
+        with_timeout(fn, timeouts.get(fn.__name__, TOOL_TIMEOUT_DEFAULT))
+        for fn in functions
+    ]
@@ -0,0 +1,352 @@
+"""
+Stand-in for `hdbcli.dbapi` backed by a SQLite file.
+
+Only the HANA dialect the app actually sends is translated: TOP n,
+sequences, SERIES_GENERATE_INTEGER, DUMMY, CURRENT_UTCTIMESTAMP /
+ADD_SECONDS, FOR UPDATE, local temporary (#) tables, MERGE ... WHEN
+MATCHED THEN UPDATE and the vector functions. VECTOR_EMBEDDING is a
+deterministic hashed bag of words, so identical texts score 1.0 and
+rephrasings score high; latencies for each statement and each embedding
+are configurable to mimic a remote HANA Cloud instance. The HNSW index is
+not emulated.
+"""
+import hashlib, itertools, json, math, re, sqlite3, threading, time, unicodedata
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+
+EMBEDDING_DIMENSIONS = 256
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS DUMMY (DUMMY TEXT);
+    CREATE TABLE IF NOT EXISTS CHATBOT_FAQ_QUESTIONS (
+        AID INTEGER PRIMARY KEY,
+        QUESTION TEXT,
+        STATUS TEXT,
+        CREATED_AT TIMESTAMP,
+        CREATED_BY TEXT,
+        CHANGE_VERSION INTEGER,
+        CATEGORY TEXT,
+        QUESTION_VECTOR TEXT,
+        EMBEDDING_MODEL TEXT,
+        QUESTION_VECTOR_NEXT TEXT,
+        EMBEDDING_MODEL_NEXT TEXT,
+        HIT_COUNT INTEGER NOT NULL DEFAULT 1,
+        LAST_ASKED_AT TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS CHATBOT_FAQ_QUESTIONS_STATUS ON CHATBOT_FAQ_QUESTIONS (STATUS, CREATED_AT);
+    CREATE INDEX IF NOT EXISTS CHATBOT_FAQ_QUESTIONS_CHANGE ON CHATBOT_FAQ_QUESTIONS (CHANGE_VERSION);
+    CREATE TABLE IF NOT EXISTS CHATBOT_FAQ_ANSWERS (AID INTEGER, ANSWER TEXT);
+    CREATE INDEX IF NOT EXISTS CHATBOT_FAQ_ANSWERS_AID ON CHATBOT_FAQ_ANSWERS (AID);
+    CREATE TABLE IF NOT EXISTS CHATBOT_FAQ_VERSION (ID INTEGER PRIMARY KEY, VERSION INTEGER);
+    CREATE TABLE IF NOT EXISTS CHATBOT_FAQ_QUESTION_HITS (
+        ID INTEGER PRIMARY KEY AUTOINCREMENT,
+        AID INTEGER,
+        QUESTION TEXT,
+        CREATED_BY TEXT,
+        CREATED_AT TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS CHATBOT_FAQ_QUESTION_HITS_AID ON CHATBOT_FAQ_QUESTION_HITS (AID, CREATED_AT);
+    CREATE TABLE IF NOT EXISTS CHATBOT_NOTIFICATION_OUTBOX (
+        ID INTEGER PRIMARY KEY AUTOINCREMENT,
+        QUESTION TEXT,
+        CREATED_BY TEXT,
+        STATUS TEXT,
+        ATTEMPTS INTEGER,
+        NEXT_ATTEMPT_AT TIMESTAMP,
+        CLAIMED_BY TEXT,
+        CLAIMED_AT TIMESTAMP,
+        LAST_ERROR TEXT,
+        CREATED_AT TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS CHATBOT_FAQ_EMBEDDING_STATE (
+        ID INTEGER PRIMARY KEY,
+        ACTIVE_MODEL TEXT,
+        TARGET_MODEL TEXT,
+        STATUS TEXT,
+        LAST_AID INTEGER,
+        PROCESSED INTEGER,
+        TOTAL INTEGER,
+        CLAIMED_BY TEXT,
+        CLAIMED_AT TIMESTAMP,
+        STARTED_AT TIMESTAMP,
+        FINISHED_AT TIMESTAMP,
+        LAST_ERROR TEXT
+    );
+"""
+
+# Simulated round trips, in seconds (see configure)
+settings = {"path": None, "sql_latency": 0.0, "embedding_latency": 0.0}
+
+counters = {"connects": 0, "statements": 0, "embeddings": 0}
+_counters_lock = threading.Lock()
+
+_sequences = {}
+_sequences_lock = threading.Lock()
+
+
+class Error(Exception):
+    pass
+
+
+def configure(path, sql_latency=0.0, embedding_latency=0.0):
+    settings.update(path=path, sql_latency=sql_latency, embedding_latency=embedding_latency)
+
+
+def _count(name):
+    with _counters_lock:
+        counters[name] += 1
+
+
+def stats():
+    with _counters_lock:
+        return dict(counters)
+
+
+def reset_stats():
+    with _counters_lock:
+        for name in counters:
+            counters[name] = 0
+
+
+# --- vector functions -------------------------------------------------------
+
+def _tokens(text):
+    text = unicodedata.normalize("NFD", text.lower())
+    text = "".join(c for c in text if unicodedata.category(c) != "Mn")
+    words = re.findall(r"[a-z0-9]+", text)
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+@lru_cache(maxsize=8192)
+def embed(text: str) -> str:
+    """Deterministic unit vector of `text`, in HANA's textual REAL_VECTOR form."""
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    for token in _tokens(text or ""):
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], "little") % EMBEDDING_DIMENSIONS
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return "[" + ",".join(f"{v / norm:.6f}" for v in vector) + "]"
+
+
+@lru_cache(maxsize=16384)
+def _parse(vector: str):
+    values = np.array(json.loads(vector), dtype=np.float32)
+    return values, float(np.linalg.norm(values))
+
+
+def _vector_embedding(text, _purpose=None, _model=None):
+    _count("embeddings")
+    if settings["embedding_latency"]:
+        time.sleep(settings["embedding_latency"])
+    return embed(text)
+
+
+def _cosine_similarity(a, b):
+    if a is None or b is None:
+        return None
+    (a, norm_a), (b, norm_b) = _parse(a), _parse(b)
+    norm = norm_a * norm_b
+    return float(np.dot(a, b)) / norm if norm else 0.0
+
+
+def _nextval(name):
+    with _sequences_lock:
+        return next(_sequences.setdefault(name, itertools.count(1)))
+
+
+def set_sequence(name, start):
+    with _sequences_lock:
+        _sequences[name] = itertools.count(start)
+
+
+def _add_seconds(value, seconds):
+    moment = datetime.fromisoformat(value) + timedelta(seconds=seconds)
+    return moment.isoformat(sep=" ", timespec="milliseconds")
+
+
+# --- dialect ----------------------------------------------------------------
+
+_NOW = "STRFTIME('%Y-%m-%d %H:%M:%f', 'now')"
+_REWRITES = [
+    (re.compile(r"\bCURRENT_(UTC)?TIMESTAMP\b"), _NOW),
+    (re.compile(r"\b(\w+)\.NEXTVAL\b"), r"NEXTVAL('\1')"),
+    (re.compile(r"\s+FOR\s+UPDATE\s*$"), ""),
+    # Local temporary tables (#NAME) live in SQLite's per-connection temp schema
+    (re.compile(r"\bCREATE\s+LOCAL\s+TEMPORARY\s+COLUMN\s+TABLE\b"), "CREATE TABLE"),
+    (re.compile(r"#(\w+)"), r"temp.\1"),
+    (
+        re.compile(r"FROM\s+M_TEMPORARY_TABLES\s+WHERE\s+TABLE_NAME\s*=\s*\?\s+AND\s+CONNECTION_ID\s*=\s*CURRENT_CONNECTION"),
+        "FROM sqlite_temp_master WHERE type = 'table' AND '#' || name = ?",
+    ),
+    (
+        re.compile(r"\bSERIES_GENERATE_INTEGER\(\s*1\s*,\s*0\s*,\s*\?\s*\)"),
+        "(WITH RECURSIVE S(N) AS (SELECT 0 UNION ALL SELECT N + 1 FROM S WHERE N + 1 < ?) SELECT N FROM S)",
+    ),
+    (
+        re.compile(
+            r"MERGE\s+INTO\s+(\w+)\s+(\w+)\s+USING\s+(\S+)\s+(\w+)\s+ON\s+(.+?)\s+"
+            r"WHEN\s+MATCHED\s+THEN\s+UPDATE\s+SET\s+(.*)$",
+            re.DOTALL,
+        ),
+        r"UPDATE \1 AS \2 SET \6 FROM \3 AS \4 WHERE \5",
+    ),
+]
+_TOP = re.compile(r"\bSELECT\s+TOP\s+(\d+)\b", re.IGNORECASE)
+
+
+def _move_top_to_limit(sql):
+    """SELECT TOP n ... -> SELECT ... LIMIT n, at the end of the enclosing (sub)query."""
+    match = _TOP.search(sql)
+    while match:
+        depth = 0
+        end = len(sql)
+        for i in range(match.end(), len(sql)):
+            if sql[i] == "(":
+                depth += 1
+            elif sql[i] == ")":
+                if depth == 0:
+                    end = i
+                    break
+                depth -= 1
+        sql = (
+            sql[:match.start()] + "SELECT" + sql[match.end():end].rstrip()
+            + f" LIMIT {match.group(1)}" + sql[end:]
+        )
+        match = _TOP.search(sql)
+    return sql
+
+
+@lru_cache(maxsize=512)
+def translate(sql: str) -> str:
+    sql = sql.strip()
+    for pattern, replacement in _REWRITES:
+        sql = pattern.sub(replacement, sql)
+    return _move_top_to_limit(sql)
+
+
+def _timestamp(value):
+    return datetime.fromisoformat(value.decode("utf-8"))
+
+
+def _bind_timestamp(value):
+    # Same text form as _NOW, so timestamp parameters compare equal to stored values
+    return value.isoformat(sep=" ", timespec="milliseconds")
+
+
+sqlite3.register_converter("TIMESTAMP", _timestamp)
+sqlite3.register_adapter(datetime, _bind_timestamp)
+
+
+# --- DB-API -----------------------------------------------------------------
+
+class Cursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self._cursor = conn._db.cursor()
+
+    def _delay(self):
+        _count("statements")
+        if settings["sql_latency"]:
+            time.sleep(settings["sql_latency"])
+
+    def execute(self, sql, params=()):
+        self._delay()
+        self._conn._begin_if_needed()
+        try:
+            self._cursor.execute(translate(sql), tuple(params or ()))
+        except sqlite3.Error as e:
+            raise Error(f"{e} in: {sql.strip()[:200]}") from e
+        return True
+
+    def executemany(self, sql, rows):
+        self._delay()
+        self._conn._begin_if_needed()
+        try:
+            self._cursor.executemany(translate(sql), [tuple(r) for r in rows])
+        except sqlite3.Error as e:
+            raise Error(f"{e} in: {sql.strip()[:200]}") from e
+        return True
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    def __init__(self, path):
+        # Autocommit like hdbcli; setautocommit(False) opens a write transaction
+        self._db = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.create_function("VECTOR_EMBEDDING", 3, _vector_embedding)
+        self._db.create_function("COSINE_SIMILARITY", 2, _cosine_similarity, deterministic=True)
+        self._db.create_function("TO_REAL_VECTOR", 1, lambda v: v, deterministic=True)
+        self._db.create_function("TO_NVARCHAR", 1, lambda v: v, deterministic=True)
+        self._db.create_function("NEXTVAL", 1, _nextval)
+        self._db.create_function("ADD_SECONDS", 2, _add_seconds, deterministic=True)
+        self._autocommit = True
+        self._open = True
+
+    def _begin_if_needed(self):
+        # Writers queue on BEGIN IMMEDIATE, much like HANA's row locks serialize them
+        if not self._autocommit and not self._db.in_transaction:
+            self._db.execute("BEGIN IMMEDIATE")
+
+    def cursor(self):
+        return Cursor(self)
+
+    def setautocommit(self, value):
+        self._autocommit = bool(value)
+
+    def commit(self):
+        if self._db.in_transaction:
+            self._db.execute("COMMIT")
+
+    def rollback(self):
+        if self._db.in_transaction:
+            self._db.execute("ROLLBACK")
+
+    def isconnected(self):
+        return self._open
+
+    def close(self):
+        self._open = False
+        self._db.close()
+
+
+def connect(**_credentials):
+    if settings["path"] is None:
+        raise Error("fake_hana.configure(path) was not called")
+    _count("connects")
+    if settings["sql_latency"]:
+        time.sleep(settings["sql_latency"])
+    return Connection(settings["path"])
+
+
+def create_schema(path):
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    if not db.execute("SELECT COUNT(*) FROM DUMMY").fetchone()[0]:
+        db.execute("INSERT INTO DUMMY VALUES ('X')")
+    db.execute("INSERT OR IGNORE INTO CHATBOT_FAQ_VERSION VALUES (1, 0)")
+    db.commit()
+    db.close()
@@ -0,0 +1,151 @@
+"""
+Stand-in for the AI Core chat model returned by `init_llm`.
+
+Every call sleeps for a configurable latency, then answers from a script
+instead of a model. Agent turns follow the tool-call script step by step
+(one step per assistant message since the last user message); plain
+prompts (translation, batch translation, conversation summary) are
+answered by echoing their input, which is already English in the
+benchmark corpus.
+"""
+import ast, json, re, threading, time, uuid
+from typing import Any, List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+NOT_REGISTERED = "Esta pregunta no se encuentra registrada en la base de conocimientos."
+
+# Look the question up, then answer with what the tool returned
+DEFAULT_SCRIPT = [
+    {"tool": "faq_lookup", "args": {"question": "$input"}},
+    {"reply": "$faq_answer"},
+]
+
+counters = {"calls": 0, "tool_calls": 0, "plain_prompts": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name, n=1):
+    with _counters_lock:
+        counters[name] += n
+
+
+def stats():
+    with _counters_lock:
+        return dict(counters)
+
+
+def reset_stats():
+    with _counters_lock:
+        for name in counters:
+            counters[name] = 0
+
+
+def _tool_payload(content):
+    if not isinstance(content, str):
+        return content
+    for parse in (json.loads, ast.literal_eval):
+        try:
+            return parse(content)
+        except (ValueError, SyntaxError):
+            continue
+    return content
+
+
+def _faq_answer(tool_result):
+    payload = _tool_payload(tool_result)
+    if isinstance(payload, dict):
+        if payload.get("found"):
+            return payload.get("answer") or ""
+        return NOT_REGISTERED + "\n¿Deseas registrar esta pregunta (Y/N)?"
+    return str(payload)
+
+
+def _substitute(value, user_input, tool_result):
+    if isinstance(value, str):
+        return (
+            value.replace("$input", user_input)
+            .replace("$tool_result", str(tool_result))
+            .replace("$faq_answer", _faq_answer(tool_result) if "$faq_answer" in value else "")
+        )
+    if isinstance(value, dict):
+        return {k: _substitute(v, user_input, tool_result) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_substitute(v, user_input, tool_result) for v in value]
+    return value
+
+
+def _plain_reply(prompt: str) -> str:
+    """Echo answers for the app's non-agent prompts."""
+    if "JSON array" in prompt:
+        match = re.search(r"(\[.*\])\s*$", prompt, re.DOTALL)
+        return match.group(1) if match else "[]"
+    if "Question:" in prompt:
+        return prompt.rsplit("Question:", 1)[1].strip()
+    if "Update the summary" in prompt:
+        return "The user asked several FAQ questions."
+    return "OK"
+
+
+class FakeChatModel(BaseChatModel):
+    latency: float = 0.0
+    script: List[Any] = DEFAULT_SCRIPT
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _respond(self, messages):
+        last_human = max(
+            (i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=None
+        )
+        if last_human is None:
+            return AIMessage(content="OK")
+
+        # The app's own prompts arrive as a single user message
+        if len(messages) == 1:
+            _count("plain_prompts")
+            return AIMessage(content=_plain_reply(messages[0].content))
+
+        user_input = messages[last_human].content
+        later = messages[last_human + 1:]
+        step_index = sum(1 for m in later if isinstance(m, AIMessage))
+        tool_result = next(
+            (m.content for m in reversed(later) if isinstance(m, ToolMessage)), ""
+        )
+
+        if step_index >= len(self.script):
+            return AIMessage(content=_faq_answer(tool_result) if tool_result else "OK")
+
+        step = self.script[step_index]
+        calls = step.get("tools") or ([step] if "tool" in step else [])
+        if calls:
+            _count("tool_calls", len(calls))
+            return AIMessage(content="", tool_calls=[
+                {
+                    "name": call["tool"],
+                    "args": _substitute(call.get("args", {}), user_input, tool_result),
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                }
+                for call in calls
+            ])
+        return AIMessage(content=_substitute(step.get("reply", "OK"), user_input, tool_result))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        _count("calls")
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+
+def make_init_llm(latency=0.0, script=None):
+    """Drop-in for gen_ai_hub's init_llm(model_name, **kwargs)."""
+    def init_llm(model_name=None, **kwargs):
+        return FakeChatModel(latency=latency, script=script or DEFAULT_SCRIPT)
+    return init_llm
@@ -0,0 +1,402 @@
+"""
+Offline load test of the Flask app against local fakes.
+
+    cd "2 Cloud Foundry REST-API"
+    python -m benchmark.run --scenarios search,joule,agent,admin --requests 500 --concurrency 8
+
+HANA is replaced by benchmark.fake_hana (SQLite plus a hashed embedding),
+AI Core by benchmark.fake_llm and the SMTP relay by benchmark.smtp_sink,
+so no network or credentials are needed. Latencies of each fake are set
+on the command line; `--llm-script` loads a JSON list of tool-call steps
+(see fake_llm.DEFAULT_SCRIPT). With `--url` the same scenarios are sent
+to a running deployment instead and the fakes are not used.
+
+Each scenario reports throughput and p50/p95/p99 latency per route.
+"""
+import abc, argparse, json, os, random, sys, tempfile, threading, time, types
+from concurrent.futures import ThreadPoolExecutor
+
+
+TOPICS = [
+    "purchase order", "invoice", "vacation request", "expense report", "travel booking",
+    "VPN access", "SAP GUI installation", "password reset", "business partner", "sales order",
+    "cost center", "goods receipt", "payment run", "credit memo", "supplier onboarding",
+    "user role", "transport request", "BTP subaccount", "Fiori launchpad tile", "service ticket",
+    "timesheet", "company car", "laptop replacement", "training budget", "headcount approval",
+    "customer master data", "material master", "delivery note", "asset transfer", "budget release",
+]
+INTENTS = [
+    "How do I create a {topic}?",
+    "Who approves a {topic}?",
+    "Where can I see the status of my {topic}?",
+    "How long does a {topic} take to be processed?",
+    "Can I cancel a {topic} after submitting it?",
+    "What documents are needed for a {topic}?",
+    "Which transaction is used to change a {topic}?",
+    "What is the deadline for a {topic} this month?",
+]
+MISSES = [
+    "What is the weather in {city} tomorrow?",
+    "Recommend a restaurant in {city}",
+    "How many people live in {city}?",
+    "When does the next train to {city} leave?",
+]
+CITIES = ["Madrid", "Lima", "Walldorf", "Bogotá", "Santiago", "Berlin", "Quito", "Monterrey"]
+PREFIXES = ["", "", "Hi, ", "Please tell me: ", "Quick question. "]
+
+
+def corpus(size):
+    questions = [intent.format(topic=topic) for topic in TOPICS for intent in INTENTS]
+    return questions[:size]
+
+
+def sample_question(rng, questions, hit_ratio):
+    if rng.random() < hit_ratio:
+        return rng.choice(PREFIXES) + rng.choice(questions)
+    return rng.choice(MISSES).format(city=rng.choice(CITIES)) + f" #{rng.randint(1, 10 ** 6)}"
+
+
+# --- local stand-ins ----------------------------------------------------------
+
+def install_fakes(args):
+    """Points the app at the fakes; must run before btpaiagent is imported."""
+    from benchmark import fake_hana, fake_llm
+    from benchmark.smtp_sink import SmtpSink
+
+    workdir = tempfile.mkdtemp(prefix="btpaiagent-bench-")
+    db_path = os.path.join(workdir, "hana.sqlite3")
+    fake_hana.configure(db_path, args.sql_latency_ms / 1000, args.embedding_latency_ms / 1000)
+    fake_hana.create_schema(db_path)
+
+    sink = SmtpSink(latency=args.smtp_latency_ms / 1000).start()
+
+    script = None
+    if args.llm_script:
+        with open(args.llm_script, encoding="utf-8") as f:
+            script = json.load(f)
+
+    hdbcli = types.ModuleType("hdbcli")
+    hdbcli.dbapi = fake_hana
+    sys.modules["hdbcli"] = hdbcli
+    sys.modules["hdbcli.dbapi"] = fake_hana
+
+    init_models = types.ModuleType("gen_ai_hub.proxy.langchain.init_models")
+    init_models.init_llm = fake_llm.make_init_llm(args.llm_latency_ms / 1000, script)
+    for name in ("gen_ai_hub", "gen_ai_hub.proxy", "gen_ai_hub.proxy.langchain"):
+        sys.modules[name] = types.ModuleType(name)
+    sys.modules["gen_ai_hub.proxy.langchain.init_models"] = init_models
+
+    os.environ.update({
+        "SAP_HANA_CLOUD_ADDRESS": "fake",
+        "SAP_HANA_CLOUD_PORT": "443",
+        "SMTP_SERVER": sink.host,
+        "SMTP_PORT": str(sink.port),
+        "SMTP_STARTTLS": "false",
+        "SESSION_BACKEND": "memory",
+        "FAQ_VECTOR_INDEX": "off",
+        "FAQ_SEARCH_MODE": args.search_mode,
+        "TRANSLATION_MEMO_PATH": os.path.join(workdir, "translation_memo.sqlite3"),
+        "OUTBOX_BATCH_WINDOW": "0",
+        "TELEMETRY_LOG_REQUESTS": "true" if args.verbose else "false",
+        "TELEMETRY_LOG_LEVEL": "info" if args.verbose else "warning",
+    })
+    os.environ.pop("MAILTRAP_SMTP_USER", None)
+    return db_path, sink
+
+
+def seed(db_path, questions, pending):
+    """ACTIVE FAQs with answers and vectors, plus some PENDING questions."""
+    import sqlite3
+    from benchmark import fake_hana
+    from faq_search import EMBEDDING_MODEL_ID
+
+    db = sqlite3.connect(db_path)
+    rows = [
+        (aid, question, "ACTIVE", "SEED", fake_hana.embed(question), EMBEDDING_MODEL_ID)
+        for aid, question in enumerate(questions, start=1)
+    ]
+    rows += [
+        (aid, f"Pending question number {n} about {random.choice(TOPICS)}", "PENDING", "USER", None, None)
+        for n, aid in enumerate(range(len(questions) + 1, len(questions) + pending + 1))
+    ]
+    db.executemany("""
+        INSERT INTO CHATBOT_FAQ_QUESTIONS
+        (AID, QUESTION, STATUS, CREATED_AT, CREATED_BY, CHANGE_VERSION, QUESTION_VECTOR, EMBEDDING_MODEL)
+        VALUES (?, ?, ?, STRFTIME('%Y-%m-%d %H:%M:%f', 'now'), ?, 0, ?, ?)
+    """, [(aid, q, status, by, vector, model) for aid, q, status, by, vector, model in rows])
+    db.executemany(
+        "INSERT INTO CHATBOT_FAQ_ANSWERS (AID, ANSWER) VALUES (?, ?)",
+        [(aid, f"Answer {aid}: follow the documented procedure for this case.") for aid, *_ in rows[:len(questions)]],
+    )
+    db.execute(
+        "INSERT OR REPLACE INTO CHATBOT_FAQ_EMBEDDING_STATE (ID, ACTIVE_MODEL, STATUS) VALUES (1, ?, 'IDLE')",
+        (EMBEDDING_MODEL_ID,),
+    )
+    db.commit()
+    db.close()
+    fake_hana.set_sequence("CHATBOT_FAQ_AID_SEQ", len(rows) + 1)
+
+
+# --- clients ------------------------------------------------------------------
+
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, json=body, headers=headers or {})
+        try:
+            response.get_data()
+            return response.status_code
+        finally:
+            response.close()
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self.session.request(method, self.base_url + path, json=body, headers=headers, timeout=120)
+        response.content
+        return response.status_code
+
+
+# --- scenarios ----------------------------------------------------------------
+
+ADMIN = {"X-User-Role": "ADMIN"}
+
+
+class Scenario(abc.ABC):
+    """Yields (route, method, path, body, headers) for each request of a worker."""
+
+    def __init__(self, args, questions):
+        self.args = args
+        self.questions = questions
+        self.rng = random.Random(args.seed)
+        self.lock = threading.Lock()
+
+    def question(self):
+        with self.lock:
+            return sample_question(self.rng, self.questions, self.args.hit_ratio)
+
+    @abc.abstractmethod
+    def next_request(self, worker, n):
+        """The request number `n` of `worker`."""
+
+
+class SearchScenario(Scenario):
+    def next_request(self, worker, n):
+        return "/api/search", "POST", "/api/search", {"question": self.question()}, None
+
+
+class JouleScenario(Scenario):
+    def next_request(self, worker, n):
+        return "/joule/faq", "POST", "/joule/faq", {"question": self.question()}, None
+
+
+class AgentScenario(Scenario):
+    def next_request(self, worker, n):
+        # A few turns per conversation, like a chat session
+        conversation = f"bench-{worker}-{n // self.args.turns}"
+        body = {"conversation_id": conversation, "user_input": self.question()}
+        if self.args.stream:
+            body["stream"] = True
+        return "/", "POST", "/", body, None
+
+
+class AdminScenario(Scenario):
+    """Mostly list reads, as the admin UI does, with a share of writes."""
+
+    READS = [
+        ("/faq/pending", "/faq/pending"),
+        ("/faq/pending", "/faq/pending?limit=50"),
+        ("/faq/active", "/faq/active?limit=100"),
+        ("/faq/dashboard", "/faq/dashboard"),
+        ("/faq/changes", "/faq/changes?since=0"),
+    ]
+
+    def next_request(self, worker, n):
+        with self.lock:
+            roll = self.rng.random()
+            aid = self.rng.randint(1, len(self.questions))
+            read = self.rng.choice(self.READS)
+        if roll >= self.args.write_ratio:
+            route, path = read
+            return route, "GET", path, None, ADMIN
+
+        writes = [
+            ("/faq/question", {"question": self.question()}),
+            ("/faq/answer", {"aid": aid, "answer": f"Updated answer for {aid}."}),
+            ("/faq/delete", {"aid": aid}),
+            ("/faq/restore", {"aid": aid}),
+        ]
+        route, body = writes[n % len(writes)]
+        return route, "POST", route, body, ADMIN
+
+
+SCENARIOS = {
+    "search": SearchScenario,
+    "joule": JouleScenario,
+    "agent": AgentScenario,
+    "admin": AdminScenario,
+}
+
+
+# --- driver -------------------------------------------------------------------
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(name, scenario, make_client, requests_total, concurrency, warmup):
+    samples = {}   # route -> [(seconds, ok)]
+    lock = threading.Lock()
+    issued = iter(range(requests_total + warmup))
+    issued_lock = threading.Lock()
+
+    def worker(worker_id):
+        client = make_client()
+        while True:
+            with issued_lock:
+                n = next(issued, None)
+            if n is None:
+                return
+            route, method, path, body, headers = scenario.next_request(worker_id, n)
+            started = time.perf_counter()
+            try:
+                status = client.request(method, path, body, headers)
+                ok = status < 500
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - started
+            if n >= warmup:
+                with lock:
+                    samples.setdefault(route, []).append((elapsed, ok))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    wall = time.perf_counter() - started
+
+    routes = {}
+    for route, values in sorted(samples.items()):
+        latencies = sorted(seconds for seconds, _ in values)
+        routes[route] = {
+            "requests": len(values),
+            "errors": sum(1 for _, ok in values if not ok),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "max_ms": round(latencies[-1] * 1000, 1),
+        }
+    measured = sum(r["requests"] for r in routes.values())
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": measured,
+        "seconds": round(wall, 3),
+        # Warm-up requests share the wall clock, so this slightly understates throughput
+        "requests_per_second": round((measured + warmup) / wall, 1) if wall > 0 else None,
+        "routes": routes,
+    }
+
+
+def print_report(result, extra):
+    print(f"\n== {result['scenario']}: {result['requests']} requests, "
+          f"concurrency {result['concurrency']}, {result['requests_per_second']} req/s")
+    print(f"{'route':<18}{'n':>7}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for route, r in result["routes"].items():
+        print(f"{route:<18}{r['requests']:>7}{r['errors']:>6}{r['p50_ms']:>10}"
+              f"{r['p95_ms']:>10}{r['p99_ms']:>10}{r['max_ms']:>10}")
+    if extra:
+        print("   " + ", ".join(f"{k}: {v}" for k, v in extra.items()))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", default="search,joule,agent,admin",
+                        help=f"comma-separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=300, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app with fakes")
+    parser.add_argument("--faqs", type=int, default=200, help="ACTIVE FAQs to seed (max %d)" % (len(TOPICS) * len(INTENTS)))
+    parser.add_argument("--pending", type=int, default=50, help="PENDING questions to seed")
+    parser.add_argument("--hit-ratio", type=float, default=0.8, help="share of questions that match an FAQ")
+    parser.add_argument("--write-ratio", type=float, default=0.1, help="share of admin requests that write")
+    parser.add_argument("--turns", type=int, default=4, help="agent turns per conversation")
+    parser.add_argument("--stream", action="store_true", help="agent requests use SSE streaming")
+    parser.add_argument("--search-mode", default="hana", choices=["hana", "local"])
+    parser.add_argument("--sql-latency-ms", type=float, default=2.0, help="per statement and per connect")
+    parser.add_argument("--embedding-latency-ms", type=float, default=15.0, help="per VECTOR_EMBEDDING call")
+    parser.add_argument("--llm-latency-ms", type=float, default=400.0, help="per chat model call")
+    parser.add_argument("--llm-script", help="JSON file with the agent's tool-call steps")
+    parser.add_argument("--smtp-latency-ms", type=float, default=50.0, help="per message")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's per-request JSON logs")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(unknown)}")
+    random.seed(args.seed)
+    questions = corpus(args.faqs)
+
+    fakes = None
+    if args.url:
+        make_client = lambda: HttpClient(args.url)
+    else:
+        db_path, sink = install_fakes(args)
+        seed(db_path, questions, args.pending)
+
+        import btpaiagent
+        from benchmark import fake_hana, fake_llm
+        btpaiagent.notification_outbox.start()
+        make_client = lambda: InProcessClient(btpaiagent.app)
+        fakes = (fake_hana, fake_llm, sink)
+
+    results = []
+    for name in names:
+        extra = {}
+        if fakes:
+            fakes[0].reset_stats()
+            fakes[1].reset_stats()
+        scenario = SCENARIOS[name](args, questions)
+        result = run_scenario(name, scenario, make_client, args.requests, args.concurrency, args.warmup)
+        if fakes:
+            requests_sent = result["requests"] + args.warmup
+            hana, llm = fakes[0].stats(), fakes[1].stats()
+            extra = {
+                "sql/request": round(hana["statements"] / requests_sent, 1),
+                "embeddings/request": round(hana["embeddings"] / requests_sent, 2),
+                "hana connects": hana["connects"],
+                "llm calls/request": round(llm["calls"] / requests_sent, 2),
+                "emails so far": fakes[2].stats()["messages"],
+            }
+            result["fakes"] = extra
+        results.append(result)
+        print_report(result, extra)
+
+    if fakes:
+        import btpaiagent
+        btpaiagent.shutdown()
+        fakes[2].stop()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Minimal local SMTP server that accepts and counts messages.
+
+Speaks just enough SMTP for smtplib without STARTTLS or AUTH (run the
+app with SMTP_STARTTLS=false and no MAILTRAP_SMTP_USER). An optional
+per-message latency mimics a remote relay.
+"""
+import socketserver, threading, time
+
+
+class SmtpSink:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        self.latency = latency
+        self.messages = []
+        self.sessions = 0
+        self._lock = threading.Lock()
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode("ascii") + b"\r\n")
+
+            def handle(self):
+                with sink._lock:
+                    sink.sessions += 1
+                self.reply("220 benchmark SMTP sink")
+                mail_from, rcpt_to = None, []
+                while True:
+                    raw = self.rfile.readline()
+                    if not raw:
+                        return
+                    command = raw.decode("utf-8", "replace").strip()
+                    verb = command.split(" ", 1)[0].upper()
+                    if verb == "EHLO":
+                        self.wfile.write(b"250-benchmark\r\n250 8BITMIME\r\n")
+                    elif verb == "HELO":
+                        self.reply("250 benchmark")
+                    elif verb == "MAIL":
+                        mail_from, rcpt_to = command[10:], []
+                        self.reply("250 OK")
+                    elif verb == "RCPT":
+                        rcpt_to.append(command[8:])
+                        self.reply("250 OK")
+                    elif verb == "DATA":
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        lines = []
+                        while True:
+                            line = self.rfile.readline()
+                            if not line or line in (b".\r\n", b".\n"):
+                                break
+                            lines.append(line)
+                        if sink.latency:
+                            time.sleep(sink.latency)
+                        with sink._lock:
+                            sink.messages.append((mail_from, rcpt_to, b"".join(lines)))
+                        self.reply("250 OK queued")
+                    elif verb in ("RSET", "NOOP"):
+                        self.reply("250 OK")
+                    elif verb == "QUIT":
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        self.reply("502 Command not implemented")
+
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.host, self.port = self.server.server_address
+        self._thread = threading.Thread(target=self.server.serve_forever, name="smtp-sink", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self):
+        with self._lock:
+            return {"messages": len(self.messages), "sessions": self.sessions}
@@ -1,30 +1,67 @@
-import os, json, requests, random, smtplib, ssl, unicodedata
+import time
+_import_started = time.monotonic()
+
+import os, json, asyncio, requests, random, unicodedata
+from collections import namedtuple
 from email.mime.text import MIMEText
-from bs4 import BeautifulSoup
 from datetime import datetime
-from gen_ai_hub.proxy.langchain.init_models import init_llm
-from langchain_core.messages import SystemMessage, AIMessage, HumanMessage
-from langgraph.graph import START, StateGraph, MessagesState
-from langgraph.prebuilt import tools_condition, ToolNode
-from flask import Flask, request, jsonify, abort
+# gen_ai_hub, the LangGraph builder and the tool wrappers are imported when the agent is first built
+from langchain_core.messages import SystemMessage, AIMessage, HumanMessage, RemoveMessage, ToolMessage
+from langgraph.graph import MessagesState
+from flask import Flask, Response, request, jsonify, abort, stream_with_context
 from hdbcli import dbapi
-from typing import TypedDict, Optional
+from typing import Optional
+from hana_pool import HanaConnectionPool, ping
+from faq_search import FaqSearchEngine
+from language import is_english, TranslationMemo
+from session_store import create_session_store
+from context_window import plan_window, render_transcript, with_summary
+from notifications import NotificationOutbox
+from mailer import SmtpSessionManager
+from web_fetch import PageFetcher
+from cached_upstream import CachedUpstream, upstreams_status
+from faq_lists import (
+    ListQueryError, count_by_status, count_questions, decode_cursor, iter_questions,
+    parse_fields, parse_limit, stream_json_array, stream_json_page,
+    ORDER_BY_DEMAND, ORDER_NEWEST_FIRST, DEFAULT_FIELDS, CLUSTER_FIELDS,
+)
+from faq_changes import FaqChangeFeed, parse_version
+from faq_bulk import FaqBulkLoader, BulkInputError, parse_bulk_rows
+from embedding_job import ReembeddingJob
+from faq_pending import PendingQuestionQueue
+from telemetry import (
+    Gauge, TracedConnection, instrument_flask, log_event, register, render_metrics, span, traced,
+)
+from startup import Lazy, Startup
+
+startup = Startup(_import_started)
 
 
-SESSION_STORE = {}
 class AgentState(MessagesState):
     pending_question: Optional[str]
     last_user_question: Optional[str]
+    conversation_summary: Optional[str]
+
 
 ADMIN_NAME = "Administrador"
 ADMIN_EMAIL = os.getenv("ADMIN_NOTIFICATION_EMAIL")
 
 app = Flask(__name__)
+# Request ids, per-route latency histograms and a JSON log line per request (see /metrics)
+instrument_flask(app)
 # Port number is required to fetch from env variable
 # http://docs.cloudfoundry.org/devguide/deploy-apps/environment-variable.html#PORT
 cf_port = os.getenv("PORT")
 
 SIMILARITY_THRESHOLD = 0.72
+# "translate": non-English questions go through the LLM before embedding
+# "direct": embed the original text first and translate only if nothing matches
+FAQ_TRANSLATION_MODE = os.getenv("FAQ_TRANSLATION_MODE", "translate").lower()
+# FAQ hits at or above this score are answered directly, without calling the LLM
+FAQ_FASTPATH_ENABLED = os.getenv("FAQ_FASTPATH_ENABLED", "true").lower() == "true"
+FAQ_FASTPATH_MIN_SCORE = float(os.getenv("FAQ_FASTPATH_MIN_SCORE", "0.80"))
+# Two hits above the threshold closer than this are ambiguous: the agent asks instead of guessing
+FAQ_AMBIGUOUS_MARGIN = float(os.getenv("FAQ_AMBIGUOUS_MARGIN", "0.03"))
 
 # Credentials for SAP AI Core need to be set as environment variables in the manifest.yml file
 # AICORE_AUTH_URL
@@ -34,10 +71,16 @@ SIMILARITY_THRESHOLD = 0.72
 # AICORE_RESOURCE_GROUP
 
 # Credentials for the SMTP server to send emails, hardcoded for testing
-smtp_server   = "sandbox.smtp.mailtrap.io"
-smtp_port     = 587
+smtp_server   = os.getenv("SMTP_SERVER", "sandbox.smtp.mailtrap.io")
+smtp_port     = int(os.getenv("SMTP_PORT", "587"))   # STARTTLS (NO usar SMTP_SSL con 587)
+smtp_starttls = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
 smtp_user     = os.getenv("MAILTRAP_SMTP_USER")
 smtp_password = os.getenv("MAILTRAP_SMTP_PASS")
+smtp_sender   = "SAP BTP AI Agent <ai-agent@btpaiagent.test>"
+smtp_envelope_from = smtp_user or "ai-agent@btpaiagent.test"
+
+# Una sesión SMTP autenticada reutilizada por todos los envíos
+smtp_sessions = SmtpSessionManager(smtp_server, smtp_port, smtp_user, smtp_password, starttls=smtp_starttls)
 
 def normalize_answer(text: str) -> str:
     text = text.strip().lower()
@@ -56,14 +99,26 @@ def is_negative(text: str) -> bool:
 
 
 def get_hana_connection():
-    return dbapi.connect(
-        address=os.getenv("SAP_HANA_CLOUD_ADDRESS"),
-        port=int(os.getenv("SAP_HANA_CLOUD_PORT")),
-        user=os.getenv("SAP_HANA_CLOUD_USER"),
-        password=os.getenv("SAP_HANA_CLOUD_PASSWORD"),
-        encrypt=True,
-        sslValidateCertificate=False
-    )
+    with span("hana.connect"):
+        conn = dbapi.connect(
+            address=os.getenv("SAP_HANA_CLOUD_ADDRESS"),
+            port=int(os.getenv("SAP_HANA_CLOUD_PORT")),
+            user=os.getenv("SAP_HANA_CLOUD_USER"),
+            password=os.getenv("SAP_HANA_CLOUD_PASSWORD"),
+            encrypt=True,
+            sslValidateCertificate=False
+        )
+    # Every execute / executemany (VECTOR_EMBEDDING included) is timed as a span
+    return TracedConnection(conn)
+
+# Connections are borrowed from the pool instead of opening a new TLS session per call
+hana_pool = HanaConnectionPool(get_hana_connection)
+# Conversaciones acotadas por número y antigüedad (SESSION_BACKEND: memory | sqlite | hana)
+SESSION_STORE = create_session_store(pool=hana_pool)
+# Contador de versiones para que el admin UI solo descargue cambios
+faq_changes = FaqChangeFeed(hana_pool)
+# El mismo contador invalida las cachés de búsqueda de todos los workers
+faq_engine = FaqSearchEngine(hana_pool, SIMILARITY_THRESHOLD, normalize=normalize_answer, change_feed=faq_changes)
 
 #############################
 # Provide the tools / functions for the AI agent
@@ -79,54 +134,94 @@ def require_admin():
 
 def test_hana_connection():
     try:
-        conn = dbapi.connect(
-            address=os.getenv("SAP_HANA_CLOUD_ADDRESS"),
-            port=int(os.getenv("SAP_HANA_CLOUD_PORT")),
-            user=os.getenv("SAP_HANA_CLOUD_USER"),
-            password=os.getenv("SAP_HANA_CLOUD_PASSWORD"),
-            encrypt=True,
-            sslValidateCertificate=False
-        )
+        with hana_pool.connection() as conn:
+            result = ping(conn)
 
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1 FROM DUMMY")
-        row = cursor.fetchone()
-        result = row[0] if row else None
-
-        cursor.close()
-        conn.close()
-
-        return {"hana_connection": "OK", "result": result}
+        return {"hana_connection": "OK", "result": result, "pool": hana_pool.stats()}
 
     except Exception as e:
-        return {"hana_connection": "ERROR", "details": str(e)}
+        return {"hana_connection": "ERROR", "details": str(e), "pool": hana_pool.stats()}
 
 @app.route("/health/hana")
 def hana_health():
     return jsonify(test_hana_connection())
 
+@app.route("/health/notifications")
+def notifications_health():
+    return jsonify({**notification_outbox.stats(), "smtp": smtp_sessions.stats()})
+
+@app.route("/health/upstreams")
+def upstreams_health():
+    return jsonify(upstreams_status())
+
+@app.route("/health/sessions")
+def sessions_health():
+    return jsonify(SESSION_STORE.stats())
+
+register(Gauge("btpaiagent_hana_pool_in_use", "HANA connections checked out of the pool.",
+               lambda: hana_pool.stats()["in_use"]))
+register(Gauge("btpaiagent_hana_pool_idle", "Idle HANA connections in the pool.",
+               lambda: hana_pool.stats()["idle"]))
+
+register(Gauge("btpaiagent_startup_import_seconds", "Time to import the app module.",
+               lambda: startup.import_seconds or 0))
+register(Gauge("btpaiagent_startup_warmup_seconds", "Time spent in the startup warm-up steps.",
+               lambda: startup.warmup_seconds or 0))
+register(Gauge("btpaiagent_startup_seconds", "Time from the start of the import until the worker was ready.",
+               lambda: startup.seconds_to_ready or 0))
+register(Gauge("btpaiagent_ready", "1 when this worker reports ready.", lambda: int(startup.ready)))
+register(Gauge("btpaiagent_llm_init_seconds", "Time to create the LLM client (AI Core deployment and token).",
+               lambda: llm.seconds or 0))
+register(Gauge("btpaiagent_agent_init_seconds", "Time to build the tools and compile the agent graph.",
+               lambda: agent.seconds or 0))
+
+@app.route("/health/live")
+def liveness():
+    """The process answers; says nothing about HANA or AI Core."""
+    return jsonify({"status": "alive"})
+
+@app.route("/health/ready")
+def readiness():
+    """503 until the warm-up has run and again once the worker is shutting down."""
+    status = startup.status()
+    status["agent_initialized"] = agent.initialized
+    return jsonify(status), (200 if status["ready"] else 503)
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus text format; each gunicorn worker reports its own series."""
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/health/faq")
+def faq_health():
+    return jsonify({
+        **faq_engine.stats(),
+        "translation_memo": translation_memo.stats(),
+        "changes": faq_changes.stats(),
+        "pending": pending_questions.stats(),
+    })
+
 #CRUD EMAL
 
-def create_pending_question(question: str, created_by="USER") -> str:
-    conn = get_hana_connection()
-    cursor = conn.cursor()
+def create_pending_question(question: str, created_by="USER", english=None) -> str:
+    # Una pregunta casi igual a otra PENDING solo suma demanda (sin fila ni correo nuevos);
+    # el correo de las nuevas lo envía el worker del outbox fuera del request
+    pending_questions.register(question, created_by, english=english)
 
-    sql = """
-        INSERT INTO CHATBOT_FAQ_QUESTIONS
-        (AID, QUESTION, STATUS, CREATED_AT, CREATED_BY)
-        VALUES (
-            CHATBOT_FAQ_AID_SEQ.NEXTVAL,
-            ?, 'PENDING', CURRENT_TIMESTAMP, ?
-        )
-    """
+    return "Your question has been registered and is pending review."
 
-    cursor.execute(sql, (question, created_by))
-    conn.commit()
-# ===== NUEVO (mínimo indispensable) =====
-    try:
-        admin_name = "Administrador"
-        admin_email = get_email_address(admin_name)
 
+def admin_email_addresses():
+    """ADMIN_NOTIFICATION_EMAIL, a comma-separated list, or the directory entry of ADMIN_NAME."""
+    addresses = [a.strip() for a in (ADMIN_EMAIL or "").split(",") if a.strip()]
+    return addresses or [get_email_address(ADMIN_NAME)]
+
+
+def notify_admin(entries):
+    """Sends each admin one digest email for a batch of (question, created_by) pending questions."""
+
+    if len(entries) == 1:
+        question, created_by = entries[0]
         email_text = f"""
 Se ha registrado una nueva pregunta en estado PENDING.
 
@@ -137,106 +232,115 @@ Creada por: {created_by}
 
 Por favor, ingrese al sistema para revisarla.
 """.strip()
-
-        result = send_email(
-            recipient_name=admin_name,
-            email_address=admin_email,
-            email_text=email_text
+    else:
+        listing = "\n".join(
+            f'- "{question}" (creada por: {created_by})' for question, created_by in entries
         )
+        email_text = f"""
+Se han registrado {len(entries)} nuevas preguntas en estado PENDING.
 
-        print(f"[EMAIL] {result}")
-
-    except Exception as e:
-        print(f"[ERROR] Admin notification email failed: {e}")
-    # ===== FIN NUEVO =====
-    cursor.close()
-    conn.close()
+{listing}
 
-    return "Your question has been registered and is pending review."
+Por favor, ingrese al sistema para revisarlas.
+""".strip()
 
+    addresses = admin_email_addresses()
+    errors = [e for e in send_many_emails([(ADMIN_NAME, address, email_text) for address in addresses]) if e]
+    if len(errors) == len(addresses):
+        # Nobody got the digest: the outbox retries it
+        raise errors[0]
+    if errors:
+        log_event("admin_notification_partially_failed", level="warning",
+                  recipients=len(addresses), failed=len(errors), error=str(errors[0]))
 
-def list_pending_questions():
-    conn = get_hana_connection()
-    cursor = conn.cursor()
 
-    cursor.execute("""
-        SELECT AID, QUESTION, CREATED_AT, CREATED_BY
-        FROM CHATBOT_FAQ_QUESTIONS
-        WHERE STATUS = 'PENDING'
-        ORDER BY CREATED_AT
-    """)
+notification_outbox = NotificationOutbox(hana_pool, notify_admin)
 
-    rows = cursor.fetchall()
 
-    cursor.close()
-    conn.close()
+def format_pending_date(value) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
 
-    return [
-        {
-            "aid": r[0],
-            "question": r[1],
-            "created_at": r[2].strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z",
-            "created_by": r[3]
-        }
-        for r in rows
-    ]
 
+def format_iso_date(value) -> str:
+    return value.isoformat()
 
-def answer_question(aid, answer_text):
-    conn = get_hana_connection()
-    cursor = conn.cursor()
 
-    cursor.execute("""
-        SELECT STATUS
-        FROM CHATBOT_FAQ_QUESTIONS
-        WHERE AID = ?
-    """, (aid,))
-    row = cursor.fetchone()
+# Status -> (sort order, date format, default fields); PENDING is ranked by demand
+QUESTION_LISTS = {
+    "PENDING": (ORDER_BY_DEMAND, format_pending_date, CLUSTER_FIELDS),
+    "ACTIVE": (ORDER_NEWEST_FIRST, format_iso_date, DEFAULT_FIELDS),
+    "DELETED": (ORDER_NEWEST_FIRST, format_iso_date, DEFAULT_FIELDS),
+}
 
-    if not row:
-        return {"error": "Question not found"}
 
-    # 1️⃣ Insert / replace answer
-    cursor.execute(
-        "DELETE FROM CHATBOT_FAQ_ANSWERS WHERE AID = ?",
-        (aid,)
+def iter_question_list(status: str, fields=None, **options):
+    order, format_date, default_fields = QUESTION_LISTS[status]
+    return iter_questions(
+        hana_pool, status, order, format_date, fields=fields or default_fields, **options
     )
 
-    cursor.execute(
-        "INSERT INTO CHATBOT_FAQ_ANSWERS (AID, ANSWER) VALUES (?, ?)",
-        (aid, answer_text)
-    )
 
-    cursor.execute(
-    "SELECT QUESTION FROM CHATBOT_FAQ_QUESTIONS WHERE AID = ?",
-    (aid,)
-    )
-    question_text = cursor.fetchone()[0]
+def list_pending_questions(**options):
+    return list(iter_question_list("PENDING", **options))
 
-    translated_question = (
-        translate_to_english(question_text)
-        if needs_translation(question_text)
-        else question_text
-    )
 
+def answer_question(aid, answer_text):
+    with hana_pool.transaction() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT QUESTION
+            FROM CHATBOT_FAQ_QUESTIONS
+            WHERE AID = ?
+        """, (aid,))
+        row = cursor.fetchone()
 
-    # 2️⃣ Activar pregunta
-    cursor.execute("""
-        UPDATE CHATBOT_FAQ_QUESTIONS
-        SET
-            QUESTION_VECTOR = VECTOR_EMBEDDING(
-                ?,
-                'DOCUMENT',
-                'SAP_NEB.20240715'
-            ),
-            STATUS = 'ACTIVE'
-        WHERE AID = ?
-    """, (translated_question, aid))
+        if not row:
+            cursor.close()
+            return {"error": "Question not found"}
 
+        question_text = row[0]
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+        # La traducción usa el LLM: se hace antes de modificar las filas
+        translated_question = (
+            translate_to_english(question_text)
+            if needs_translation(question_text)
+            else question_text
+        )
+
+        # 1️⃣ Insert / replace answer
+        cursor.execute(
+            "DELETE FROM CHATBOT_FAQ_ANSWERS WHERE AID = ?",
+            (aid,)
+        )
+
+        cursor.execute(
+            "INSERT INTO CHATBOT_FAQ_ANSWERS (AID, ANSWER) VALUES (?, ?)",
+            (aid, answer_text)
+        )
+
+        # 2️⃣ Activar pregunta (modelo activo leído bajo bloqueo: no se cruza con un cambio de modelo)
+        model_id = faq_engine.model_for_write(cursor)
+        cursor.execute(f"""
+            UPDATE CHATBOT_FAQ_QUESTIONS
+            SET
+                QUESTION_VECTOR = VECTOR_EMBEDDING(
+                    ?,
+                    'DOCUMENT',
+                    '{model_id}'
+                ),
+                EMBEDDING_MODEL = ?,
+                QUESTION_VECTOR_NEXT = NULL,
+                EMBEDDING_MODEL_NEXT = NULL,
+                STATUS = 'ACTIVE',
+                CHANGE_VERSION = ?
+            WHERE AID = ?
+        """, (translated_question, model_id, faq_changes.bump(cursor), aid))
+
+        cursor.close()
+
+    faq_engine.refresh(aid)
+    faq_changes.notify()
 
     return {"status": "answered", "aid": aid}
 
@@ -244,102 +348,106 @@ def answer_question(aid, answer_text):
 
 
 def delete_question(aid: int):
-    conn = get_hana_connection()
-    cursor = conn.cursor()
+    with hana_pool.transaction() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            UPDATE CHATBOT_FAQ_QUESTIONS
+            SET STATUS = 'DELETED', CHANGE_VERSION = ?
+            WHERE AID = ?
+        """, (faq_changes.bump(cursor), aid))
 
-    cursor.execute("""
-        UPDATE CHATBOT_FAQ_QUESTIONS
-        SET STATUS = 'DELETED'
-        WHERE AID = ?
-    """, (aid,))
+        cursor.close()
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+    faq_engine.refresh(aid)
+    faq_changes.notify()
 
     return f"Question {aid} marked as DELETED."
 
 
 def update_question(aid: int, new_question: str):
-    conn = get_hana_connection()
-    cursor = conn.cursor()
+    with hana_pool.connection() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        SELECT STATUS
-        FROM CHATBOT_FAQ_QUESTIONS
-        WHERE AID = ?
-    """, (aid,))
+        cursor.execute("""
+            SELECT STATUS
+            FROM CHATBOT_FAQ_QUESTIONS
+            WHERE AID = ?
+        """, (aid,))
+
+        row = cursor.fetchone()
+        cursor.close()
 
-    row = cursor.fetchone()
     if not row:
         return {"error": "Question not found"}
 
     if row[0] != "PENDING":
         return {"error": "Only PENDING questions can be edited"}
 
-    cursor.execute("""
-        UPDATE CHATBOT_FAQ_QUESTIONS
-        SET QUESTION = ?
-        WHERE AID = ?
-    """, (new_question, aid))
+    # El vector de una PENDING sirve para agrupar duplicados: se recalcula con el texto nuevo
+    english_question = pending_english(new_question)
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with hana_pool.transaction() as conn:
+        cursor = conn.cursor()
+
+        model_id = faq_engine.model_for_write(cursor)
+        cursor.execute(f"""
+            UPDATE CHATBOT_FAQ_QUESTIONS
+            SET
+                QUESTION = ?,
+                QUESTION_VECTOR = VECTOR_EMBEDDING(?, 'DOCUMENT', '{model_id}'),
+                EMBEDDING_MODEL = ?,
+                QUESTION_VECTOR_NEXT = NULL,
+                EMBEDDING_MODEL_NEXT = NULL,
+                CHANGE_VERSION = ?
+            WHERE AID = ? AND STATUS = 'PENDING'
+        """, (new_question, english_question, model_id, faq_changes.bump(cursor), aid))
+        updated = cursor.rowcount == 1
+
+        cursor.close()
+
+    if not updated:
+        # Answered or deleted while the new text was being translated
+        return {"error": "Only PENDING questions can be edited"}
+
+    faq_engine.refresh(aid)
+    faq_changes.notify()
 
     return {"status": "updated", "aid": aid}
 
 
-def list_active_questions():
-    conn = get_hana_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT AID, QUESTION, CREATED_AT, CREATED_BY
-        FROM CHATBOT_FAQ_QUESTIONS
-        WHERE STATUS = 'ACTIVE'
-        ORDER BY CREATED_AT DESC
-    """)
-
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    return [
-        {
-            "aid": r[0],
-            "question": r[1],
-            "created_at": r[2].isoformat(),
-            "created_by": r[3]
-        }
-        for r in rows
-    ]
-
-
-def list_deleted_questions():
-    conn = get_hana_connection()
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT AID, QUESTION, CREATED_AT, CREATED_BY
-        FROM CHATBOT_FAQ_QUESTIONS
-        WHERE STATUS = 'DELETED'
-        ORDER BY CREATED_AT DESC
-    """)
-
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    return [
-        {
-            "aid": r[0],
-            "question": r[1],
-            "created_at": r[2].isoformat(),
-            "created_by": r[3]
-        }
-        for r in rows
-    ]
+def list_active_questions(**options):
+    return list(iter_question_list("ACTIVE", **options))
+
+
+def list_deleted_questions(**options):
+    return list(iter_question_list("DELETED", **options))
+
+
+def question_list_response(status: str):
+    """
+    Streams one admin list as JSON. Query parameters:
+    q (text filter), fields (e.g. aid,question), limit + after (keyset
+    pagination, returns {"items", "next"}) and count=true (only the total).
+    """
+    args = request.args
+    q = args.get("q") or None
+    try:
+        if args.get("count", "").lower() == "true":
+            return jsonify({"count": count_questions(hana_pool, status, q)})
+
+        fields = parse_fields(args.get("fields"))
+        limit = parse_limit(args.get("limit"))
+        after = args.get("after") or None
+        if after:
+            decode_cursor(after, len(QUESTION_LISTS[status][0]))
+    except ListQueryError as e:
+        abort(400, str(e))
+
+    page = {}
+    items = iter_question_list(status, fields=fields, q=q, after=after, limit=limit, page=page)
+    body = stream_json_page(items, page) if limit is not None else stream_json_array(items)
+    return Response(stream_with_context(body), mimetype="application/json")
 
 
 ###ROUTES DE CRUD
@@ -348,18 +456,19 @@ def restore_question():
     data = request.json
     aid = data["aid"]
 
-    conn = get_hana_connection()
-    cursor = conn.cursor()
+    with hana_pool.transaction() as conn:
+        cursor = conn.cursor()
 
-    cursor.execute("""
-        UPDATE CHATBOT_FAQ_QUESTIONS
-        SET STATUS = 'PENDING'
-        WHERE AID = ?
-    """, (aid,))
+        cursor.execute("""
+            UPDATE CHATBOT_FAQ_QUESTIONS
+            SET STATUS = 'PENDING', CHANGE_VERSION = ?
+            WHERE AID = ?
+        """, (faq_changes.bump(cursor), aid))
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+        cursor.close()
+
+    faq_engine.refresh(aid)
+    faq_changes.notify()
 
     return {"success": True}
 
@@ -378,7 +487,7 @@ def create_question():
 @app.route("/faq/pending", methods=["GET"])
 def get_pending():
     require_admin()
-    return jsonify(list_pending_questions())
+    return question_list_response("PENDING")
 
 @app.route("/faq/answer", methods=["POST"])
 def answer():
@@ -402,18 +511,82 @@ def update():
 @app.route("/faq/active", methods=["GET"])
 def get_active():
     require_admin()
-    return jsonify(list_active_questions())
+    return question_list_response("ACTIVE")
 
 @app.route("/faq/deleted", methods=["GET"])
 def get_deleted():
     require_admin()
-    return jsonify(list_deleted_questions())
+    return question_list_response("DELETED")
+
+def format_changed_date(status: str, value) -> str:
+    return QUESTION_LISTS.get(status, (ORDER_NEWEST_FIRST, format_iso_date))[1](value)
 
+@app.route("/faq/dashboard", methods=["GET"])
+def get_dashboard():
+    """
+    The three admin lists in one response plus the version token for /faq/changes.
+    The version is read first: anything written meanwhile shows up again as a delta.
+    """
+    require_admin()
+    try:
+        fields = parse_fields(request.args.get("fields"))
+    except ListQueryError as e:
+        abort(400, str(e))
+
+    version = faq_changes.current_version()
+    lists = {
+        status.lower(): list(iter_question_list(status, fields=fields))
+        for status in QUESTION_LISTS
+    }
+    return jsonify({
+        "version": version,
+        "counts": {name: len(items) for name, items in lists.items()},
+        **lists,
+    })
+
+@app.route("/faq/changes", methods=["GET"])
+def get_changes():
+    """
+    Questions changed after `since` (a version from /faq/dashboard or a previous
+    call), each with its current status. With `wait` (seconds) the call is held
+    open until something changes. `reset` asks the client to reload the dashboard;
+    `retry_after` (also sent as Retry-After) means no long-poll slot was free and
+    the client should wait that many seconds before the next call.
+    """
+    require_admin()
+    try:
+        since = parse_version(request.args.get("since"))
+        wait = float(request.args.get("wait", "0"))
+    except (ListQueryError, ValueError) as e:
+        abort(400, str(e))
+
+    version, retry_after = faq_changes.wait_for_change(since, wait)
+    if since > version:
+        return jsonify({"version": version, "changes": [], "reset": True})
+
+    changes = faq_changes.changes(since, version, format_changed_date) if version > since else []
+    result = {"version": version, "changes": changes, "reset": False}
+    if changes:
+        result["counts"] = {status.lower(): count for status, count in count_by_status(hana_pool).items()}
+    if retry_after is None:
+        return jsonify(result)
+    response = jsonify({**result, "retry_after": retry_after})
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+translation_memo = TranslationMemo()
+
+@traced("translate")
 def translate_to_english(text: str) -> str:
     """
-    Uses the same LLM to translate Spanish questions to English
-    for vector search normalization.
+    Uses the same LLM to translate non-English questions to English
+    for vector search normalization. Each distinct text is translated once.
     """
+    memo_key = normalize_answer(text)
+    translated = translation_memo.get(memo_key)
+    if translated is not None:
+        return translated
+
     prompt = f"""
 Translate the following question to English.
 Return ONLY the translated text, nothing else.
@@ -421,8 +594,127 @@ Return ONLY the translated text, nothing else.
 Question:
 {text}
 """
-    response = llm.invoke(prompt)
-    return response.content.strip()
+    with span("llm.invoke", "translate"):
+        response = llm.get().invoke(prompt)
+    translated = response.content.strip()
+    translation_memo.put(memo_key, translated)
+    return translated
+
+TRANSLATION_BATCH_SIZE = int(os.getenv("TRANSLATION_BATCH_SIZE", "20"))
+
+def translate_many(texts):
+    """
+    Batch form of translate_to_english: one LLM call per TRANSLATION_BATCH_SIZE
+    texts not yet in the memo. A batch whose reply cannot be parsed falls back
+    to one call per text.
+    """
+    translated = {}
+    missing = []
+    for text in dict.fromkeys(texts):
+        cached = translation_memo.get(normalize_answer(text))
+        if cached is not None:
+            translated[text] = cached
+        else:
+            missing.append(text)
+
+    for start in range(0, len(missing), TRANSLATION_BATCH_SIZE):
+        batch = missing[start:start + TRANSLATION_BATCH_SIZE]
+        prompt = f"""
+Translate each question of the following JSON array to English.
+Return ONLY a JSON array of strings with the translations, in the same order.
+
+{json.dumps(batch, ensure_ascii=False)}
+"""
+        with span("llm.invoke", "translate_batch"):
+            reply = llm.get().invoke(prompt).content.strip()
+        reply = reply.removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+        try:
+            results = json.loads(reply)
+        except ValueError:
+            results = None
+
+        if not (isinstance(results, list) and len(results) == len(batch)
+                and all(isinstance(r, str) for r in results)):
+            log_event("translation_batch_unusable", level="warning", texts=len(batch))
+            results = [translate_to_english(text) for text in batch]
+        else:
+            for text, result in zip(batch, results):
+                translation_memo.put(normalize_answer(text), result.strip())
+
+        translated.update((text, result.strip()) for text, result in zip(batch, results))
+
+    return [translated[text] for text in texts]
+
+faq_bulk = FaqBulkLoader(
+    hana_pool,
+    faq_engine.model_for_write,
+    translate_many=translate_many,
+    needs_translation=lambda text: needs_translation(text),
+    change_feed=faq_changes,
+    on_written=faq_engine.refresh_many,
+    has_category=faq_engine.has_category,
+)
+
+def pending_english(text: str) -> str:
+    return translate_to_english(text) if needs_translation(text) else text
+
+# Preguntas PENDING agrupadas por similitud; HIT_COUNT mide la demanda
+pending_questions = PendingQuestionQueue(
+    hana_pool,
+    faq_engine,
+    change_feed=faq_changes,
+    outbox=notification_outbox,
+    english=pending_english,
+)
+
+# Cambio de modelo de embeddings en línea (columnas sombra + cambio atómico)
+reembedding_job = ReembeddingJob(
+    hana_pool,
+    faq_engine,
+    translate_many=translate_many,
+    needs_translation=lambda text: needs_translation(text),
+    change_feed=faq_changes,
+)
+
+def read_bulk_rows():
+    """Body as JSON Lines (default) or CSV, chosen by ?format= or the Content-Type."""
+    fmt = request.args.get("format") or ("csv" if request.mimetype == "text/csv" else "jsonl")
+    try:
+        return parse_bulk_rows(request.get_data(as_text=True), fmt.lower())
+    except BulkInputError as e:
+        abort(400, str(e))
+
+@app.route("/faq/bulk/import", methods=["POST"])
+def bulk_import():
+    require_admin()
+    return jsonify(faq_bulk.import_rows(read_bulk_rows(), created_by=get_user_role()))
+
+@app.route("/faq/bulk/answer", methods=["POST"])
+def bulk_answer():
+    require_admin()
+    return jsonify(faq_bulk.answer_rows(read_bulk_rows()))
+
+@app.route("/faq/embeddings", methods=["GET"])
+def embeddings_status():
+    require_admin()
+    return jsonify(reembedding_job.status())
+
+@app.route("/faq/embeddings/reembed", methods=["POST"])
+def reembed():
+    """Starts re-embedding every question with {"model": "<model id>"}."""
+    require_admin()
+    data = request.json or {}
+    model = (data.get("model") or "").strip()
+    if not model:
+        abort(400, "Missing model")
+    try:
+        started = reembedding_job.start_job(model)
+    except ValueError as e:
+        abort(400, str(e))
+    if not started:
+        return jsonify({"started": False, "error": "A job is running or the model is already active",
+                        **reembedding_job.status()}), 409
+    return jsonify({"started": True, **reembedding_job.status()}), 202
 
 ###FUNCION DE JOULE
 @app.route("/joule/faq", methods=["POST"])
@@ -436,7 +728,7 @@ def joule_faq():
             "confidence": 0.0
         }), 400
 
-    result = faq_lookup(question)
+    result, english = search_faq(question, category=data.get("category"))
 
     if result.get("found"):
         return jsonify({
@@ -444,8 +736,8 @@ def joule_faq():
             "confidence": 0.9
         })
 
-    # Si no existe → registrar como pending (opcional)
-    create_pending_question(question, created_by="JOULE")
+    # Si no existe → registrar como pending, con la traducción que ya usó la búsqueda
+    create_pending_question(question, created_by="JOULE", english=english)
 
     return jsonify({
         "answer": (
@@ -472,17 +764,23 @@ def api_search():
         return jsonify({"found": False, "error": "No question provided"}), 400
 
     # CORRECCIÓN 2: Pasar la variable 'question', no el string "question"
-    result = faq_lookup(question)
+    result = faq_lookup(question, category=data.get("category"))
 
     if result.get("found"):
         return jsonify({
             "found": True,
-            "answer": result["answer"]
+            "answer": result["answer"],
+            "score": result["score"],
+            "margin": result["margin"],
+            "ambiguous": result["ambiguous"],
+            "candidates": result["candidates"]
         })
 
     return jsonify({
         "found": False,
-        "answer": None # Es bueno devolver explícitamente null o estructura vacía
+        "answer": None, # Es bueno devolver explícitamente null o estructura vacía
+        "margin": result["margin"],
+        "candidates": result["candidates"]
     })
 
 # 2. Herramienta de Registro (Register Tool)
@@ -517,86 +815,64 @@ def api_invoice():
 
 
 def needs_translation(text: str) -> bool:
-    spanish_words = ["qué", "cómo", "cuál", "cuáles", "para", "es", "son"]
-    t = text.lower()
-    return (
-        any(c in t for c in ["¿", "á", "é", "í", "ó", "ú", "ñ"])
-        or any(w in t.split() for w in spanish_words)
-    )
+    return not is_english(text)
 
 
-def faq_lookup(question: str):
+def faq_lookup(question: str, category: Optional[str] = None):
     """
     Searches the internal SAP FAQ knowledge base using HANA vector similarity.
-    Returns the stored answer if found, otherwise FAQ_NOT_FOUND.
-    """
-    conn = get_hana_connection()
-    cursor = conn.cursor()
-
-     # 1️⃣ Normalizar idioma
-    if needs_translation(question):
-        search_question = translate_to_english(question)
-    else:
-        search_question = question
-
-    question_sql = search_question.replace("'", "''")
-
-    sql = f"""
-        SELECT AID, QUESTION, SCORE
-        FROM (
-            SELECT
-                AID,
-                QUESTION,
-                COSINE_SIMILARITY(
-                    QUESTION_VECTOR,
-                    VECTOR_EMBEDDING(
-                        '{question_sql}',
-                        'QUERY',
-                        'SAP_NEB.20240715'
-                    )
-                ) AS SCORE
-            FROM CHATBOT_FAQ_QUESTIONS
-            WHERE STATUS = 'ACTIVE'
-              AND QUESTION_VECTOR IS NOT NULL
-        )
-        ORDER BY SCORE DESC
-        LIMIT 1
+    Returns found, answer and score of the best match, the margin to the second
+    best and the top candidate questions. When ambiguous=true two FAQs match
+    almost equally well: ask the user which candidate question they mean.
+    `category` optionally restricts the search to one FAQ category.
     """
+    return search_faq(question, category)[0]
 
-    cursor.execute(sql)
-    row = cursor.fetchone()
 
-    cursor.close()
-    conn.close()
+def search_faq(question: str, category: Optional[str] = None):
+    """faq_lookup plus the English text it searched with (None if it did not translate)."""
+    # 0️⃣ Pregunta idéntica ya resuelta (tras aplicar los cambios de otros workers)
+    faq_engine.sync()
+    cache_key = (" ".join(normalize_answer(question).split()), category)
+    cached = faq_engine.result_cache.get(cache_key)
+    if cached is not None:
+        return dict(cached), None
+    generation = faq_engine.generation
 
-    if not row:
-        return {"found": False}
-
-    aid, question_db, score = row
-
-    if score < SIMILARITY_THRESHOLD:
-        return {"found": False}
-
-    print(f"[FAQ] Best match AID={aid} SCORE={score}")
-
-
-    conn = get_hana_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT ANSWER FROM CHATBOT_FAQ_ANSWERS WHERE AID = ?",
-        (aid,)
-    )
-    row = cursor.fetchone()
-    cursor.close()
-    conn.close()
-
-    if not row or not row[0]:
-        return {"found": False}
-
-    return {
-        "found": True,
-        "answer": row[0]
+     # 1️⃣ Normalizar idioma
+    search = None
+    english = None
+    translate = needs_translation(question)
+
+    if FAQ_TRANSLATION_MODE == "direct" or not translate:
+        search = faq_engine.search(question, category=category)
+
+    if (search is None or search["best"] is None) and translate:
+        english = translate_to_english(question)
+        search = faq_engine.search(english, category=category)
+
+    best = search["best"]
+    candidates = search["candidates"]
+    margin = search["margin"]
+    result = {
+        "found": best is not None,
+        "margin": margin,
+        "candidates": [
+            {"aid": c["aid"], "question": c["question"], "score": c["score"]} for c in candidates
+        ],
     }
+    if best:
+        log_event("faq_match", aid=best["aid"], score=best["score"], margin=margin)
+        result["answer"] = best["answer"]
+        result["score"] = best["score"]
+        result["ambiguous"] = (
+            margin is not None
+            and margin < FAQ_AMBIGUOUS_MARGIN
+            and candidates[1]["score"] >= faq_engine.threshold
+        )
+
+    faq_engine.cache_result(cache_key, result, generation)
+    return dict(result), english
 
 
 def register_pending_faq(question: str) -> str:
@@ -646,97 +922,217 @@ def get_email_address(name: str) -> str:
 
 ### Function for the AI agent to send an email
 
-def send_email(recipient_name: str, email_address: str, email_text: str) -> str:
-    """Send an email to a recipient using SMTP and return a status message."""
-    # Usa las mismas variables que ya definiste arriba (temporalmente hardcodeadas)
-    smtp_server = "sandbox.smtp.mailtrap.io"
-    smtp_port = 587                 # STARTTLS (NO usar SMTP_SSL con 587)
-    smtp_user = os.getenv("MAILTRAP_SMTP_USER")
-    smtp_password = os.getenv("MAILTRAP_SMTP_PASS")  # Solo pruebas: NO dejar en claro en prod
-
+def build_email(recipient_name: str, email_address: str, email_text: str) -> str:
     # Contenido del correo (incluye saludo y despedida, opcional)
     content = f"Hola {recipient_name},\n\n{email_text}\n\nSaludos,\nSAP BTP AI Agent"
     msg = MIMEText(content, "plain", "utf-8")
     msg["Subject"] = "Email from your SAP BTP AI Agent"
-    msg["From"] = "SAP BTP AI Agent <ai-agent@btpaiagent.test>"
+    msg["From"] = smtp_sender
     msg["To"] = email_address
+    return msg.as_string()
 
-    # Conexión con STARTTLS en 587
-    context = ssl.create_default_context()
-    with smtplib.SMTP(smtp_server, smtp_port) as server:
-        server.ehlo()
-        server.starttls(context=context)     # << IMPORTANTE: elevar a TLS
-        server.ehlo()
-        server.login(smtp_user, smtp_password)
-        server.sendmail(smtp_user, [email_address], msg.as_string())
 
-    return f"I sent the email to {recipient_name} ({email_address}):\n{email_text}"
+def send_email(recipient_name: str, email_address: str, email_text: str) -> str:
+    """Send an email to a recipient using SMTP and return a status message."""
+    with span("smtp.send"):
+        smtp_sessions.send(smtp_envelope_from, [email_address], build_email(recipient_name, email_address, email_text))
 
+    return f"I sent the email to {recipient_name} ({email_address}):\n{email_text}"
 
-### Function for the AI agent to get the text from a website
-def get_text_from_link(url: str) -> str:
-    """Fetches and extracts readable text from a public webpage URL."""
 
-    try:
-        headers = {
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/120.0.0.0 Safari/537.36"
-            ),
-            "Accept-Language": "en-US,en;q=0.9",
-        }
+def send_many_emails(emails):
+    """Sends (recipient_name, email_address, email_text) tuples over one SMTP session.
 
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status()
+    Returns one entry per email: None when sent, otherwise the error.
+    """
+    with span("smtp.send", "batch"):
+        return smtp_sessions.send_many(
+            (smtp_envelope_from, [address], build_email(name, address, text))
+            for name, address, text in emails
+        )
 
-        soup = BeautifulSoup(response.text, "html.parser")
 
-        for tag in soup(["script", "style", "noscript"]):
-            tag.decompose()
+### Function for the AI agent to get the text from a website
+# Sesión HTTP compartida con caché en disco; el texto se extrae mientras se descarga
+page_fetcher = PageFetcher()
 
-        text = soup.get_text(separator=" ")
-        text = " ".join(text.split())
+def get_text_from_link(url: str) -> str:
+    """Fetches and extracts readable text from a public webpage URL."""
 
-        return text[:8000]
+    try:
+        return page_fetcher.fetch_text(url, max_chars=8000)
 
     except Exception as e:
         return f"Error fetching content from URL: {str(e)}"
 
 ### Function for the AI agent to get the name of the current program on TV station ARTE
-def get_live_tv_arte() -> str:
-   """Return the currently playing program on the ARTE TV channel."""
-   response = requests.get('https://api.arte.tv/api/player/v2/config/de/LIVE')
+def fetch_live_tv_arte() -> str:
+   response = requests.get('https://api.arte.tv/api/player/v2/config/de/LIVE', timeout=5)
+   response.raise_for_status()
    data = response.json()
    title = data['data']['attributes']['metadata']['title']
    description = data['data']['attributes']['metadata']['description']
 
    return title + ': ' + description
 
+# El programa cambia cada varias decenas de minutos: se cachea y se refresca en segundo plano
+arte_live = CachedUpstream("arte_live", fetch_live_tv_arte, ttl=300)
+
+def get_live_tv_arte() -> str:
+   """Return the currently playing program on the ARTE TV channel."""
+   try:
+      programme, stale = arte_live.get()
+   except Exception as e:
+      return f"Error fetching the ARTE live programme: {str(e)}"
+
+   if stale:
+      return programme + ' (this information may be outdated)'
+   return programme
+
 #############################
 # Setup the AI agent
 
-tools = [faq_lookup, register_pending_faq, get_invoice_status, get_email_address, send_email, get_text_from_link, get_live_tv_arte]
-llm = init_llm('anthropic--claude-3.5-sonnet', max_tokens=300)
-llm_with_tools = llm.bind_tools(tools)
+# Seconds each tool may take before the agent gets a timeout error instead
+TOOL_TIMEOUTS = {
+    "faq_lookup": 15,
+    "register_pending_faq": 10,
+    "get_invoice_status": 5,
+    "get_email_address": 5,
+    "send_email": 20,
+    "get_text_from_link": 20,
+    "get_live_tv_arte": 10,
+}
+# Runs the graph with ainvoke: independent tool calls of one turn execute concurrently
+AGENT_ASYNC = os.getenv("AGENT_ASYNC", "true").lower() == "true"
+
+def build_llm():
+    from gen_ai_hub.proxy.langchain.init_models import init_llm
+    # Resolving the deployment also fetches the AI Core token
+    return init_llm('anthropic--claude-3.5-sonnet', max_tokens=300)
+
+# Built on first use (or by the warm-up), not at import: imports and restarts stay fast
+llm = Lazy(build_llm, "llm")
 sys_msg = SystemMessage(content="""
 You are an AI assistant named 'SAP BTP AI Agent'.
 
 CRITICAL RULES (STRICT):
 1. For ANY question related to SAP, internal processes, or FAQs, you MUST call the faq_lookup tool FIRST.
 2. You are STRICTLY FORBIDDEN from answering from your own knowledge.
-3. If faq_lookup returns found=true:
+3. If faq_lookup returns found=true and ambiguous=false:
    - You MUST respond ONLY with the value of "answer".
    - You MUST NOT add explanations, summaries, or extra text.
-4. If faq_lookup returns found=false:
+4. If faq_lookup returns ambiguous=true:
+   - Do NOT answer. List the "question" of each candidate and ask the user which one they mean.
+   - Then call faq_lookup again with the question the user chose.
+5. If faq_lookup returns found=false:
    - Respond EXACTLY with: Esta pregunta no se encuentra registrada en la base de conocimientos.
    - Then ask: ¿Deseas registrar esta pregunta (Y/N)?
    - Do NOT call any tool until the user answers.
    
-5. Depending on the Language entered, you must base your answer, for example: If the user asks you in Spanish, your answer must be in the same language.
+6. Depending on the Language entered, you must base your answer, for example: If the user asks you in Spanish, your answer must be in the same language.
 
 Failure to follow these rules is an error.
 """)
+def summarize_turns(previous_summary: Optional[str], messages) -> str:
+    """Folds older messages into the rolling conversation summary."""
+    prompt = f"""
+Update the summary of a conversation between a user and an AI assistant.
+Keep names, invoice ids, email addresses, links, registered questions and
+any open request. Return ONLY the updated summary, at most 120 words.
+
+Current summary:
+{previous_summary or "(empty)"}
+
+New messages:
+{render_transcript(messages)}
+"""
+    with span("llm.invoke", "summary"):
+        response = llm.get().invoke(prompt)
+    return response.content.strip()
+
+
+def manage_context(state: AgentState):
+    """Keeps the prompt bounded: recent turns verbatim, older ones summarized."""
+    folded, _ = plan_window(state["messages"])
+    if not folded:
+        return {}
+
+    summary = state.get("conversation_summary")
+    try:
+        summary = summarize_turns(summary, folded)
+    except Exception as e:
+        # Se descartan igualmente para no romper el límite de tokens
+        log_event("conversation_summary_failed", level="error", error=str(e))
+
+    return {
+        "messages": [RemoveMessage(id=m.id) for m in folded],
+        "conversation_summary": summary,
+    }
+
+
+def build_prompt(state: AgentState):
+    messages = state["messages"]
+    if messages and isinstance(messages[0], SystemMessage):
+        return [with_summary(messages[0], state.get("conversation_summary"))] + messages[1:]
+    return messages
+
+
+def in_tool_flow(messages) -> bool:
+    """
+    True when the newest message answers a tool flow rather than asking something new:
+    a tool call is still open, or the previous turn used tools and ended asking the
+    user (e.g. which of two ambiguous FAQ candidates they mean).
+    """
+    previous_turn = []
+    for message in reversed(messages[:-1]):
+        if isinstance(message, HumanMessage):
+            break
+        previous_turn.append(message)
+    if not previous_turn:
+        return False
+
+    last = previous_turn[0]
+    if isinstance(last, ToolMessage) or (isinstance(last, AIMessage) and last.tool_calls):
+        return True
+    used_tools = any(isinstance(m, ToolMessage) for m in previous_turn)
+    return used_tools and isinstance(last.content, str) and last.content.rstrip().endswith("?")
+
+
+def faq_router(state: AgentState):
+    """Answers confident FAQ hits for new user questions; everything else goes to the LLM."""
+    if not FAQ_FASTPATH_ENABLED or state.get("pending_question"):
+        return {}
+
+    # Solo preguntas nuevas: no respuestas a mitad de un flujo de herramientas
+    messages = state["messages"]
+    if not messages or not isinstance(messages[-1], HumanMessage) or in_tool_flow(messages):
+        return {}
+
+    question = state.get("last_user_question")
+    if not question:
+        return {}
+
+    try:
+        result = faq_lookup(question)
+    except Exception as e:
+        log_event("faq_fastpath_failed", level="error", error=str(e))
+        return {}
+
+    if (
+        result.get("found")
+        and not result.get("ambiguous")
+        and result.get("score", 0.0) >= FAQ_FASTPATH_MIN_SCORE
+    ):
+        return {"messages": [AIMessage(content=result["answer"])]}
+    return {}
+
+
+def route_after_faq(state: AgentState):
+    if isinstance(state["messages"][-1], AIMessage):
+        return "end"
+    return "assistant"
+
+
 def assistant(state: AgentState):
     last_user_msg = state["messages"][-1].content
 
@@ -765,7 +1161,8 @@ def assistant(state: AgentState):
         return state
 
     # 2️⃣ Flujo normal
-    response = llm_with_tools.invoke(state["messages"])
+    with span("llm.invoke", "agent"):
+        response = agent.get().llm_with_tools.invoke(build_prompt(state))
     state["messages"].append(response)
 
     if (
@@ -778,52 +1175,57 @@ def assistant(state: AgentState):
 
 
 
-builder = StateGraph(AgentState)
-builder.add_node("assistant", assistant)
-builder.add_node("tools", ToolNode(tools))
-builder.add_edge(START, "assistant")
-builder.add_conditional_edges(
-   "assistant",
-   # If the latest message (result) from assistant is a tool call -> tools_condition routes to Tools
-   # If the latest message (result) from assistant is not a tool call -> tools_condition routes to END
-   tools_condition,
-)
-builder.add_edge("tools", "assistant")
-graph = builder.compile()
+Agent = namedtuple("Agent", ["graph", "llm_with_tools"])
 
 
-@app.route('/', methods=['POST'])
-def processing():
-   
-    default_input = "Has the invoice 1905 been paid?"
-    payload = request.get_json(silent=True) or {}  # evita 415 si el Content-Type no es JSON
-    
-    conversation_id = payload.get("conversation_id", "default")
-    user_input = payload.get("user_input")
-    
-    if not user_input:
-        return jsonify({"btpaiagent_response": "Entrada vacía"}), 400
+def build_agent() -> Agent:
+    from langgraph.graph import START, END, StateGraph
+    from langgraph.prebuilt import tools_condition, ToolNode
+    from agent_tools import build_tools
+
+    tools = build_tools(
+        [faq_lookup, register_pending_faq, get_invoice_status, get_email_address, send_email, get_text_from_link, get_live_tv_arte],
+        TOOL_TIMEOUTS,
+    )
+    llm_with_tools = llm.get().bind_tools(tools)
+
+    builder = StateGraph(AgentState)
+    builder.add_node("context", manage_context)
+    builder.add_node("faq_router", faq_router)
+    builder.add_node("assistant", assistant)
+    builder.add_node("tools", ToolNode(tools))
+    builder.add_edge(START, "context")
+    builder.add_edge("context", "faq_router")
+    builder.add_conditional_edges("faq_router", route_after_faq, {"assistant": "assistant", "end": END})
+    builder.add_conditional_edges(
+       "assistant",
+       # If the latest message (result) from assistant is a tool call -> tools_condition routes to Tools
+       # If the latest message (result) from assistant is not a tool call -> tools_condition routes to END
+       tools_condition,
+    )
+    builder.add_edge("tools", "assistant")
+    return Agent(builder.compile(), llm_with_tools)
 
+# LLM client, tool wrappers and compiled graph, built once per process on first use
+agent = Lazy(build_agent, "agent")
+
+
+def load_state(conversation_id: str, user_input: str):
     # Recuperar estado previo
-    state = SESSION_STORE.get(conversation_id, {
+    state = SESSION_STORE.get(conversation_id) or {
         "messages": [sys_msg],
         "pending_question": None
-    })
+    }
 
     state["messages"].append(HumanMessage(content=user_input))
     state["last_user_question"] = user_input
+    return state
 
-    # Ejecutar agente
-    agent_outcome = graph.invoke(state)
-
-    # Guardar estado actualizado
-    SESSION_STORE[conversation_id] = agent_outcome
-
-    response = agent_outcome["messages"][-1].content
 
+def build_response_log(messages) -> str:
     # The more detailed log of the agent's response
     messages_extract = []
-    for msg in agent_outcome['messages']:
+    for msg in messages:
         msg_actor = type(msg).__name__
         msg_text = msg.content
         if msg_actor == 'AIMessage':
@@ -832,12 +1234,146 @@ def processing():
         if msg_actor == 'ToolMessage':
             msg_actor = msg_actor + ' (' + msg.name + ')'
         messages_extract.append([msg_actor, msg_text])
-    btpaiagent_response_log = (str(messages_extract).replace('],', '],\n'))
+    return (str(messages_extract).replace('],', '],\n'))
+
+
+def chunk_text(content) -> str:
+    # Anthropic streams either plain strings or lists of content blocks
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "") for block in content
+        if isinstance(block, dict) and block.get("type") == "text"
+    )
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def tool_steps(msg):
+    """(status, tool_call_id, tool name) for the tool calls a message starts or finishes."""
+    steps = [("started", call["id"], call["name"]) for call in getattr(msg, "tool_calls", None) or []]
+    if type(msg).__name__ == "ToolMessage":
+        steps.append(("finished", msg.tool_call_id, msg.name))
+    return steps
+
+
+def stream_agent(conversation_id: str, state):
+    """Runs the graph and yields Server-Sent Events: tokens, tool steps, final result."""
+    agent_outcome = state
+    # Tool steps of earlier turns are already in the history and not reported again
+    reported = {(status, call_id) for msg in state["messages"] for status, call_id, _ in tool_steps(msg)}
+    try:
+        for mode, chunk in agent.get().graph.stream(state, stream_mode=["messages", "updates", "values"]):
+            if mode == "messages":
+                message, metadata = chunk
+                # Only the agent's own answer is streamed, not summaries or translations
+                if metadata.get("langgraph_node") == "assistant":
+                    text = chunk_text(message.content)
+                    if text:
+                        yield sse_event("token", {"text": text})
+
+            elif mode == "updates":
+                for node, update in chunk.items():
+                    if not isinstance(update, dict):
+                        continue
+                    # "assistant" returns the whole history, so report each tool step once
+                    for msg in update.get("messages", []):
+                        for status, call_id, tool in tool_steps(msg):
+                            if (status, call_id) not in reported:
+                                reported.add((status, call_id))
+                                yield sse_event("step", {"node": node, "tool": tool, "status": status})
+
+            elif mode == "values":
+                agent_outcome = chunk
+
+        # Guardar estado actualizado
+        SESSION_STORE.put(conversation_id, agent_outcome)
+
+        yield sse_event("done", {
+            "btpaiagent_response": chunk_text(agent_outcome["messages"][-1].content),
+            "btpaiagent_response_log": build_response_log(agent_outcome["messages"]),
+        })
+
+    except Exception as e:
+        log_event("agent_stream_failed", level="error", error=str(e))
+        yield sse_event("error", {"error": str(e)})
+
+
+@app.route('/', methods=['POST'])
+def processing():
+   
+    default_input = "Has the invoice 1905 been paid?"
+    payload = request.get_json(silent=True) or {}  # evita 415 si el Content-Type no es JSON
+    
+    conversation_id = payload.get("conversation_id", "default")
+    user_input = payload.get("user_input")
+    
+    if not user_input:
+        return jsonify({"btpaiagent_response": "Entrada vacía"}), 400
+
+    state = load_state(conversation_id, user_input)
+
+    # Streaming (SSE) si el cliente lo pide
+    if payload.get("stream") or "text/event-stream" in request.headers.get("Accept", ""):
+        return Response(
+            stream_with_context(stream_agent(conversation_id, state)),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    # Ejecutar agente
+    graph = agent.get().graph
+    if AGENT_ASYNC:
+        agent_outcome = asyncio.run(graph.ainvoke(state))
+    else:
+        agent_outcome = graph.invoke(state)
+
+    # Guardar estado actualizado
+    SESSION_STORE.put(conversation_id, agent_outcome)
+
+    response = agent_outcome["messages"][-1].content
+    btpaiagent_response_log = build_response_log(agent_outcome['messages'])
 
 	# Return the response and the log
     return jsonify({'btpaiagent_response': response, 'btpaiagent_response_log': btpaiagent_response_log})
 
+STARTUP_WARMUP_CONNECTIONS = int(os.getenv("STARTUP_WARMUP_CONNECTIONS", "2"))
+
+def load_faq_index():
+    if faq_engine.index is not None:
+        faq_engine.load_index()
+
+WARMUP_STEPS = [
+    ("hana_pool", lambda: hana_pool.warm(STARTUP_WARMUP_CONNECTIONS)),
+    ("embedding_model", lambda: faq_engine.check_model(force=True)),
+    ("faq_index", load_faq_index),
+    ("llm", llm.get),
+    ("agent", agent.get),
+]
+
+def start_background_workers():
+    notification_outbox.start()
+    reembedding_job.start()
+    startup.begin(WARMUP_STEPS)
+
+
+def shutdown():
+    """Releases external resources when a worker exits."""
+    startup.drain()
+    notification_outbox.stop()
+    reembedding_job.stop()
+    smtp_sessions.close()
+    hana_pool.close_all()
+
+
+startup.imported()
+
+
 if __name__ == "__main__":
+    # Servidor de desarrollo; en Cloud Foundry se usa gunicorn (ver gunicorn.conf.py)
+    start_background_workers()
     port = int(os.getenv("PORT", 8080))
     app.run(
         host="0.0.0.0",
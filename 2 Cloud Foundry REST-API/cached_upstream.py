@@ -0,0 +1,114 @@
+import threading, time
+from telemetry import log_event
+
+
+# Every CachedUpstream registers itself here so their stats can be served together
+UPSTREAMS = {}
+
+
+class CachedUpstream:
+    """Caches the result of a slow external API call (stale-while-revalidate).
+
+    - Fresh values are served directly; within `refresh_ahead` seconds of
+      expiry a background refresh is started so callers rarely wait.
+    - Expired values up to `max_stale` seconds old are served immediately,
+      flagged as stale, while a background refresh runs.
+    - Otherwise the call happens inline; if it fails and an older value
+      exists, that value is served flagged as stale.
+
+    `fetch` must enforce its own network timeout.
+    """
+
+    def __init__(self, name, fetch, ttl=300, refresh_ahead=None, max_stale=3600):
+        self.name = name
+        self.fetch = fetch
+        self.ttl = ttl
+        self.refresh_ahead = ttl * 0.2 if refresh_ahead is None else refresh_ahead
+        self.max_stale = max_stale
+
+        self._value = None
+        self._fetched_at = None
+        self._last_error = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self.stats = {"hits": 0, "stale_served": 0, "inline_fetches": 0,
+                      "background_refreshes": 0, "errors": 0}
+        UPSTREAMS[name] = self
+
+    def _store(self, value):
+        with self._lock:
+            self._value = value
+            self._fetched_at = time.monotonic()
+            self._last_error = None
+
+    def _fail(self, error):
+        with self._lock:
+            self._last_error = str(error)
+            self.stats["errors"] += 1
+        log_event("upstream_refresh_failed", level="warning", upstream=self.name, error=str(error))
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self.stats["background_refreshes"] += 1
+
+        def run():
+            try:
+                self._store(self.fetch())
+            except Exception as e:
+                self._fail(e)
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name=f"refresh-{self.name}", daemon=True).start()
+
+    def get(self):
+        """Returns `(value, stale)`; raises only when no value was ever fetched."""
+        with self._lock:
+            value = self._value
+            age = time.monotonic() - self._fetched_at if self._fetched_at is not None else None
+
+        if age is not None and age < self.ttl:
+            with self._lock:
+                self.stats["hits"] += 1
+            if age >= self.ttl - self.refresh_ahead:
+                self._refresh_in_background()
+            return value, False
+
+        if age is not None and age < self.ttl + self.max_stale:
+            with self._lock:
+                self.stats["stale_served"] += 1
+            self._refresh_in_background()
+            return value, True
+
+        with self._lock:
+            self.stats["inline_fetches"] += 1
+        try:
+            fresh = self.fetch()
+        except Exception as e:
+            self._fail(e)
+            if value is None:
+                raise
+            with self._lock:
+                self.stats["stale_served"] += 1
+            return value, True
+
+        self._store(fresh)
+        return fresh, False
+
+    def status(self):
+        with self._lock:
+            age = time.monotonic() - self._fetched_at if self._fetched_at is not None else None
+            return {
+                "ttl": self.ttl,
+                "age": round(age, 1) if age is not None else None,
+                "last_error": self._last_error,
+                **self.stats,
+            }
+
+
+def upstreams_status():
+    return {name: upstream.status() for name, upstream in UPSTREAMS.items()}
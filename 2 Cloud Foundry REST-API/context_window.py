@@ -0,0 +1,91 @@
+import os
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, ToolMessage
+
+
+# Turns (a user message plus everything the agent did in response) kept verbatim
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "4"))
+# Older turns are folded into the summary once the history exceeds this many turns,
+# so the summarizer runs every few turns instead of on every request
+CONTEXT_FOLD_AFTER = int(os.getenv("CONTEXT_FOLD_AFTER", "8"))
+# Character budget of the verbatim turns (roughly 4 characters per token)
+CONTEXT_MAX_CHARS = int(os.getenv("CONTEXT_MAX_CHARS", "12000"))
+
+TRANSCRIPT_LINE_CHARS = 500
+
+
+def _message_chars(message) -> int:
+    content = message.content
+    if isinstance(content, str):
+        return len(content)
+    return len(str(content))
+
+
+def split_turns(messages):
+    """Splits a history into leading system messages and turns.
+
+    Each turn starts at a HumanMessage, so an AIMessage with tool calls
+    and its ToolMessages always land in the same turn.
+    """
+    head = []
+    i = 0
+    while i < len(messages) and isinstance(messages[i], SystemMessage):
+        head.append(messages[i])
+        i += 1
+
+    turns = []
+    for message in messages[i:]:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return head, turns
+
+
+def plan_window(messages, keep_turns=CONTEXT_KEEP_TURNS,
+                fold_after=CONTEXT_FOLD_AFTER, max_chars=CONTEXT_MAX_CHARS):
+    """Returns `(folded, kept)`: messages to summarize away and turns to keep.
+
+    Nothing is folded until there are more than `fold_after` turns or the
+    history goes over `max_chars`; the latest turn is always kept.
+    """
+    _, turns = split_turns(messages)
+    total_chars = sum(_message_chars(m) for turn in turns for m in turn)
+
+    if len(turns) <= fold_after and total_chars <= max_chars:
+        return [], turns
+
+    kept = turns[-keep_turns:] if keep_turns > 0 else turns[-1:]
+    folded_turns = turns[:len(turns) - len(kept)]
+
+    while len(kept) > 1 and sum(_message_chars(m) for turn in kept for m in turn) > max_chars:
+        folded_turns.append(kept.pop(0))
+
+    folded = [m for turn in folded_turns for m in turn]
+    return folded, kept
+
+
+def render_transcript(messages) -> str:
+    """Plain-text transcript of messages for the summarizer prompt."""
+    lines = []
+    for message in messages:
+        text = message.content if isinstance(message.content, str) else str(message.content)
+        if isinstance(message, HumanMessage):
+            actor = "User"
+        elif isinstance(message, ToolMessage):
+            actor = f"Tool ({message.name})"
+        elif isinstance(message, AIMessage):
+            actor = "Assistant"
+            if not text and message.tool_calls:
+                text = "[tool call: " + ", ".join(c["name"] for c in message.tool_calls) + "]"
+        else:
+            actor = "System"
+        lines.append(f"{actor}: {text[:TRANSCRIPT_LINE_CHARS]}")
+    return "\n".join(lines)
+
+
+def with_summary(system_message, summary):
+    """Appends the rolling conversation summary to the system prompt."""
+    if not summary:
+        return system_message
+    return SystemMessage(
+        content=f"{system_message.content}\n\nSummary of the earlier conversation:\n{summary}"
+    )
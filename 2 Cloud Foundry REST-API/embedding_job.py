@@ -0,0 +1,337 @@
+import os, re, threading, time, uuid
+from faq_bulk import BULK_TEXT_TABLE, english_texts, prepare_text_table
+from telemetry import log_event
+
+
+REEMBED_BATCH_SIZE = int(os.getenv("REEMBED_BATCH_SIZE", "100"))
+# Share of wall time the job may keep HANA busy; the pause after a batch
+# grows with the batch's duration, so a loaded database slows the job down
+REEMBED_DUTY_CYCLE = float(os.getenv("REEMBED_DUTY_CYCLE", "0.25"))
+REEMBED_MIN_PAUSE = float(os.getenv("REEMBED_MIN_PAUSE", "1"))
+REEMBED_POLL_SECONDS = float(os.getenv("REEMBED_POLL_SECONDS", "60"))
+# A worker that stops renewing its claim for this long is presumed dead
+REEMBED_LEASE_SECONDS = 300
+
+# Model ids end up as SQL literals inside VECTOR_EMBEDDING
+MODEL_ID_RE = re.compile(r"^[A-Za-z0-9_.\-]{1,100}$")
+
+PENDING_ROWS_SQL = """
+    SELECT TOP {limit} AID, QUESTION
+    FROM CHATBOT_FAQ_QUESTIONS
+    WHERE AID > ?
+      AND QUESTION_VECTOR IS NOT NULL
+      AND (EMBEDDING_MODEL_NEXT IS NULL OR EMBEDDING_MODEL_NEXT <> ?)
+    ORDER BY AID
+"""
+
+
+class ReembeddingJob:
+    """Rebuilds every question vector with a new model while lookups keep running.
+
+    Vectors for the target model go to the shadow columns
+    QUESTION_VECTOR_NEXT / EMBEDDING_MODEL_NEXT in AID order; progress
+    (LAST_AID) lives in CHATBOT_FAQ_EMBEDDING_STATE, so any worker can
+    resume the job after a restart. Writers clear the shadow of the rows
+    they re-embed, and a catch-up pass picks those up again.
+
+    The switch is one transaction: it locks the state row (writers take
+    the same lock through `FaqSearchEngine.model_for_write`), embeds what
+    is still missing, swaps the columns for every row and sets the new
+    ACTIVE_MODEL. Stragglers are translated before the lock is taken, so
+    writers never wait for the LLM; if a row that needs a translation
+    shows up in between, the switch is retried on the next round. Lookups
+    only compare rows of their own model; the switch bumps the FAQ
+    version, so other processes re-read the active model on their next
+    `FaqSearchEngine.sync`.
+
+    Schema: migrations/001_faq_schema.sql, section 2.
+    """
+
+    def __init__(self, pool, engine, translate_many, needs_translation, change_feed=None):
+        self.pool = pool
+        self.engine = engine
+        self.change_feed = change_feed
+        self.translate_many = translate_many
+        self.needs_translation = needs_translation
+        self.worker_id = uuid.uuid4().hex
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.batches = 0
+        self.throttled_seconds = 0.0
+
+    def start_job(self, target_model: str):
+        """Marks a re-embedding to `target_model` as RUNNING; returns False if one is already running."""
+        if not MODEL_ID_RE.match(target_model):
+            raise ValueError(f"Invalid model id: {target_model}")
+        with self.pool.transaction() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    SELECT ACTIVE_MODEL, STATUS FROM CHATBOT_FAQ_EMBEDDING_STATE
+                    WHERE ID = 1 FOR UPDATE
+                """)
+                active_model, status = cursor.fetchone()
+                if status == "RUNNING" or active_model == target_model:
+                    return False
+
+                cursor.execute(
+                    "SELECT COUNT(*) FROM CHATBOT_FAQ_QUESTIONS WHERE QUESTION_VECTOR IS NOT NULL"
+                )
+                total = cursor.fetchone()[0]
+                cursor.execute("""
+                    UPDATE CHATBOT_FAQ_EMBEDDING_STATE
+                    SET TARGET_MODEL = ?, STATUS = 'RUNNING', LAST_AID = 0, PROCESSED = 0,
+                        TOTAL = ?, CLAIMED_BY = NULL, CLAIMED_AT = NULL,
+                        STARTED_AT = CURRENT_UTCTIMESTAMP, FINISHED_AT = NULL, LAST_ERROR = NULL
+                    WHERE ID = 1
+                """, (target_model, total))
+            finally:
+                cursor.close()
+
+        self._wake.set()
+        return True
+
+    def status(self):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT ACTIVE_MODEL, TARGET_MODEL, STATUS, LAST_AID, PROCESSED, TOTAL,
+                       CLAIMED_BY, STARTED_AT, FINISHED_AT, LAST_ERROR
+                FROM CHATBOT_FAQ_EMBEDDING_STATE WHERE ID = 1
+            """)
+            row = cursor.fetchone()
+            cursor.close()
+
+        if not row:
+            return {"active_model": self.engine.model_id, "status": "NOT_CONFIGURED"}
+        (active_model, target_model, status, last_aid, processed, total,
+         claimed_by, started_at, finished_at, last_error) = row
+        return {
+            "active_model": active_model,
+            "target_model": target_model,
+            "status": status,
+            "last_aid": last_aid,
+            "processed": processed,
+            "total": total,
+            "running_here": claimed_by == self.worker_id,
+            "started_at": started_at.isoformat() if started_at else None,
+            "finished_at": finished_at.isoformat() if finished_at else None,
+            "last_error": last_error,
+            "batches": self.batches,
+            "throttled_seconds": round(self.throttled_seconds, 1),
+        }
+
+    def _claim(self):
+        """Takes or renews the lease on a RUNNING job; returns (target, last_aid) or None."""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("""
+                    UPDATE CHATBOT_FAQ_EMBEDDING_STATE
+                    SET CLAIMED_BY = ?, CLAIMED_AT = CURRENT_UTCTIMESTAMP
+                    WHERE ID = 1
+                      AND STATUS = 'RUNNING'
+                      AND (CLAIMED_BY IS NULL OR CLAIMED_BY = ?
+                           OR CLAIMED_AT < ADD_SECONDS(CURRENT_UTCTIMESTAMP, ?))
+                """, (self.worker_id, self.worker_id, -REEMBED_LEASE_SECONDS))
+                if cursor.rowcount != 1:
+                    return None
+                cursor.execute(
+                    "SELECT TARGET_MODEL, LAST_AID FROM CHATBOT_FAQ_EMBEDDING_STATE WHERE ID = 1"
+                )
+                return cursor.fetchone()
+            finally:
+                cursor.close()
+
+    def _pending_rows(self, cursor, target, after_aid, limit):
+        cursor.execute(PENDING_ROWS_SQL.format(limit=int(limit)), (after_aid, target))
+        return cursor.fetchall()
+
+    def _english(self, rows):
+        """English text to embed for each `(aid, question)` row; may call the LLM."""
+        return english_texts([question for _, question in rows], self.translate_many, self.needs_translation)
+
+    def _write_shadow(self, rows, target, advance=False):
+        """Embeds `(aid, question)` rows into the shadow columns; False when the lease was lost.
+
+        The LLM runs first. The transaction then locks the state row before
+        the MERGE touches any question row, the order every writer uses,
+        and with `advance` moves LAST_AID past the batch.
+        """
+        texts = [(aid, text) for (aid, _), text in zip(rows, self._english(rows))]
+        with self.pool.transaction() as conn:
+            cursor = conn.cursor()
+            try:
+                # Staging DDL commits on its own, so it has to run before the lock is taken
+                prepare_text_table(cursor)
+                cursor.execute("""
+                    SELECT STATUS FROM CHATBOT_FAQ_EMBEDDING_STATE
+                    WHERE ID = 1 AND CLAIMED_BY = ? FOR UPDATE
+                """, (self.worker_id,))
+                row = cursor.fetchone()
+                if not row or row[0] != "RUNNING":
+                    return False
+                self._merge_shadow(cursor, texts, target)
+                if advance:
+                    cursor.execute("""
+                        UPDATE CHATBOT_FAQ_EMBEDDING_STATE
+                        SET LAST_AID = ?, PROCESSED = PROCESSED + ?, CLAIMED_AT = CURRENT_UTCTIMESTAMP
+                        WHERE ID = 1
+                    """, (rows[-1][0], len(rows)))
+            finally:
+                cursor.close()
+        return True
+
+    def _merge_shadow(self, cursor, texts, target):
+        """Embeds `(aid, english text)` pairs into the shadow columns; no LLM involved.
+
+        The caller has prepared the staging table and holds the state row lock.
+        """
+        cursor.executemany(f"INSERT INTO {BULK_TEXT_TABLE} (AID, TEXT) VALUES (?, ?)", texts)
+        cursor.execute(f"""
+            MERGE INTO CHATBOT_FAQ_QUESTIONS Q
+            USING {BULK_TEXT_TABLE} T
+                ON Q.AID = T.AID
+            WHEN MATCHED THEN UPDATE SET
+                QUESTION_VECTOR_NEXT = VECTOR_EMBEDDING(T.TEXT, 'DOCUMENT', '{target}'),
+                EMBEDDING_MODEL_NEXT = ?
+        """, (target,))
+        cursor.execute(f"DELETE FROM {BULK_TEXT_TABLE}")
+
+    def run_batch(self):
+        """Processes one batch; returns True when more work is left."""
+        claim = self._claim()
+        if not claim:
+            return False
+        target, last_aid = claim
+
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            rows = self._pending_rows(cursor, target, last_aid or 0, REEMBED_BATCH_SIZE)
+            cursor.close()
+
+        if not rows:
+            return self._switch(target)
+
+        if not self._write_shadow(rows, target, advance=True):
+            return False
+        self.batches += 1
+        return True
+
+    def _catch_up(self, target):
+        """Embeds rows written since the main pass went by them; returns how many."""
+        done = 0
+        while True:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                rows = self._pending_rows(cursor, target, 0, REEMBED_BATCH_SIZE)
+                cursor.close()
+            if rows and not self._write_shadow(rows, target):
+                return done
+            done += len(rows)
+            if len(rows) < REEMBED_BATCH_SIZE:
+                return done
+
+    def _switch(self, target):
+        """Makes `target` the active model; returns True when it has to be retried later."""
+        # Most stragglers are handled before any lock is taken
+        self._catch_up(target)
+
+        # Rows written meanwhile are translated now: under the lock only HANA work is done
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            stragglers = self._pending_rows(cursor, target, 0, REEMBED_BATCH_SIZE)
+            cursor.close()
+        english = dict(zip((question for _, question in stragglers), self._english(stragglers)))
+
+        with self.pool.transaction() as conn:
+            cursor = conn.cursor()
+            try:
+                # Staging DDL commits on its own, so it has to run before the lock is taken
+                prepare_text_table(cursor)
+                cursor.execute("""
+                    SELECT TARGET_MODEL, STATUS, CLAIMED_BY FROM CHATBOT_FAQ_EMBEDDING_STATE
+                    WHERE ID = 1 FOR UPDATE
+                """)
+                if tuple(cursor.fetchone()) != (target, "RUNNING", self.worker_id):
+                    return False
+
+                rows = self._pending_rows(cursor, target, 0, REEMBED_BATCH_SIZE + 1)
+                untranslated = [q for _, q in rows if q not in english and self.needs_translation(q)]
+                if len(rows) > REEMBED_BATCH_SIZE or untranslated:
+                    # Too many new rows, or some need the LLM: release the lock and go round again
+                    return True
+                if self.change_feed is not None:
+                    # Tells every other process to re-read the active model
+                    self.change_feed.bump(cursor)
+                if rows:
+                    self._merge_shadow(cursor, [(aid, english.get(q, q)) for aid, q in rows], target)
+                cursor.execute("""
+                    UPDATE CHATBOT_FAQ_QUESTIONS SET
+                        QUESTION_VECTOR = QUESTION_VECTOR_NEXT,
+                        EMBEDDING_MODEL = EMBEDDING_MODEL_NEXT,
+                        QUESTION_VECTOR_NEXT = NULL,
+                        EMBEDDING_MODEL_NEXT = NULL
+                    WHERE EMBEDDING_MODEL_NEXT = ?
+                """, (target,))
+                cursor.execute("""
+                    UPDATE CHATBOT_FAQ_EMBEDDING_STATE
+                    SET ACTIVE_MODEL = ?, TARGET_MODEL = NULL, STATUS = 'IDLE',
+                        CLAIMED_BY = NULL, FINISHED_AT = CURRENT_UTCTIMESTAMP
+                    WHERE ID = 1
+                """, (target,))
+            finally:
+                cursor.close()
+
+        log_event("reembedding_switched", model=target, caught_up_in_switch=len(rows))
+        self.engine.use_model(target)
+        if self.change_feed is not None:
+            self.change_feed.notify()
+        return False
+
+    def _fail(self, error):
+        log_event("reembedding_batch_failed", level="error", error=str(error))
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE CHATBOT_FAQ_EMBEDDING_STATE SET LAST_ERROR = ?
+                    WHERE ID = 1 AND CLAIMED_BY = ?
+                """, (str(error)[:1000], self.worker_id))
+                cursor.close()
+        except Exception as e:
+            log_event("reembedding_error_not_recorded", level="error", error=str(e))
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                more = self.run_batch()
+            except Exception as e:
+                self._fail(e)
+                more = False
+
+            if more:
+                # Duty-cycle throttle: a batch that took t seconds is followed by a pause
+                # of t * (1 - duty) / duty, never shorter than REEMBED_MIN_PAUSE
+                elapsed = time.monotonic() - started
+                pause = max(REEMBED_MIN_PAUSE, elapsed * (1 - REEMBED_DUTY_CYCLE) / REEMBED_DUTY_CYCLE)
+                self.throttled_seconds += pause
+                self._stop.wait(pause)
+            else:
+                self._wake.wait(REEMBED_POLL_SECONDS)
+                self._wake.clear()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="reembedding-job", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
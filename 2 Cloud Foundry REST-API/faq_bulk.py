@@ -0,0 +1,340 @@
+import csv, io, json, os, time
+from telemetry import log_event
+
+
+FAQ_BULK_MAX_ROWS = int(os.getenv("FAQ_BULK_MAX_ROWS", "10000"))
+# Rows per transaction; a failing chunk is rolled back on its own
+FAQ_BULK_CHUNK_SIZE = int(os.getenv("FAQ_BULK_CHUNK_SIZE", "200"))
+
+# Per-connection staging table for the texts to embed
+BULK_TEXT_TABLE = "#FAQ_BULK_TEXT"
+
+INSERT_QUESTION_SQL = """
+    INSERT INTO CHATBOT_FAQ_QUESTIONS
+    (AID, QUESTION, STATUS, CREATED_AT, CREATED_BY, CHANGE_VERSION{category_column})
+    VALUES (?, ?, 'PENDING', CURRENT_TIMESTAMP, ?, ?{category_value})
+"""
+INSERT_ANSWER_SQL = "INSERT INTO CHATBOT_FAQ_ANSWERS (AID, ANSWER) VALUES (?, ?)"
+
+
+class BulkInputError(ValueError):
+    pass
+
+
+def parse_bulk_rows(text: str, fmt: str):
+    """
+    Parses a JSON Lines or CSV (with header) upload into
+    `{"row": n, "data": {...}}` or `{"row": n, "error": "..."}` entries.
+    """
+    rows = []
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames:
+            raise BulkInputError("CSV header row is missing")
+        for n, record in enumerate(reader, start=1):
+            if None in record:
+                rows.append({"row": n, "error": "Too many columns"})
+            else:
+                rows.append({"row": n, "data": record})
+    elif fmt == "jsonl":
+        n = 0
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            n += 1
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                rows.append({"row": n, "error": f"Invalid JSON: {e}"})
+                continue
+            if isinstance(record, dict):
+                rows.append({"row": n, "data": record})
+            else:
+                rows.append({"row": n, "error": "Each line must be a JSON object"})
+    else:
+        raise BulkInputError("format must be jsonl or csv")
+
+    if not rows:
+        raise BulkInputError("No rows found")
+    if len(rows) > FAQ_BULK_MAX_ROWS:
+        raise BulkInputError(f"At most {FAQ_BULK_MAX_ROWS} rows per upload")
+    return rows
+
+
+def _text(record, key):
+    value = record.get(key)
+    return str(value).strip() if value is not None else ""
+
+
+def english_texts(questions, translate_many, needs_translation):
+    """English text to embed for each question, translating only those that need it."""
+    todo = [q for q in questions if needs_translation(q)]
+    translated = dict(zip(todo, translate_many(todo))) if todo else {}
+    return [translated.get(q, q) for q in questions]
+
+
+def prepare_text_table(cursor):
+    """Creates or empties the staging table of this connection.
+
+    DDL commits on its own in HANA, so call this before the first DML of
+    a transaction.
+    """
+    cursor.execute("""
+        SELECT COUNT(*) FROM M_TEMPORARY_TABLES
+        WHERE TABLE_NAME = ? AND CONNECTION_ID = CURRENT_CONNECTION
+    """, (BULK_TEXT_TABLE,))
+    if not cursor.fetchone()[0]:
+        cursor.execute(f"""
+            CREATE LOCAL TEMPORARY COLUMN TABLE {BULK_TEXT_TABLE} (
+                AID INTEGER PRIMARY KEY,
+                TEXT NVARCHAR(5000)
+            )
+        """)
+    cursor.execute(f"DELETE FROM {BULK_TEXT_TABLE}")
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class FaqBulkLoader:
+    """Imports and answers FAQs in chunks instead of one request per row.
+
+    Each chunk translates its questions in batches (`translate_many`),
+    writes with executemany and computes all embeddings with one MERGE
+    over a staging table, then commits. Every row gets its own status in
+    the report, so a bad row or a failed chunk never hides the others.
+
+    Imported PENDING questions do not notify the admin: a seed file is
+    reviewed as a whole, not mail by mail.
+    """
+
+    def __init__(self, pool, model_for_write, translate_many, needs_translation,
+                 change_feed, on_written=None, chunk_size=FAQ_BULK_CHUNK_SIZE,
+                 has_category=lambda: True):
+        self.pool = pool
+        # Called on the chunk's cursor; returns the model the vectors must be built with
+        self.model_for_write = model_for_write
+        # Whether the optional CATEGORY column exists; without it categories are dropped
+        self.has_category = has_category
+        self.translate_many = translate_many
+        self.needs_translation = needs_translation
+        self.change_feed = change_feed
+        self.on_written = on_written
+        self.chunk_size = chunk_size
+
+    def _translated(self, questions):
+        return english_texts(questions, self.translate_many, self.needs_translation)
+
+    def _embed_and_activate(self, cursor, texts, model, version):
+        """One set-based statement embeds every (aid, text) and activates the question."""
+        cursor.executemany(f"INSERT INTO {BULK_TEXT_TABLE} (AID, TEXT) VALUES (?, ?)", texts)
+        cursor.execute(f"""
+            MERGE INTO CHATBOT_FAQ_QUESTIONS Q
+            USING {BULK_TEXT_TABLE} T
+                ON Q.AID = T.AID
+            WHEN MATCHED THEN UPDATE SET
+                QUESTION_VECTOR = VECTOR_EMBEDDING(T.TEXT, 'DOCUMENT', '{model}'),
+                EMBEDDING_MODEL = ?,
+                QUESTION_VECTOR_NEXT = NULL,
+                EMBEDDING_MODEL_NEXT = NULL,
+                STATUS = 'ACTIVE',
+                CHANGE_VERSION = ?
+        """, (model, version))
+        cursor.execute(f"DELETE FROM {BULK_TEXT_TABLE}")
+
+    def _run(self, rows, validate, write_chunk):
+        started = time.monotonic()
+        results = {}
+        valid = []
+
+        for entry in rows:
+            if "error" in entry:
+                results[entry["row"]] = {"row": entry["row"], "status": "error", "error": entry["error"]}
+                continue
+            item, error = validate(entry["data"])
+            if error:
+                results[entry["row"]] = {"row": entry["row"], "status": "error", "error": error}
+            else:
+                item["row"] = entry["row"]
+                valid.append(item)
+
+        for chunk in _chunks(valid, self.chunk_size):
+            try:
+                chunk_results, written = write_chunk(chunk)
+            except Exception as e:
+                log_event("bulk_chunk_rolled_back", level="error", rows=len(chunk), error=str(e))
+                chunk_results = [
+                    {"row": item["row"], "status": "error", "error": f"Chunk rolled back: {e}"}
+                    for item in chunk
+                ]
+                written = []
+            for result in chunk_results:
+                results[result["row"]] = result
+            if written:
+                self.change_feed.notify()
+                if self.on_written:
+                    self.on_written(written)
+
+        elapsed = time.monotonic() - started
+        ordered = [results[n] for n in sorted(results)]
+        succeeded = sum(1 for r in ordered if r["status"] != "error")
+        return {
+            "rows": len(ordered),
+            "succeeded": succeeded,
+            "failed": len(ordered) - succeeded,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(len(ordered) / elapsed, 1) if elapsed > 0 else None,
+            "results": ordered,
+        }
+
+    def import_rows(self, rows, created_by="IMPORT"):
+        """
+        Rows: question, optional answer, created_by and category. Answered rows
+        become ACTIVE. Categories are ignored when the CATEGORY column does not exist.
+        """
+
+        def validate(record):
+            question = _text(record, "question")
+            if not question:
+                return None, "Missing question"
+            return {
+                "question": question,
+                "answer": _text(record, "answer") or None,
+                "created_by": _text(record, "created_by") or created_by,
+                "category": _text(record, "category") or None,
+            }, None
+
+        return self._run(rows, validate, self._import_chunk)
+
+    def _import_chunk(self, chunk):
+        answered = [item for item in chunk if item["answer"]]
+        english = self._translated([item["question"] for item in answered])
+        with_category = self.has_category()
+        insert_sql = INSERT_QUESTION_SQL.format(
+            category_column=", CATEGORY" if with_category else "",
+            category_value=", ?" if with_category else "",
+        )
+
+        with self.pool.transaction() as conn:
+            cursor = conn.cursor()
+            try:
+                prepare_text_table(cursor)
+
+                cursor.execute(
+                    "SELECT CHATBOT_FAQ_AID_SEQ.NEXTVAL FROM SERIES_GENERATE_INTEGER(1, 0, ?)",
+                    (len(chunk),),
+                )
+                for item, (aid,) in zip(chunk, cursor.fetchall()):
+                    item["aid"] = aid
+
+                # Same lock order as every other writer: embedding state row, then version row
+                model = self.model_for_write(cursor)
+                version = self.change_feed.bump(cursor)
+                cursor.executemany(insert_sql, [
+                    (item["aid"], item["question"], item["created_by"], version)
+                    + ((item["category"],) if with_category else ())
+                    for item in chunk
+                ])
+                if answered:
+                    cursor.executemany(INSERT_ANSWER_SQL, [
+                        (item["aid"], item["answer"]) for item in answered
+                    ])
+                    self._embed_and_activate(cursor, [
+                        (item["aid"], text) for item, text in zip(answered, english)
+                    ], model, version)
+            finally:
+                cursor.close()
+
+        results = [
+            {
+                "row": item["row"],
+                "aid": item["aid"],
+                "status": "imported",
+                "question_status": "ACTIVE" if item["answer"] else "PENDING",
+            }
+            for item in chunk
+        ]
+        return results, [item["aid"] for item in chunk]
+
+    def answer_rows(self, rows):
+        """Rows: aid and answer. Later rows for the same AID win over earlier ones."""
+        last_row = {}
+
+        def validate(record):
+            answer = _text(record, "answer")
+            try:
+                aid = int(record.get("aid"))
+            except (TypeError, ValueError):
+                return None, "Missing or invalid aid"
+            if not answer:
+                return None, "Missing answer"
+            return {"aid": aid, "answer": answer}, None
+
+        for entry in rows:
+            if "data" in entry:
+                item, error = validate(entry["data"])
+                if not error:
+                    last_row[item["aid"]] = entry["row"]
+
+        def write(chunk):
+            superseded = [item for item in chunk if last_row[item["aid"]] != item["row"]]
+            current = [item for item in chunk if last_row[item["aid"]] == item["row"]]
+            results, written = self._answer_chunk(current) if current else ([], [])
+            results += [
+                {"row": item["row"], "aid": item["aid"], "status": "skipped",
+                 "error": f"Superseded by row {last_row[item['aid']]}"}
+                for item in superseded
+            ]
+            return results, written
+
+        return self._run(rows, validate, write)
+
+    def _answer_chunk(self, chunk):
+        aids = [item["aid"] for item in chunk]
+        placeholders = ", ".join("?" for _ in aids)
+
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT AID, QUESTION FROM CHATBOT_FAQ_QUESTIONS WHERE AID IN ({placeholders})",
+                aids,
+            )
+            questions = dict(cursor.fetchall())
+            cursor.close()
+
+        results = [
+            {"row": item["row"], "aid": item["aid"], "status": "error", "error": "Question not found"}
+            for item in chunk if item["aid"] not in questions
+        ]
+        found = [item for item in chunk if item["aid"] in questions]
+        if not found:
+            return results, []
+
+        # La traducción usa el LLM: se hace antes de abrir la transacción
+        english = self._translated([questions[item["aid"]] for item in found])
+        found_aids = [item["aid"] for item in found]
+        placeholders = ", ".join("?" for _ in found_aids)
+
+        with self.pool.transaction() as conn:
+            cursor = conn.cursor()
+            try:
+                prepare_text_table(cursor)
+                cursor.execute(
+                    f"DELETE FROM CHATBOT_FAQ_ANSWERS WHERE AID IN ({placeholders})",
+                    found_aids,
+                )
+                cursor.executemany(INSERT_ANSWER_SQL, [
+                    (item["aid"], item["answer"]) for item in found
+                ])
+                model = self.model_for_write(cursor)
+                version = self.change_feed.bump(cursor)
+                self._embed_and_activate(cursor, list(zip(found_aids, english)), model, version)
+            finally:
+                cursor.close()
+
+        results += [
+            {"row": item["row"], "aid": item["aid"], "status": "answered"} for item in found
+        ]
+        return results, found_aids
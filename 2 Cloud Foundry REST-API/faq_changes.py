@@ -0,0 +1,143 @@
+import os, threading, time
+from faq_lists import ListQueryError
+
+
+# Upper bound for one long-poll; stays well below the gunicorn and router timeouts
+FAQ_CHANGES_MAX_WAIT = float(os.getenv("FAQ_CHANGES_MAX_WAIT", "25"))
+# Changes made by other workers / instances are noticed by re-reading the counter this often
+FAQ_CHANGES_POLL_SECONDS = float(os.getenv("FAQ_CHANGES_POLL_SECONDS", "2"))
+# Long-polls occupy a worker thread; beyond this many they answer immediately
+FAQ_CHANGES_MAX_WAITERS = int(os.getenv("FAQ_CHANGES_MAX_WAITERS", "4"))
+# ...and tell the client to come back after this many seconds
+FAQ_CHANGES_RETRY_AFTER = int(os.getenv("FAQ_CHANGES_RETRY_AFTER", "5"))
+
+CHANGED_ROWS_SQL = """
+    SELECT AID, CREATED_AT, QUESTION, CREATED_BY, STATUS, HIT_COUNT, LAST_ASKED_AT
+    FROM CHATBOT_FAQ_QUESTIONS
+    WHERE CHANGE_VERSION > ? AND CHANGE_VERSION <= ?
+    ORDER BY CHANGE_VERSION
+"""
+
+CHANGED_STATUS_SQL = """
+    SELECT AID, STATUS
+    FROM CHATBOT_FAQ_QUESTIONS
+    WHERE CHANGE_VERSION > ? AND CHANGE_VERSION <= ?
+"""
+
+
+def parse_version(token) -> int:
+    try:
+        value = int(token)
+    except (TypeError, ValueError):
+        raise ListQueryError("since must be a version token")
+    if value < 0:
+        raise ListQueryError("since must be a version token")
+    return value
+
+
+class FaqChangeFeed:
+    """Version counter for the FAQ tables, used for admin delta polling.
+
+    Every write to CHATBOT_FAQ_QUESTIONS calls `bump(cursor)` inside its
+    transaction and stamps the affected row with the returned version.
+    The counter row stays locked until commit, so versions become visible
+    in order and `since` tokens never skip a change.
+
+    Schema: migrations/001_faq_schema.sql, section 1.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._changed = threading.Condition()
+        self._waiters = threading.BoundedSemaphore(FAQ_CHANGES_MAX_WAITERS)
+        self.bumps = 0
+        self.polls = 0
+        self.turned_away = 0
+
+    def bump(self, cursor) -> int:
+        """Increments the counter on the caller's (transactional) cursor."""
+        cursor.execute("UPDATE CHATBOT_FAQ_VERSION SET VERSION = VERSION + 1 WHERE ID = 1")
+        cursor.execute("SELECT VERSION FROM CHATBOT_FAQ_VERSION WHERE ID = 1")
+        return cursor.fetchone()[0]
+
+    def notify(self):
+        """Wakes local long-polls after the bumping transaction has committed."""
+        with self._changed:
+            self.bumps += 1
+            self._changed.notify_all()
+
+    def current_version(self, cursor=None) -> int:
+        if cursor is not None:
+            cursor.execute("SELECT VERSION FROM CHATBOT_FAQ_VERSION WHERE ID = 1")
+            return cursor.fetchone()[0]
+
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                return self.current_version(cursor)
+            finally:
+                cursor.close()
+
+    def wait_for_change(self, since: int, timeout: float):
+        """Returns `(version, retry_after)` as soon as the version is past `since`, or after `timeout`.
+
+        `retry_after` is None, unless every waiter slot is taken: then the
+        current version comes back at once, and the client should wait
+        that many seconds before it polls again.
+        """
+        version = self.current_version()
+        if version > since or timeout <= 0:
+            return version, None
+        if not self._waiters.acquire(blocking=False):
+            self.turned_away += 1
+            return version, FAQ_CHANGES_RETRY_AFTER
+
+        try:
+            deadline = time.monotonic() + min(timeout, FAQ_CHANGES_MAX_WAIT)
+            while version <= since:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                with self._changed:
+                    self._changed.wait(min(remaining, FAQ_CHANGES_POLL_SECONDS))
+                self.polls += 1
+                version = self.current_version()
+            return version, None
+        finally:
+            self._waiters.release()
+
+    def changes(self, since: int, version: int, format_date):
+        """Current state of every question changed in (since, version]."""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(CHANGED_ROWS_SQL, (since, version))
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+
+        return [
+            {
+                "aid": aid,
+                "question": question,
+                "created_at": format_date(status, created_at),
+                "created_by": created_by,
+                "status": status,
+                "hits": hits,
+                "last_asked_at": format_date(status, last_asked_at) if last_asked_at else None,
+            }
+            for aid, created_at, question, created_by, status, hits, last_asked_at in rows
+        ]
+
+    def changed_statuses(self, since: int, version: int):
+        """(aid, current status) of every question changed in (since, version]."""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(CHANGED_STATUS_SQL, (since, version))
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+    def stats(self):
+        return {"bumps": self.bumps, "polls": self.polls, "turned_away": self.turned_away}
@@ -0,0 +1,125 @@
+import json, threading
+import numpy as np
+
+
+def parse_vector(text) -> np.ndarray:
+    """Converts HANA's textual REAL_VECTOR ('[0.1,0.2,...]') to float32."""
+    return np.asarray(json.loads(text), dtype=np.float32)
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class LocalFaqIndex:
+    """In-process copy of the ACTIVE FAQ vectors for brute-force cosine search.
+
+    Rows are L2-normalized once on insert and kept in one contiguous
+    float32 matrix, so a lookup is a single matrix-vector product. Rows
+    may carry a category; a category lookup also sees uncategorized rows.
+    """
+
+    def __init__(self, initial_capacity=64):
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._capacity = initial_capacity
+        self._count = 0
+        self._aids = []          # row -> aid
+        self._categories = []    # row -> category (None = shared)
+        self._rows = {}          # aid -> row
+        self._entries = {}       # aid -> (question, answer)
+
+    def __len__(self):
+        return self._count
+
+    def load(self, rows):
+        """Replaces the whole index with `(aid, vector, question, answer, category)` rows."""
+        rows = list(rows)
+        vectors = [_unit(np.asarray(v, dtype=np.float32)) for _, v, _, _, _ in rows]
+
+        capacity = max(self._capacity, len(rows))
+        matrix = None
+        if vectors:
+            matrix = np.zeros((capacity, vectors[0].shape[0]), dtype=np.float32)
+            matrix[:len(vectors)] = np.stack(vectors)
+
+        with self._lock:
+            self._matrix = matrix
+            self._count = len(rows)
+            self._aids = [aid for aid, _, _, _, _ in rows]
+            self._categories = [category for _, _, _, _, category in rows]
+            self._rows = {aid: i for i, aid in enumerate(self._aids)}
+            self._entries = {aid: (q, a) for aid, _, q, a, _ in rows}
+
+    def upsert(self, aid, vector, question, answer, category=None):
+        vector = _unit(np.asarray(vector, dtype=np.float32))
+
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self._capacity, vector.shape[0]), dtype=np.float32)
+
+            row = self._rows.get(aid)
+            if row is None:
+                if self._count == self._matrix.shape[0]:
+                    grown = np.zeros((self._matrix.shape[0] * 2, self._matrix.shape[1]), dtype=np.float32)
+                    grown[:self._count] = self._matrix[:self._count]
+                    self._matrix = grown
+                row = self._count
+                self._count += 1
+                self._aids.append(aid)
+                self._categories.append(category)
+                self._rows[aid] = row
+
+            self._matrix[row] = vector
+            self._categories[row] = category
+            self._entries[aid] = (question, answer)
+
+    def remove(self, aid):
+        with self._lock:
+            row = self._rows.pop(aid, None)
+            if row is None:
+                return
+            self._entries.pop(aid, None)
+
+            # Move the last row into the hole to keep the matrix contiguous
+            last = self._count - 1
+            if row != last:
+                moved_aid = self._aids[last]
+                self._matrix[row] = self._matrix[last]
+                self._aids[row] = moved_aid
+                self._categories[row] = self._categories[last]
+                self._rows[moved_aid] = row
+            self._aids.pop()
+            self._categories.pop()
+            self._count -= 1
+
+    def top_k(self, query_vector, k=1, category=None):
+        """Returns up to k `(aid, question, answer, score)` tuples, best first."""
+        query = _unit(np.asarray(query_vector, dtype=np.float32))
+
+        with self._lock:
+            if not self._count:
+                return []
+            scores = self._matrix[:self._count] @ query
+            if category is not None:
+                allowed = np.fromiter(
+                    (c is None or c == category for c in self._categories),
+                    dtype=bool, count=self._count,
+                )
+                candidates = np.flatnonzero(allowed)
+            else:
+                candidates = np.arange(self._count)
+
+            k = min(k, len(candidates))
+            if not k:
+                return []
+            if k < len(candidates):
+                best = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            else:
+                best = candidates
+            best = best[np.argsort(-scores[best])]
+            return [
+                (self._aids[i], *self._entries[self._aids[i]], float(scores[i]))
+                for i in best
+            ]
@@ -0,0 +1,251 @@
+import json, base64
+from datetime import datetime
+
+
+# Public field name -> column
+LIST_COLUMNS = {
+    "aid": "AID",
+    "question": "QUESTION",
+    "created_at": "CREATED_AT",
+    "created_by": "CREATED_BY",
+    "hits": "HIT_COUNT",
+    "last_asked_at": "LAST_ASKED_AT",
+}
+# Not a column: the latest differently-worded copies folded into a PENDING question
+VARIANTS_FIELD = "variants"
+LIST_FIELDS = [*LIST_COLUMNS, VARIANTS_FIELD]
+DEFAULT_FIELDS = ["aid", "question", "created_at", "created_by", "hits"]
+CLUSTER_FIELDS = DEFAULT_FIELDS + ["last_asked_at", VARIANTS_FIELD]
+VARIANTS_PER_QUESTION = 10
+
+# Sort orders as (column, descending); AID last keeps every order total
+ORDER_NEWEST_FIRST = (("CREATED_AT", True), ("AID", True))
+ORDER_BY_DEMAND = (("HIT_COUNT", True), ("CREATED_AT", False), ("AID", False))
+
+LIST_MAX_LIMIT = 1000
+FETCH_BATCH_SIZE = 200
+
+SELECT_COLUMNS = ["AID", "CREATED_AT", "QUESTION", "CREATED_BY", "HIT_COUNT", "LAST_ASKED_AT"]
+
+
+class ListQueryError(ValueError):
+    pass
+
+
+def _cursor_value(value):
+    return {"ts": value.isoformat()} if isinstance(value, datetime) else value
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps([_cursor_value(v) for v in values]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str, size=None):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        values = [
+            datetime.fromisoformat(v["ts"]) if isinstance(v, dict) else v
+            for v in values
+        ]
+    except Exception:
+        raise ListQueryError("Invalid cursor")
+    if size is not None and len(values) != size:
+        raise ListQueryError("Invalid cursor")
+    return values
+
+
+def parse_fields(fields):
+    """Requested field names, or None for the list's defaults."""
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in names if f not in LIST_FIELDS]
+    if unknown:
+        raise ListQueryError(f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+
+def parse_limit(limit):
+    if limit is None or limit == "":
+        return None
+    try:
+        value = int(limit)
+    except ValueError:
+        raise ListQueryError("limit must be an integer")
+    if not 1 <= value <= LIST_MAX_LIMIT:
+        raise ListQueryError(f"limit must be between 1 and {LIST_MAX_LIMIT}")
+    return value
+
+
+def _filters(status, q):
+    where = ["STATUS = ?"]
+    params = [status]
+    if q:
+        escaped = q.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        where.append("LOWER(QUESTION) LIKE ? ESCAPE '\\'")
+        params.append(f"%{escaped}%")
+    return where, params
+
+
+def _keyset(order, values):
+    """(c1 > v1) OR (c1 = v1 AND c2 > v2) OR ..., with < for descending columns."""
+    terms = []
+    params = []
+    for i, (column, descending) in enumerate(order):
+        parts = [f"{c} = ?" for c, _ in order[:i]]
+        parts.append(f"{column} {'<' if descending else '>'} ?")
+        terms.append("(" + " AND ".join(parts) + ")")
+        params += list(values[:i]) + [values[i]]
+    return "(" + " OR ".join(terms) + ")", params
+
+
+def build_list_query(status, order, q=None, after=None, limit=None):
+    """SELECT for one status list in the given order, keyset-paginated."""
+    where, params = _filters(status, q)
+
+    if after:
+        predicate, keyset_params = _keyset(order, decode_cursor(after, len(order)))
+        where.append(predicate)
+        params += keyset_params
+
+    order_by = ", ".join(f"{column} {'DESC' if descending else 'ASC'}" for column, descending in order)
+    sql = f"""
+        SELECT {', '.join(SELECT_COLUMNS)}
+        FROM CHATBOT_FAQ_QUESTIONS
+        WHERE {' AND '.join(where)}
+        ORDER BY {order_by}
+    """
+    if limit is not None:
+        # One extra row tells whether a next page exists
+        sql += f" LIMIT {int(limit) + 1}"
+    return sql, params
+
+
+def count_questions(pool, status, q=None) -> int:
+    where, params = _filters(status, q)
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT COUNT(*) FROM CHATBOT_FAQ_QUESTIONS WHERE {' AND '.join(where)}",
+            params,
+        )
+        count = cursor.fetchone()[0]
+        cursor.close()
+    return count
+
+
+def count_by_status(pool) -> dict:
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT STATUS, COUNT(*) FROM CHATBOT_FAQ_QUESTIONS GROUP BY STATUS")
+        counts = {status: count for status, count in cursor.fetchall()}
+        cursor.close()
+    return counts
+
+
+def fetch_variants(cursor, aids, format_date):
+    """Latest VARIANTS_PER_QUESTION folded copies per AID, newest first."""
+    if not aids:
+        return {}
+    placeholders = ", ".join("?" for _ in aids)
+    cursor.execute(f"""
+        SELECT AID, QUESTION, CREATED_BY, CREATED_AT
+        FROM (
+            SELECT AID, QUESTION, CREATED_BY, CREATED_AT,
+                   ROW_NUMBER() OVER (PARTITION BY AID ORDER BY CREATED_AT DESC) AS RN
+            FROM CHATBOT_FAQ_QUESTION_HITS
+            WHERE AID IN ({placeholders})
+        )
+        WHERE RN <= {VARIANTS_PER_QUESTION}
+        ORDER BY AID, CREATED_AT DESC
+    """, list(aids))
+
+    variants = {}
+    for aid, question, created_by, created_at in cursor.fetchall():
+        variants.setdefault(aid, []).append({
+            "question": question,
+            "created_by": created_by,
+            "created_at": format_date(created_at),
+        })
+    return variants
+
+
+def iter_questions(pool, status, order, format_date, fields=None,
+                   q=None, after=None, limit=None, page=None):
+    """Yields projected question dicts, one keyset page of rows per pool checkout.
+
+    Each page of FETCH_BATCH_SIZE rows is read on a pooled connection that
+    goes back to the pool before its rows are yielded, so a slow client
+    never holds a connection. As with client-side paging, a row whose sort
+    key changes between two pages may show up twice or not at all; the
+    change feed reports it. When `limit` is set and more rows exist, the
+    cursor for the next page is stored in `page["next"]`.
+    """
+    fields = fields or DEFAULT_FIELDS
+    with_variants = VARIANTS_FIELD in fields
+    positions = [SELECT_COLUMNS.index(column) for column, _ in order]
+    remaining = limit
+
+    while True:
+        size = FETCH_BATCH_SIZE if remaining is None else min(FETCH_BATCH_SIZE, remaining)
+        sql, params = build_list_query(status, order, q, after, size)
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+                more = len(rows) > size
+                rows = rows[:size]
+                variants = (
+                    fetch_variants(cursor, [row[0] for row in rows], format_date)
+                    if with_variants and rows else {}
+                )
+            finally:
+                cursor.close()
+
+        for row in rows:
+            aid, created_at, question, created_by, hits, last_asked_at = row
+            values = {
+                "aid": aid,
+                "question": question,
+                "created_at": format_date(created_at),
+                "created_by": created_by,
+                "hits": hits,
+                "last_asked_at": format_date(last_asked_at) if last_asked_at else None,
+                VARIANTS_FIELD: variants.get(aid, []),
+            }
+            yield {name: values[name] for name in fields}
+
+        if not more:
+            return
+        after = encode_cursor([rows[-1][i] for i in positions])
+        if remaining is not None:
+            remaining -= len(rows)
+            if remaining == 0:
+                if page is not None:
+                    page["next"] = after
+                return
+
+
+def stream_json_array(items, chunk_size=FETCH_BATCH_SIZE):
+    """Serializes an iterable of dicts as a JSON array, a chunk of items at a time."""
+    yield "["
+    buffer = []
+    first = True
+    for item in items:
+        buffer.append(json.dumps(item, ensure_ascii=False))
+        if len(buffer) >= chunk_size:
+            yield ("" if first else ",") + ",".join(buffer)
+            first = False
+            buffer = []
+    if buffer:
+        yield ("" if first else ",") + ",".join(buffer)
+    yield "]"
+
+
+def stream_json_page(items, page):
+    """Serializes a page as {"items": [...], "next": cursor-or-null}."""
+    yield '{"items":'
+    yield from stream_json_array(items)
+    yield ',"next":' + json.dumps(page.get("next")) + "}"
@@ -0,0 +1,148 @@
+import os
+from telemetry import log_event
+
+
+# Incoming questions at least this similar to a PENDING one are folded into it
+PENDING_DUPLICATE_THRESHOLD = float(os.getenv("PENDING_DUPLICATE_THRESHOLD", "0.90"))
+
+NEAREST_PENDING_SQL = """
+    SELECT TOP 1 AID, COSINE_SIMILARITY(QUESTION_VECTOR, TO_REAL_VECTOR(?)) AS SCORE
+    FROM CHATBOT_FAQ_QUESTIONS
+    WHERE STATUS = 'PENDING'
+      AND QUESTION_VECTOR IS NOT NULL
+      AND EMBEDDING_MODEL = ?
+      {changed_since}
+    ORDER BY SCORE DESC
+"""
+
+
+class PendingQuestionQueue:
+    """Registers unanswered questions, folding near-duplicates into one PENDING row.
+
+    The incoming question is embedded (in English, like the FAQ corpus)
+    and compared with the PENDING questions without taking any lock. A
+    close enough match only gets its HIT_COUNT raised and the wording
+    recorded as a variant; no new row and no new admin email. Only a new
+    row takes the state-row lock of the FAQ writers, and under it the
+    rows registered since the unlocked check are compared again, so a
+    burst of identical questions still ends up as one row.
+
+    Schema: migrations/001_faq_schema.sql, section 3.
+    """
+
+    def __init__(self, pool, engine, change_feed, outbox, english,
+                 threshold=PENDING_DUPLICATE_THRESHOLD):
+        self.pool = pool
+        self.engine = engine
+        self.change_feed = change_feed
+        self.outbox = outbox
+        # Text -> English text to embed (memoized translation)
+        self.english = english
+        self.threshold = threshold
+        self.inserted = 0
+        self.folded = 0
+
+    def _nearest(self, question, english):
+        """Returns (text, model_id, vector, version seen, nearest PENDING match) or Nones."""
+        try:
+            text = english or self.english(question)
+            model_id = self.engine.model_id
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    # Read first: rows committed after it carry a higher CHANGE_VERSION
+                    seen = self.change_feed.current_version(cursor)
+                    vector = self.engine.document_vector(text, model_id, cursor)
+                    cursor.execute(NEAREST_PENDING_SQL.format(changed_since=""), (vector, model_id))
+                    return text, model_id, vector, seen, cursor.fetchone()
+                finally:
+                    cursor.close()
+        except Exception as e:
+            # La pregunta se registra igualmente, solo sin deduplicar
+            log_event("pending_embedding_failed", level="warning", error=str(e))
+            return None, None, None, None, None
+
+    def _fold(self, cursor, aid, question, created_by) -> bool:
+        """Counts one more ask of PENDING row `aid`; False if it is no longer PENDING."""
+        version = self.change_feed.bump(cursor)
+        cursor.execute("""
+            UPDATE CHATBOT_FAQ_QUESTIONS
+            SET HIT_COUNT = HIT_COUNT + 1,
+                LAST_ASKED_AT = CURRENT_TIMESTAMP,
+                CHANGE_VERSION = ?
+            WHERE AID = ? AND STATUS = 'PENDING'
+        """, (version, aid))
+        if cursor.rowcount != 1:
+            return False
+        cursor.execute("""
+            INSERT INTO CHATBOT_FAQ_QUESTION_HITS (AID, QUESTION, CREATED_BY, CREATED_AT)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        """, (aid, question, created_by))
+        return True
+
+    def register(self, question: str, created_by: str, english=None) -> dict:
+        """Returns {"aid", "duplicate", "score"} for the row the question ended up in.
+
+        `english` is the English text of the question when the caller already
+        translated it (e.g. for the FAQ search that missed).
+        """
+        text, model_id, vector, seen, match = self._nearest(question, english)
+        result = None
+
+        if match and match[1] >= self.threshold:
+            with self.pool.transaction() as conn:
+                cursor = conn.cursor()
+                try:
+                    if self._fold(cursor, match[0], question, created_by):
+                        result = {"aid": match[0], "duplicate": True, "score": float(match[1])}
+                finally:
+                    cursor.close()
+            match = None
+
+        if result is None:
+            result = self._insert(question, created_by, text, model_id, vector, seen, match)
+
+        if result["duplicate"]:
+            self.folded += 1
+            log_event("pending_folded", aid=result["aid"], score=round(result["score"], 3))
+        else:
+            self.inserted += 1
+            self.outbox.wake()
+        self.change_feed.notify()
+        return result
+
+    def _insert(self, question, created_by, text, model_id, vector, seen, match):
+        with self.pool.transaction() as conn:
+            cursor = conn.cursor()
+            try:
+                locked_model = self.engine.model_for_write(cursor)
+                if vector is not None:
+                    if locked_model != model_id:
+                        vector = self.engine.document_vector(text, locked_model, cursor)
+                    # Same question registered by another request since the unlocked check
+                    cursor.execute(
+                        NEAREST_PENDING_SQL.format(changed_since="AND CHANGE_VERSION > ?"),
+                        (vector, locked_model, seen),
+                    )
+                    late = cursor.fetchone()
+                    if late and late[1] >= self.threshold and self._fold(cursor, late[0], question, created_by):
+                        return {"aid": late[0], "duplicate": True, "score": float(late[1])}
+
+                version = self.change_feed.bump(cursor)
+                cursor.execute("SELECT CHATBOT_FAQ_AID_SEQ.NEXTVAL FROM DUMMY")
+                aid = cursor.fetchone()[0]
+                cursor.execute("""
+                    INSERT INTO CHATBOT_FAQ_QUESTIONS
+                    (AID, QUESTION, STATUS, CREATED_AT, CREATED_BY, CHANGE_VERSION,
+                     HIT_COUNT, LAST_ASKED_AT, QUESTION_VECTOR, EMBEDDING_MODEL)
+                    VALUES (?, ?, 'PENDING', CURRENT_TIMESTAMP, ?, ?,
+                            1, CURRENT_TIMESTAMP, TO_REAL_VECTOR(?), ?)
+                """, (aid, question, created_by, version, vector, locked_model if vector is not None else None))
+                # El aviso al administrador se confirma en la misma transacción
+                self.outbox.enqueue(cursor, question, created_by)
+                return {"aid": aid, "duplicate": False, "score": float(match[1]) if match else None}
+            finally:
+                cursor.close()
+
+    def stats(self):
+        return {"inserted": self.inserted, "folded": self.folded, "threshold": self.threshold}
@@ -0,0 +1,529 @@
+import os, time, threading
+from caches import LRUCache
+from telemetry import log_event
+
+
+# Model assumed before the first read of CHATBOT_FAQ_EMBEDDING_STATE, which is
+# authoritative afterwards (see migrations/001_faq_schema.sql and embedding_job.py)
+EMBEDDING_MODEL_ID = os.getenv("FAQ_EMBEDDING_MODEL", "SAP_NEB.20240715")
+# How often each process re-reads the active model, to follow a switch made elsewhere
+FAQ_MODEL_CHECK_SECONDS = float(os.getenv("FAQ_MODEL_CHECK_SECONDS", "30"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("FAQ_EMBEDDING_CACHE_SIZE", "1024"))
+# "hana" scans in the database, "local" matches against an in-process NumPy index:
+# a question whose query vector is cached is then answered without a HANA round
+# trip until FAQ_VERSION_CHECK_SECONDS have passed since the last version read
+FAQ_SEARCH_MODE = os.getenv("FAQ_SEARCH_MODE", "hana").lower()
+# Full reload interval of the local index; a safety net, writes made elsewhere
+# are picked up through CHATBOT_FAQ_VERSION (see FaqSearchEngine.sync)
+FAQ_INDEX_RELOAD_SECONDS = float(os.getenv("FAQ_INDEX_RELOAD_SECONDS", "300"))
+# Final faq_lookup results keyed on the normalized question text
+FAQ_RESULT_CACHE_SIZE = int(os.getenv("FAQ_RESULT_CACHE_SIZE", "2048"))
+FAQ_RESULT_CACHE_TTL = float(os.getenv("FAQ_RESULT_CACHE_TTL", "300"))
+# How long a read of the FAQ version counter is trusted, and so the staleness bound
+# across workers: a write made elsewhere shows up here at most this much later (own
+# writes refresh at once). Within it, cache hits and local-index lookups skip HANA;
+# 0 reads the counter on every lookup
+FAQ_VERSION_CHECK_SECONDS = float(os.getenv("FAQ_VERSION_CHECK_SECONDS", "1"))
+# Candidates returned per lookup; the first two give the margin of the best hit
+FAQ_TOP_K = int(os.getenv("FAQ_TOP_K", "3"))
+# "auto" uses the HNSW index on QUESTION_VECTOR when HANA reports one, "off" always scans
+FAQ_VECTOR_INDEX = os.getenv("FAQ_VECTOR_INDEX", "auto").lower()
+# After a failed index query (or none found) the exact scan is used for this long
+FAQ_VECTOR_INDEX_RETRY_SECONDS = float(os.getenv("FAQ_VECTOR_INDEX_RETRY_SECONDS", "600"))
+
+# The query vector is computed once per distinct question and kept as its
+# textual form ('[0.1,0.2,...]') so it can be bound back with TO_REAL_VECTOR.
+QUERY_EMBEDDING_SQL = """
+    SELECT TO_NVARCHAR(VECTOR_EMBEDDING(?, 'QUERY', '{model}'))
+    FROM DUMMY
+"""
+
+DOCUMENT_EMBEDDING_SQL = """
+    SELECT TO_NVARCHAR(VECTOR_EMBEDDING(?, 'DOCUMENT', '{model}'))
+    FROM DUMMY
+"""
+
+ACTIVE_MODEL_SQL = "SELECT ACTIVE_MODEL FROM CHATBOT_FAQ_EMBEDDING_STATE WHERE ID = 1"
+
+# Optional pre-filter: rows of one category plus the shared (uncategorized) ones.
+# The column is optional (migrations/001_faq_schema.sql, section 5): without it
+# queries and inserts leave it out and lookups ignore the category.
+CATEGORY_FILTER = "AND (CATEGORY = ? OR CATEGORY IS NULL)"
+CATEGORY_PROBE_SQL = "SELECT CATEGORY FROM CHATBOT_FAQ_QUESTIONS WHERE 1 = 0"
+# A failed probe is repeated after this long, so adding the column needs no restart
+CATEGORY_PROBE_RETRY_SECONDS = 600
+
+# Exact top-k: every candidate row is scored inside HANA, answers are joined in
+# the same round trip. The query vector is a bind parameter so the statement
+# plan can be reused. Rows embedded with another model are never compared.
+EXACT_TOP_K_SQL = """
+    SELECT Q.AID, Q.QUESTION, Q.SCORE, A.ANSWER
+    FROM (
+        SELECT
+            AID,
+            QUESTION,
+            COSINE_SIMILARITY(QUESTION_VECTOR, TO_REAL_VECTOR(?)) AS SCORE
+        FROM CHATBOT_FAQ_QUESTIONS
+        WHERE STATUS = 'ACTIVE'
+          AND QUESTION_VECTOR IS NOT NULL
+          AND EMBEDDING_MODEL = ?
+          {category_filter}
+    ) Q
+    INNER JOIN CHATBOT_FAQ_ANSWERS A
+        ON A.AID = Q.AID
+    WHERE A.ANSWER IS NOT NULL
+    ORDER BY Q.SCORE DESC
+    LIMIT {k}
+"""
+
+# Approximate top-k: ORDER BY the similarity itself with TOP lets HANA serve
+# the inner query from an HNSW vector index (migrations/001_faq_schema.sql, section 6).
+ANN_TOP_K_SQL = """
+    SELECT Q.AID, Q.QUESTION, Q.SCORE, A.ANSWER
+    FROM (
+        SELECT TOP {k}
+            AID,
+            QUESTION,
+            COSINE_SIMILARITY(QUESTION_VECTOR, TO_REAL_VECTOR(?)) AS SCORE
+        FROM CHATBOT_FAQ_QUESTIONS
+        WHERE STATUS = 'ACTIVE'
+          AND QUESTION_VECTOR IS NOT NULL
+          AND EMBEDDING_MODEL = ?
+          {category_filter}
+        ORDER BY COSINE_SIMILARITY(QUESTION_VECTOR, TO_REAL_VECTOR(?)) DESC
+    ) Q
+    INNER JOIN CHATBOT_FAQ_ANSWERS A
+        ON A.AID = Q.AID
+    WHERE A.ANSWER IS NOT NULL
+    ORDER BY Q.SCORE DESC
+"""
+
+VECTOR_INDEX_SQL = """
+    SELECT COUNT(*) FROM SYS.VECTOR_INDEXES
+    WHERE SCHEMA_NAME = CURRENT_SCHEMA
+      AND TABLE_NAME = 'CHATBOT_FAQ_QUESTIONS'
+"""
+
+INDEX_ROWS_SQL = """
+    SELECT Q.AID, TO_NVARCHAR(Q.QUESTION_VECTOR), Q.QUESTION, A.ANSWER, {category}
+    FROM CHATBOT_FAQ_QUESTIONS Q
+    INNER JOIN CHATBOT_FAQ_ANSWERS A
+        ON A.AID = Q.AID
+    WHERE Q.STATUS = 'ACTIVE'
+      AND Q.QUESTION_VECTOR IS NOT NULL
+      AND Q.EMBEDDING_MODEL = ?
+      AND A.ANSWER IS NOT NULL
+"""
+
+
+class FaqSearchEngine:
+    """Vector search over the ACTIVE FAQ questions stored in HANA.
+
+    Query embeddings are cached by normalized text and model id, so a
+    repeated question never reaches the embedding model again.
+
+    In "local" mode the ACTIVE corpus is mirrored in a LocalFaqIndex and a
+    lookup with a cached embedding only reads the version counter from
+    HANA. In "hana" mode an HNSW vector index is used when one exists, with
+    the exact scan as fallback.
+
+    A search returns the top-k candidates, the best one if it passes the
+    threshold, and the margin between the first two scores: a small margin
+    means the question is ambiguous between two FAQs.
+
+    `result_cache` holds complete lookup results for exact repeats of a
+    question. Writes of this process empty it through `refresh`; writes of
+    other workers and instances are noticed by `sync`, which compares the
+    CHATBOT_FAQ_VERSION counter with the last version seen here.
+    """
+
+    def __init__(self, pool, threshold, normalize=str.strip,
+                 embedding_cache_size=EMBEDDING_CACHE_SIZE,
+                 mode=FAQ_SEARCH_MODE, change_feed=None):
+        self.pool = pool
+        # FaqChangeFeed whose counter tells when cached results may be stale
+        self.change_feed = change_feed
+        self.threshold = threshold
+        self.normalize = normalize
+        self.embedding_cache = LRUCache(embedding_cache_size)
+        self.result_cache = LRUCache(FAQ_RESULT_CACHE_SIZE, ttl=FAQ_RESULT_CACHE_TTL)
+        self.mode = mode
+
+        # Bumped on every invalidation; results computed before one are not cached
+        self.generation = 0
+        self._generation_lock = threading.Lock()
+        # AIDs appearing in cached results: a change to one of them invalidates the cache
+        self._cached_aids = set()
+
+        # Last CHATBOT_FAQ_VERSION whose changes are reflected here; None = unknown
+        self.version = None
+        self._version_checked_at = 0.0
+        self._sync_lock = threading.Lock()
+        self.invalidations = 0
+
+        self.model_id = EMBEDDING_MODEL_ID
+        self._model_checked_at = 0.0
+
+        # None = not checked yet; False until `_ann_retry_at` after a miss or failure
+        self._ann_available = None if FAQ_VECTOR_INDEX != "off" else False
+        self._ann_retry_at = float("inf") if FAQ_VECTOR_INDEX == "off" else 0.0
+        self.ann_queries = 0
+        self.exact_queries = 0
+
+        # None = not probed yet; False until `_category_retry_at` when the column is missing
+        self._has_category = None
+        self._category_retry_at = 0.0
+
+        self.index = None
+        self._index_loaded_at = 0.0
+        self._index_lock = threading.Lock()
+        if mode == "local":
+            from faq_index import LocalFaqIndex
+            self.index = LocalFaqIndex()
+
+    def check_model(self, cursor=None, force=False):
+        """Follows the active model in HANA, at most every FAQ_MODEL_CHECK_SECONDS."""
+        if not force and time.monotonic() - self._model_checked_at < FAQ_MODEL_CHECK_SECONDS:
+            return self.model_id
+        self._model_checked_at = time.monotonic()
+
+        try:
+            if cursor is None:
+                with self.pool.connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute(ACTIVE_MODEL_SQL)
+                    row = cursor.fetchone()
+                    cursor.close()
+            else:
+                cursor.execute(ACTIVE_MODEL_SQL)
+                row = cursor.fetchone()
+        except Exception as e:
+            log_event("faq_model_check_failed", level="warning", error=str(e))
+            return self.model_id
+
+        if row and row[0] and row[0] != self.model_id:
+            self.use_model(row[0])
+        return self.model_id
+
+    def use_model(self, model_id: str):
+        """Switches lookups to vectors of `model_id`; cached results of the old model are dropped."""
+        log_event("faq_model_switched", previous=self.model_id, model=model_id)
+        with self._generation_lock:
+            self.model_id = model_id
+            self._invalidate()
+        self._model_checked_at = time.monotonic()
+        if self.index is not None:
+            self.load_index()
+
+    def model_for_write(self, cursor) -> str:
+        """
+        Active model read under the state row lock. Writers call this inside their
+        transaction, so a model switch never interleaves with a write. Call it
+        before `FaqChangeFeed.bump`: every writer locks the state row first and
+        the version row second, so two writers never wait on each other in a cycle.
+        """
+        cursor.execute(ACTIVE_MODEL_SQL + " FOR UPDATE")
+        row = cursor.fetchone()
+        return row[0] if row and row[0] else self.model_id
+
+    def sync(self):
+        """Catches up with FAQ writes committed by any process since the last call.
+
+        Reads the version counter (at most every FAQ_VERSION_CHECK_SECONDS)
+        and, when it moved, the rows changed meanwhile. Cached results are
+        dropped if one of them is ACTIVE now or was part of a cached result;
+        changes to PENDING or DELETED questions nobody was served leave the
+        cache alone. The local index re-reads just the changed rows, and a
+        moved version also re-reads the active model, so a re-embedding
+        switch done by another worker is followed at once.
+        """
+        if self.change_feed is None:
+            return
+        if self.version is not None and time.monotonic() - self._version_checked_at < FAQ_VERSION_CHECK_SECONDS:
+            return
+
+        try:
+            version = self.change_feed.current_version()
+        except Exception as e:
+            # Without the counter nothing cached can be trusted
+            log_event("faq_version_check_failed", level="warning", error=str(e))
+            with self._sync_lock, self._generation_lock:
+                self.version = None
+                self._invalidate()
+            return
+
+        with self._sync_lock:
+            self._version_checked_at = time.monotonic()
+            if self.version is None:
+                # First read: nothing cached so far can be checked against it
+                self.version = version
+                with self._generation_lock:
+                    self._invalidate()
+                return
+            if version <= self.version:
+                return
+
+            changed = self.change_feed.changed_statuses(self.version, version)
+            self.version = version
+
+            with self._generation_lock:
+                if any(status == "ACTIVE" or aid in self._cached_aids for aid, status in changed):
+                    self._invalidate()
+            if self.index is not None and changed:
+                self._refresh_index([aid for aid, _ in changed])
+
+        # Outside _sync_lock: a new model reloads the index, which takes it
+        self.check_model(force=True)
+
+    def _invalidate(self):
+        # Caller holds _generation_lock
+        self.generation += 1
+        self.result_cache.clear()
+        self._cached_aids.clear()
+        self.invalidations += 1
+
+    def document_vector(self, text: str, model_id=None, cursor=None) -> str:
+        """Stored-side embedding of `text` as vector text, not cached."""
+        sql = DOCUMENT_EMBEDDING_SQL.format(model=model_id or self.model_id)
+        if cursor is not None:
+            cursor.execute(sql, (text,))
+            return cursor.fetchone()[0]
+
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, (text,))
+                return cursor.fetchone()[0]
+            finally:
+                cursor.close()
+
+    def _query_vector(self, search_text: str, cursor=None, model_id=None) -> str:
+        model_id = model_id or self.model_id
+        key = (self.normalize(search_text), model_id)
+        vector = self.embedding_cache.get(key)
+        if vector is not None:
+            return vector
+
+        sql = QUERY_EMBEDDING_SQL.format(model=model_id)
+        if cursor is None:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(sql, (search_text,))
+                vector = cursor.fetchone()[0]
+                cursor.close()
+        else:
+            cursor.execute(sql, (search_text,))
+            vector = cursor.fetchone()[0]
+
+        self.embedding_cache.put(key, vector)
+        return vector
+
+    def search(self, search_text: str, category=None, k=FAQ_TOP_K):
+        """
+        Returns {"best": match or None, "candidates": [...], "margin": float or None}.
+        Each candidate is {"aid", "question", "score", "answer"}, best first.
+        """
+        model_id = self.check_model()
+        k = max(k, 2)
+        candidates = self._candidates(search_text, category, k)
+        if not candidates and self.check_model(force=True) != model_id:
+            # Rows were switched to a new model before this process noticed
+            candidates = self._candidates(search_text, category, k)
+        return self._result(candidates)
+
+    def _candidates(self, search_text, category, k):
+        if self.index is not None:
+            return self._candidates_local(search_text, category, k)
+        return self._candidates_hana(search_text, category, k)
+
+    def _result(self, candidates):
+        margin = None
+        if len(candidates) >= 2:
+            margin = candidates[0]["score"] - candidates[1]["score"]
+        best = candidates[0] if candidates and candidates[0]["score"] >= self.threshold else None
+        return {"best": best, "candidates": candidates, "margin": margin}
+
+    def _use_ann(self, cursor):
+        if self._ann_available is None or (not self._ann_available and time.monotonic() >= self._ann_retry_at):
+            try:
+                cursor.execute(VECTOR_INDEX_SQL)
+                self._ann_available = cursor.fetchone()[0] > 0
+            except Exception as e:
+                log_event("faq_vector_index_check_failed", level="warning", error=str(e))
+                self._ann_available = False
+            if not self._ann_available:
+                self._ann_retry_at = time.monotonic() + FAQ_VECTOR_INDEX_RETRY_SECONDS
+        return self._ann_available
+
+    def has_category(self, cursor=None) -> bool:
+        """Whether CHATBOT_FAQ_QUESTIONS has the optional CATEGORY column."""
+        if self._has_category or (self._has_category is False and time.monotonic() < self._category_retry_at):
+            return self._has_category
+        try:
+            if cursor is None:
+                with self.pool.connection() as conn:
+                    cursor = conn.cursor()
+                    try:
+                        cursor.execute(CATEGORY_PROBE_SQL)
+                        cursor.fetchall()
+                    finally:
+                        cursor.close()
+            else:
+                cursor.execute(CATEGORY_PROBE_SQL)
+                cursor.fetchall()
+            self._has_category = True
+        except Exception as e:
+            log_event("faq_category_column_missing", level="warning", error=str(e))
+            self._has_category = False
+            self._category_retry_at = time.monotonic() + CATEGORY_PROBE_RETRY_SECONDS
+        return self._has_category
+
+    def _index_rows_sql(self, cursor):
+        return INDEX_ROWS_SQL.format(category="Q.CATEGORY" if self.has_category(cursor) else "NULL")
+
+    def _candidates_hana(self, search_text: str, category, k):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                if category and not self.has_category(cursor):
+                    category = None
+                category_filter = CATEGORY_FILTER if category else ""
+                model_id = self.model_id
+                vector = self._query_vector(search_text, cursor, model_id)
+                params = [vector, model_id] + ([category] if category else [])
+
+                rows = None
+                if self._use_ann(cursor):
+                    try:
+                        cursor.execute(
+                            ANN_TOP_K_SQL.format(k=int(k), category_filter=category_filter),
+                            params + [vector],
+                        )
+                        rows = cursor.fetchall()
+                        self.ann_queries += 1
+                    except Exception as e:
+                        log_event("faq_vector_index_query_failed", level="warning", error=str(e))
+                        self._ann_available = False
+                        self._ann_retry_at = time.monotonic() + FAQ_VECTOR_INDEX_RETRY_SECONDS
+
+                if rows is None:
+                    cursor.execute(
+                        EXACT_TOP_K_SQL.format(k=int(k), category_filter=category_filter),
+                        params,
+                    )
+                    rows = cursor.fetchall()
+                    self.exact_queries += 1
+            finally:
+                cursor.close()
+
+        return [
+            {"aid": aid, "question": question, "score": float(score), "answer": answer}
+            for aid, question, score, answer in rows
+        ]
+
+    def _candidates_local(self, search_text: str, category, k):
+        from faq_index import parse_vector
+
+        if self._index_expired():
+            self.load_index(force=False)
+
+        vector = parse_vector(self._query_vector(search_text))
+        return [
+            {"aid": aid, "question": question, "score": score, "answer": answer}
+            for aid, question, answer, score in self.index.top_k(vector, k=k, category=category)
+        ]
+
+    def _index_expired(self):
+        return time.monotonic() - self._index_loaded_at > FAQ_INDEX_RELOAD_SECONDS
+
+    def load_index(self, force=True):
+        """(Re)loads every ACTIVE question into the local index."""
+        if self.index is None:
+            return
+        from faq_index import parse_vector
+
+        with self._index_lock:
+            # Another thread may have reloaded while we waited for the lock
+            if not force and not self._index_expired():
+                return
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                # Read before the rows: writes committed after it are replayed by `sync`
+                version = self.change_feed.current_version(cursor) if self.change_feed else None
+                cursor.execute(self._index_rows_sql(cursor), (self.model_id,))
+                rows = cursor.fetchall()
+                cursor.close()
+
+            self.index.load(
+                (aid, parse_vector(vector), question, answer, category)
+                for aid, vector, question, answer, category in rows
+            )
+            self._index_loaded_at = time.monotonic()
+            if version is not None:
+                with self._sync_lock:
+                    if self.version is None:
+                        self.version = version
+                        self._version_checked_at = time.monotonic()
+                        with self._generation_lock:
+                            self._invalidate()
+            log_event("faq_index_loaded", questions=len(self.index))
+
+    def cache_result(self, key, result, generation):
+        """Stores a lookup result unless the cache was invalidated meanwhile."""
+        with self._generation_lock:
+            if generation == self.generation:
+                self.result_cache.put(key, result)
+                self._cached_aids.update(c["aid"] for c in result.get("candidates", []))
+
+    def refresh(self, aid):
+        """Invalidates cached results after an admin write and updates the local index."""
+        self.refresh_many([aid])
+
+    def refresh_many(self, aids):
+        """Same as `refresh` for many AIDs, with one index query per batch."""
+        with self._generation_lock:
+            self._invalidate()
+        if self.index is not None:
+            self._refresh_index(aids)
+
+    def _refresh_index(self, aids, batch_size=500):
+        """Re-reads `aids` into the local index; rows no longer ACTIVE are removed."""
+        from faq_index import parse_vector
+
+        aids = list(aids)
+        for start in range(0, len(aids), batch_size):
+            batch = aids[start:start + batch_size]
+            placeholders = ", ".join("?" for _ in batch)
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    self._index_rows_sql(cursor) + f" AND Q.AID IN ({placeholders})",
+                    [self.model_id, *batch],
+                )
+                rows = cursor.fetchall()
+                cursor.close()
+
+            found = set()
+            for aid, vector, question, answer, category in rows:
+                self.index.upsert(aid, parse_vector(vector), question, answer, category)
+                found.add(aid)
+            for aid in batch:
+                if aid not in found:
+                    self.index.remove(aid)
+
+    def stats(self):
+        stats = {
+            "mode": self.mode,
+            "model": self.model_id,
+            "result_cache": self.result_cache.stats(),
+            "version": self.version,
+            "invalidations": self.invalidations,
+            "embedding_cache": self.embedding_cache.stats(),
+        }
+        if self.index is not None:
+            stats["local_index_size"] = len(self.index)
+        else:
+            stats["vector_index"] = self._ann_available
+            stats["ann_queries"] = self.ann_queries
+            stats["exact_queries"] = self.exact_queries
+        return stats
@@ -0,0 +1,64 @@
+# gunicorn settings for Cloud Foundry:
+#   gunicorn -c gunicorn.conf.py btpaiagent:app
+import os, multiprocessing
+
+
+def _memory_limit_mb():
+    # Cloud Foundry exposes the container limit as e.g. MEMORY_LIMIT=768m
+    value = os.getenv("MEMORY_LIMIT", "768m").strip().lower()
+    if value.endswith("g"):
+        return int(float(value[:-1]) * 1024)
+    if value.endswith("m"):
+        return int(float(value[:-1]))
+    return int(value)
+
+
+# Memory reserved for the master process plus the preloaded, shared code
+BASE_MEMORY_MB = 160
+WORKER_MEMORY_MB = int(os.getenv("WEB_WORKER_MEMORY_MB", "180"))
+
+_by_cpu = multiprocessing.cpu_count() * 2 + 1
+_by_memory = max(1, (_memory_limit_mb() - BASE_MEMORY_MB) // WORKER_MEMORY_MB)
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_CONCURRENCY", min(_by_cpu, _by_memory)))
+# LLM, HANA and SMTP calls are I/O bound: threads keep one slow call from blocking the worker
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "8"))
+
+# Import the app once in the master and share the code with the workers; the LLM client
+# and agent graph are built per worker by the warm-up (see startup.py) or on first use
+preload_app = True
+
+# Agent turns with several tool calls can take a while; SSE responses stay open meanwhile
+timeout = int(os.getenv("WEB_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+# Longer than the router's idle timeout so it never reuses a connection we just closed
+keepalive = int(os.getenv("WEB_KEEPALIVE", "75"))
+
+# Recycle workers now and then to keep memory flat
+max_requests = 1000
+max_requests_jitter = 100
+
+accesslog = "-"
+errorlog = "-"
+
+# Workers of one instance share conversations through a local SQLite file;
+# set SESSION_BACKEND=hana to share them across instances as well
+if workers > 1:
+    os.environ.setdefault("SESSION_BACKEND", "sqlite")
+
+
+def post_fork(server, worker):
+    # Connections opened by the preloaded module belong to the master: SQLite and
+    # HANA handles must not be shared across fork, so each worker opens its own
+    import btpaiagent
+    btpaiagent.hana_pool.reset_after_fork()
+    btpaiagent.SESSION_STORE.reset_after_fork()
+    btpaiagent.translation_memo.reset_after_fork()
+    btpaiagent.start_background_workers()
+
+
+def worker_exit(server, worker):
+    import btpaiagent
+    btpaiagent.shutdown()
@@ -0,0 +1,225 @@
+import os, threading, time
+from contextlib import contextmanager
+
+
+HANA_POOL_MAX_SIZE = int(os.getenv("HANA_POOL_MAX_SIZE", "5"))
+# Seconds an idle connection may sit in the pool before it is closed
+HANA_POOL_IDLE_TIMEOUT = float(os.getenv("HANA_POOL_IDLE_TIMEOUT", "300"))
+# Seconds a request waits for a free connection when the pool is exhausted
+HANA_POOL_CHECKOUT_TIMEOUT = float(os.getenv("HANA_POOL_CHECKOUT_TIMEOUT", "10"))
+# Connections idle for longer than this are pinged before they are handed out
+HANA_POOL_VALIDATE_AFTER = float(os.getenv("HANA_POOL_VALIDATE_AFTER", "5"))
+
+HEALTH_CHECK_SQL = "SELECT 1 FROM DUMMY"
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+def ping(conn):
+    """Runs the HANA health check query and returns its single value."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(HEALTH_CHECK_SQL)
+        row = cursor.fetchone()
+        return row[0] if row else None
+    finally:
+        cursor.close()
+
+
+class HanaConnectionPool:
+    """Bounded pool of HANA connections.
+
+    Connections are created lazily by `connect`, validated with
+    `SELECT 1 FROM DUMMY` on checkout and closed after sitting idle
+    for `idle_timeout` seconds.
+    """
+
+    def __init__(self, connect, max_size=HANA_POOL_MAX_SIZE,
+                 idle_timeout=HANA_POOL_IDLE_TIMEOUT,
+                 checkout_timeout=HANA_POOL_CHECKOUT_TIMEOUT,
+                 validate_after=HANA_POOL_VALIDATE_AFTER):
+        self._connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.validate_after = validate_after
+
+        self._idle = []          # [(conn, released_at)], most recent last
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._counters = {
+            "created": 0,
+            "reused": 0,
+            "discarded": 0,
+            "evicted": 0,
+            "waits": 0,
+            "timeouts": 0,
+        }
+
+    def _evict_idle(self, now):
+        # Caller holds the lock. Oldest connections sit at the front.
+        expired = []
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            expired.append(self._idle.pop(0)[0])
+        self._counters["evicted"] += len(expired)
+        return expired
+
+    def _is_healthy(self, conn, idle_for):
+        try:
+            if hasattr(conn, "isconnected") and not conn.isconnected():
+                return False
+            if idle_for >= self.validate_after:
+                ping(conn)
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        deadline = time.monotonic() + self.checkout_timeout
+
+        while True:
+            conn = None
+            released_at = None
+            create = False
+
+            with self._cond:
+                now = time.monotonic()
+                expired = self._evict_idle(now)
+
+                while not self._idle and self._in_use >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters["timeouts"] += 1
+                        _close_quietly(expired)
+                        raise PoolExhausted(
+                            f"No HANA connection available after {self.checkout_timeout}s"
+                        )
+                    self._counters["waits"] += 1
+                    self._cond.wait(remaining)
+
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                else:
+                    create = True
+                self._in_use += 1
+
+            _close_quietly(expired)
+
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._release_slot()
+                    raise
+                with self._cond:
+                    self._counters["created"] += 1
+                return conn
+
+            if self._is_healthy(conn, time.monotonic() - released_at):
+                with self._cond:
+                    self._counters["reused"] += 1
+                return conn
+
+            # Stale connection: drop it and try again with the freed slot
+            _close_quietly([conn])
+            with self._cond:
+                self._counters["discarded"] += 1
+            self._release_slot()
+
+    def release(self, conn, broken=False):
+        if broken:
+            _close_quietly([conn])
+            with self._cond:
+                self._counters["discarded"] += 1
+            self._release_slot()
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._in_use -= 1
+            self._cond.notify()
+
+    def _release_slot(self):
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Borrows a connection and returns it to the pool afterwards.
+
+        Uncommitted work is rolled back when the block raises; a
+        connection that cannot even roll back is discarded.
+        """
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    @contextmanager
+    def transaction(self):
+        """Borrows a connection with autocommit off and commits when the block succeeds."""
+        with self.connection() as conn:
+            conn.setautocommit(False)
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.setautocommit(True)
+
+    def warm(self, count):
+        """Opens up to `count` connections ahead of the first requests and parks them idle."""
+        conns = []
+        try:
+            for _ in range(min(count, self.max_size)):
+                conns.append(self.acquire())
+        finally:
+            for conn in conns:
+                self.release(conn)
+        return len(conns)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                **self._counters,
+            }
+
+    def reset_after_fork(self):
+        """Forgets connections inherited from the parent process without closing them.
+
+        Closing would tear down the TLS session the parent still owns; the
+        child simply opens its own connections on demand.
+        """
+        self._cond = threading.Condition()
+        self._idle = []
+        self._in_use = 0
+
+    def close_all(self):
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._idle = []
+        _close_quietly(idle)
+
+
+def _close_quietly(conns):
+    for conn in conns:
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,219 @@
+import os, re, sqlite3, threading
+from caches import LRUCache
+
+
+# Trigram rank profiles (most frequent first) built offline from FAQ-style
+# English, Spanish, German and French text. Words are padded with one space
+# on each side.
+LANGUAGE_PROFILES = {
+    "en": (
+        " th|the|he | an|nd |and| re| to|to |es | ? |er | in| is|is |"
+        " of| wh|of | fo|in |ion|ng |ld |our| yo|you|for|or |ent|nt |"
+        "ve |an | i | be|re |ing| wo|on |hat|at | do|as |ow |wor|pro|"
+        "est|tio| a |ur |en | co|ed |ts |ce |se | te|eve|ry |ues|le |"
+        " sh|oul|uld| st| cu|ive| ho| ca|ort|al | ne| or|ver|ple|lea|"
+        "tha|ere|tra|st | wi|ers|rs |ste|ou |que|ble|nin|sho|ew | li|"
+        "ist|com|any|ny |cur|ren| ex|ice|how|can| pa| po|por| su|it |"
+        " mo| ha| it|sti|ill|ll | pl|eas|ase| em|ail| fi|nce|app|mer|"
+        "mpl|day|ne | so|are|ust|sto|ome| ev| pr|ons|age| fr|ine|hou|"
+        "ess| me|ork|wha|sta|whe| wa|was|omp|mpa|pan|fou|oun| ch|res|"
+        " my|my |ord|ocu|men|do |end|ont|th |een| se|fin|tea|eam|am |"
+        "tel|lin|em |rt |rea|her| tr|ave| ap|rov|ke |emp|plo|loy|oye|"
+        "yee|ees|man|ay |wit|ith|cus|tom|ery|str|reg|egi| he|hel|elp|"
+        "lp |ati|ns |ge |cha|ain|low| de| bu|ten|int|nte|gra|rat|ate|"
+        "fro|rom|om | di| us| ar|enc| qu| av|ava|vai|ila|lab|abl|bet|"
+        "usi|sin|ss |ear|mes| we|we |new| no|tor|evi|ter|imp|doe|oes|"
+        " sa|tan|hen|und|nde|ded|who|ho |urr|rre|ecu|uti|fic|et |rd |"
+        "rta|tal|whi|hic|ich|ch |doc|cum|ume|nts| en|mon|has|inv|nvo|"
+        "voi|oic|pai|aid|id |ove|ina|nan|anc|ell|lli|ead|ind|vel|el |"
+        "exp|pen|lic|ppr|ova|val| ta|orm| on|one| la|rge|ani|orl|rld"
+    ).split("|"),
+    "es": (
+        " de|de | la|es |os |as |la |el | y | qu| re| co| ¿ | ? |do |"
+        " es|ar | el| se|ent| en|las|or |est|con|ra | un| po|nte| a |"
+        "cio|por| si|res|da |ist|aci|ado|na |str|ion| pr|ta |qui|al |"
+        "tra|ue |nci|un |ión|ón |en | so|nes|ma | cu|ndo| fu|ble|tes|"
+        " me| pa|pro|des| lo|los| nu|nta|fun|pre| di|act|sta|del|tos|"
+        "enc|ici|que|ció|dos|re |on |reg|one|nue|par|ara|qué|ué |cuá|"
+        "se |und| em|emp|rec|ctu|er |ont|ntr|men|nto| fa| ha| in|ema|"
+        "ia |una|ien|ro |egu|unt|sig|ica|uán|mpr|ién| ac| pu|pue|ort|"
+        "to |ido|ada| ve| al|for|orm|nde|rar| ap|rob|mpl|com|omp|gra|"
+        " cl|egi| su| ay|ayu|yud|uda|ona|tro| pe|sar|lic|ser|cia|gun|"
+        " tu|tu |ibl|le |uev|deb|ir |ejo| sa|ánd|esa|uié|én |ecu|vo |"
+        "tua|ual| có|cóm|ómo|mo |ued|ece| mi|mi | do|ume|ces| an|ant|"
+        " fi|fin|ura|igu|ida|fav|avo|vor|eo | eq|equ|uip|ipo|me |sto|"
+        " vi|aje|je |apr|dad|ple|lea|ead|lem|ani|ías| má|más|ás |cli|"
+        "lie| ca|min|ini|nis|rma|be |te |lla| cr|cre|pli|ren| us|gen|"
+        "bre|io |spo|pon|ier|tre|ues|mos|tad|sol|unc|rev|evi|vis|mej|"
+        "jor|ifi|fic|can|an |sap|ap |ndó|dó |sa |cto|tor|tiv|ivo|edo|"
+        "abl|cer|ras|rta|tal|doc|ocu|cum| ne|esi|env|via|iar|fac|tur|"
+        "pag|aga|gad| o |ven|ía |reo|po |ina|nan|anz|nza|zas|les|stá|"
+        "tá |nco|tic| ta|tar|ard|rda|oba|bac| ci|inc|man| ho|mpa| gr"
+    ).split("|"),
+    "de": (
+        "en |ich|ch |ie | ? | ic|ein| di| wi|die|er |ine|ung|ng | ei|"
+        "wie| me| be|cht|den|ste| de| we|as |che|nn | da| fü|für|ür |"
+        "ann|der|mei|nd |und| an|in |ne |sch| wa|das|nde|rt | ge| ka|"
+        " un|kan| zu|bes|ech|gen|he |nen|rec|ten| ha| is|ert|es |ht |"
+        "ist|st |te | mi|ber|em |wen| au| ni| re|age|chn|ell|ge |hr |"
+        "ier|lle|nge|nic|tel| ne| si| wo|abe|bei|eit|eld|eue|hab|mel|"
+        "neu|rei|ter|uch|ver| ko| ve| üb|ass|be |ben|de |dun|ege|end|"
+        "ere|ers|hen|hnu|lun|nun|rag|rla|sen|sie|sse|zu |übe| es| in|"
+        " ja| pa| st|ahr|an |ang|esc|est|et |ges|gun|igu|ind|jah|lde|"
+        "le |lie|ner|nie|ort|rbe|ric|tig|tun|uen|was|wer|wir|wo | bi|"
+        " er| fr| li| nä| ri| sc| vo|alt|am |ant|arb|aus|ebe|efe|ern|"
+        "esp|fer|geb|hal|hti|ief|im |ion|ir |ite|itt|kti|lic|men|mic|"
+        "nte|och|oll|pas|ran|rau|re |se |sta|tio|tra|um |wan|war|wei|"
+        " ar| br| bu| fi| fu| gi| he| im| ku| la| mu| od| pr| se| sy|"
+        " te| ur| än|ahl|al |and|ank|anm|art|ate|aub|auc|auf|bra|bt |"
+        "buc|chs|chu|dat|ehm|ehr|ei |eic|eis|elc|ene|enn|era|erb|erl|"
+        "ese|fen|fin|fra|fun|gel|gib|gt |her|hst|hte|ibt|ies|ini|ird|"
+        "ise|it |kos|kun|lan|lau|lch|ldu|leg|llu|lt |mit|mus|ndu|neh|"
+        "ngs|nkt|nme|näc|ode|on |ona|oni|ost|per|pre|pro|rd |rn |rst|"
+        "spr|ss |ssw|swo|sys|tem|uf |unk|url|uss|wel|wor|yst|zah|zur"
+    ).split("|"),
+    "fr": (
+        " ? | co|es | de|ent|nt |com|er |de |le |men| le| qu|omm|ne |"
+        " un|mme|on |our|ur | je| po|je | pa|que|re |est|ion|is |la |"
+        " l |pou|tio| la|ouv|uve| es| mo|les|st |te |un |and|et |res|"
+        "ue | et| me| no| à |il |ire| ce| en| fa|ati|eur|lle|pas|qui|"
+        " do| fo| tr|ce |nou|ure| ai| au| il| pr| re| su|air|au |cha|"
+        "des|ell|man|me |nde|ois|se |sse|une|us |ée | sa|act|ai |ais|"
+        "as |con|ien|ine|mon|nné|née|onn|pro|tte|ui |ux | an| d | ma|"
+        " vo|ain|eau|en |fac|ger|ir |mes|ns |ort|por|ser|tra|uel|uis|"
+        "ès | el| j | ne| ou| où| pu| se| si|ann|cor|doi|dre|el |eme|"
+        "ess|eux|fai|mma|nne|nte|ont|où |par|pui|rou|teu|tro|vea|ver|"
+        "ème|ées| ap| cl| du| m | n | ré| t |ail|app|aut|ci |cti|ctu|"
+        "der|du |ema|enc|end|ett|han|ier|ise|ler|nd |nge|ntr|oir|ong|"
+        "ons|ous|pe |rai|rs |rès|si |son|sur|tat|tre|tur|urs|voy|és |"
+        " a | ad| at| av| ba| dé| fi| he| in| li| or| pe| so| sy| té|"
+        " éq| ét|adr|aie|ale|ali|ang|ans|ant|ar |arc|arr|ass|ate|att|"
+        "ava|avo|bie|bli|cat|cet|cli|ct |don|ect|emp|fic|fon|gés|hai|"
+        "heu|ica|ifi|ina|ipe|isi|lic|lie|ma |mai|mar|mat|mbi|mot|nct|"
+        "ngé|obl|och|oi |omb|onc|ord|orr|ot |ou |pai|peu|ppl|prè|qua|"
+        "rav|ren|rni|roc|rre|rri|rt |rta|sai|sem|sta|stè|sys|tab|ter|"
+        "tes|tèm|tél|uan|ues|uip|ut |vai|ve |voi|vou|yst|élé|équ| ac"
+    ).split("|"),
+}
+
+# English has to win by at least this margin over the next language; anything
+# less clear is sent to translation
+LANGUAGE_MIN_CONFIDENCE = float(os.getenv("LANGUAGE_MIN_CONFIDENCE", "0.05"))
+LANGUAGE_MIN_TRIGRAMS = 6
+
+TRANSLATION_MEMO_PATH = os.getenv("TRANSLATION_MEMO_PATH", "translation_memo.sqlite3")
+TRANSLATION_MEMO_CACHE_SIZE = int(os.getenv("TRANSLATION_MEMO_CACHE_SIZE", "1024"))
+
+_TOKEN_RE = re.compile(r"[^\W\d_]+|[¿?¡!]")
+
+_RANKS = {
+    lang: {gram: rank for rank, gram in enumerate(profile)}
+    for lang, profile in LANGUAGE_PROFILES.items()
+}
+
+
+def trigrams(text: str):
+    for word in _TOKEN_RE.findall(text.lower()):
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            yield padded[i:i + 3]
+
+
+def detect_language(text: str):
+    """Returns `(language, confidence)` using character trigram profiles.
+
+    Each trigram found in a profile scores by its rank there (frequent
+    trigrams weigh more); confidence is the relative margin between the
+    two best languages, from 0.0 to 1.0.
+    """
+    grams = list(trigrams(text))
+    # Too little text ("SAP", "Y") to tell languages apart
+    if len(grams) < LANGUAGE_MIN_TRIGRAMS:
+        return "en", 0.0
+
+    scores = {}
+    for lang, ranks in _RANKS.items():
+        size = len(ranks)
+        scores[lang] = sum(
+            (size - ranks[g]) / size for g in grams if g in ranks
+        ) / len(grams)
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    best_lang, best = ranked[0]
+    second = ranked[1][1] if len(ranked) > 1 else 0.0
+    if best <= 0:
+        return "en", 0.0
+    return best_lang, round((best - second) / best, 4)
+
+
+def is_english(text: str) -> bool:
+    """True when English wins clearly, or the text is too short to tell ("SAP")."""
+    if sum(1 for _ in trigrams(text)) < LANGUAGE_MIN_TRIGRAMS:
+        return True
+    lang, confidence = detect_language(text)
+    return lang == "en" and confidence >= LANGUAGE_MIN_CONFIDENCE
+
+
+class TranslationMemo:
+    """Persistent source -> English translations, so the LLM sees each text once.
+
+    Entries live in a small SQLite file (TRANSLATION_MEMO_PATH) with an
+    in-memory LRU in front. The file is opened on first use, so importing
+    the app creates nothing on disk.
+    """
+
+    def __init__(self, path=TRANSLATION_MEMO_PATH, cache_size=TRANSLATION_MEMO_CACHE_SIZE):
+        self.path = path
+        self.cache = LRUCache(cache_size)
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _open(self):
+        db = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS TRANSLATIONS (
+                SOURCE TEXT PRIMARY KEY,
+                TRANSLATED TEXT NOT NULL
+            )
+        """)
+        db.commit()
+        return db
+
+    def _connection(self):
+        # Caller holds the lock
+        if self._db is None:
+            self._db = self._open()
+        return self._db
+
+    def reset_after_fork(self):
+        """Drops a connection inherited through fork; this process opens its own on first use."""
+        self._lock = threading.Lock()
+        self._db = None
+
+    def get(self, key: str):
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT TRANSLATED FROM TRANSLATIONS WHERE SOURCE = ?", (key,)
+            ).fetchone()
+        if row:
+            self.cache.put(key, row[0])
+            return row[0]
+        return None
+
+    def put(self, key: str, translated: str):
+        self.cache.put(key, translated)
+        with self._lock:
+            db = self._connection()
+            db.execute(
+                "INSERT OR REPLACE INTO TRANSLATIONS (SOURCE, TRANSLATED) VALUES (?, ?)",
+                (key, translated),
+            )
+            db.commit()
+
+    def stats(self):
+        return self.cache.stats()
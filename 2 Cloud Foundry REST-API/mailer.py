@@ -0,0 +1,123 @@
+import smtplib, ssl, threading, time
+
+
+# Sessions idle for longer than this are checked with NOOP before reuse
+SMTP_NOOP_AFTER = 30
+
+
+class SmtpSessionManager:
+    """Keeps one authenticated SMTP session open and reuses it for every send.
+
+    The session is (re)opened on demand, re-established once when the server
+    dropped it, and shared between threads behind a lock.
+    """
+
+    def __init__(self, host, port, user=None, password=None, starttls=True, timeout=30):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+        self._server = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+        self.metrics = {
+            "sent": 0,
+            "failed": 0,
+            "connects": 0,
+            "reconnects": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "last_ms": 0.0,
+        }
+
+    def _open(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        server.ehlo()
+        if self.starttls:
+            server.starttls(context=ssl.create_default_context())
+            server.ehlo()
+        if self.user:
+            server.login(self.user, self.password)
+        self.metrics["connects"] += 1
+        return server
+
+    def _session(self):
+        # Caller holds the lock
+        if self._server is not None and time.monotonic() - self._last_used > SMTP_NOOP_AFTER:
+            try:
+                status, _ = self._server.noop()
+                if status != 250:
+                    raise smtplib.SMTPServerDisconnected("NOOP failed")
+            except smtplib.SMTPException:
+                self._drop()
+        if self._server is None:
+            self._server = self._open()
+        return self._server
+
+    def _drop(self):
+        try:
+            self._server.close()
+        except Exception:
+            pass
+        self._server = None
+
+    def _send_locked(self, from_addr, to_addrs, message: str):
+        started = time.perf_counter()
+        try:
+            try:
+                self._session().sendmail(from_addr, to_addrs, message)
+            except smtplib.SMTPServerDisconnected:
+                self._drop()
+                self.metrics["reconnects"] += 1
+                self._session().sendmail(from_addr, to_addrs, message)
+        except Exception:
+            self.metrics["failed"] += 1
+            raise
+        finally:
+            self._last_used = time.monotonic()
+
+        elapsed = (time.perf_counter() - started) * 1000
+        self.metrics["sent"] += 1
+        self.metrics["total_ms"] += elapsed
+        self.metrics["last_ms"] = elapsed
+        self.metrics["max_ms"] = max(self.metrics["max_ms"], elapsed)
+
+    def send(self, from_addr, to_addrs, message: str):
+        with self._lock:
+            self._send_locked(from_addr, to_addrs, message)
+
+    def send_many(self, messages):
+        """Sends `(from_addr, to_addrs, message)` tuples back to back over one session.
+
+        Returns one entry per message: None when sent, otherwise the error.
+        """
+        results = []
+        with self._lock:
+            for from_addr, to_addrs, message in messages:
+                try:
+                    self._send_locked(from_addr, to_addrs, message)
+                    results.append(None)
+                except Exception as e:
+                    results.append(e)
+        return results
+
+    def close(self):
+        with self._lock:
+            if self._server is not None:
+                try:
+                    self._server.quit()
+                except Exception:
+                    pass
+                self._server = None
+
+    def stats(self):
+        with self._lock:
+            sent = self.metrics["sent"]
+            return {
+                **self.metrics,
+                "avg_ms": round(self.metrics["total_ms"] / sent, 2) if sent else 0.0,
+                "connected": self._server is not None,
+            }
@@ -0,0 +1,101 @@
+-- Tables and columns the app needs on top of the original FAQ schema
+-- (CHATBOT_FAQ_QUESTIONS, CHATBOT_FAQ_ANSWERS and CHATBOT_FAQ_AID_SEQ).
+--
+-- Run once per HANA Cloud schema, before deploying this version, e.g. in the
+-- SQL console of Database Explorer or with
+--   hdbsql -n <host>:443 -e -u <user> -I migrations/001_faq_schema.sql
+--
+-- Sections 1-4 are required: every FAQ write (answer, update, register,
+-- bulk import) locks CHATBOT_FAQ_EMBEDDING_STATE and bumps
+-- CHATBOT_FAQ_VERSION. Sections 5-7 are optional.
+
+
+-- 1. Change feed for /faq/changes and cache invalidation (faq_changes.py)
+CREATE TABLE CHATBOT_FAQ_VERSION (
+    ID INTEGER PRIMARY KEY,
+    VERSION BIGINT
+);
+INSERT INTO CHATBOT_FAQ_VERSION VALUES (1, 0);
+
+ALTER TABLE CHATBOT_FAQ_QUESTIONS ADD (CHANGE_VERSION BIGINT);
+CREATE INDEX CHATBOT_FAQ_QUESTIONS_CHANGE ON CHATBOT_FAQ_QUESTIONS (CHANGE_VERSION);
+
+
+-- 2. Embedding model of each vector and the re-embedding job (embedding_job.py).
+--    REAL_VECTOR without a dimension, so models may differ in size.
+ALTER TABLE CHATBOT_FAQ_QUESTIONS ADD (
+    EMBEDDING_MODEL NVARCHAR(100),
+    QUESTION_VECTOR_NEXT REAL_VECTOR,
+    EMBEDDING_MODEL_NEXT NVARCHAR(100)
+);
+UPDATE CHATBOT_FAQ_QUESTIONS SET EMBEDDING_MODEL = 'SAP_NEB.20240715'
+WHERE QUESTION_VECTOR IS NOT NULL;
+
+CREATE TABLE CHATBOT_FAQ_EMBEDDING_STATE (
+    ID INTEGER PRIMARY KEY,
+    ACTIVE_MODEL NVARCHAR(100),
+    TARGET_MODEL NVARCHAR(100),
+    STATUS NVARCHAR(20),
+    LAST_AID INTEGER,
+    PROCESSED INTEGER,
+    TOTAL INTEGER,
+    CLAIMED_BY NVARCHAR(64),
+    CLAIMED_AT TIMESTAMP,
+    STARTED_AT TIMESTAMP,
+    FINISHED_AT TIMESTAMP,
+    LAST_ERROR NVARCHAR(1000)
+);
+-- Must match the model of the existing vectors (FAQ_EMBEDDING_MODEL)
+INSERT INTO CHATBOT_FAQ_EMBEDDING_STATE (ID, ACTIVE_MODEL, STATUS)
+VALUES (1, 'SAP_NEB.20240715', 'IDLE');
+
+
+-- 3. Demand of PENDING questions and their folded wordings (faq_pending.py)
+ALTER TABLE CHATBOT_FAQ_QUESTIONS ADD (
+    HIT_COUNT INTEGER DEFAULT 1 NOT NULL,
+    LAST_ASKED_AT TIMESTAMP
+);
+UPDATE CHATBOT_FAQ_QUESTIONS SET LAST_ASKED_AT = CREATED_AT;
+
+CREATE TABLE CHATBOT_FAQ_QUESTION_HITS (
+    ID BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    AID INTEGER,
+    QUESTION NVARCHAR(5000),
+    CREATED_BY NVARCHAR(100),
+    CREATED_AT TIMESTAMP
+);
+CREATE INDEX CHATBOT_FAQ_QUESTION_HITS_AID ON CHATBOT_FAQ_QUESTION_HITS (AID, CREATED_AT);
+
+
+-- 4. Admin notification outbox (notifications.py)
+CREATE TABLE CHATBOT_NOTIFICATION_OUTBOX (
+    ID BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    QUESTION NVARCHAR(5000),
+    CREATED_BY NVARCHAR(100),
+    STATUS NVARCHAR(20),
+    ATTEMPTS INTEGER,
+    NEXT_ATTEMPT_AT TIMESTAMP,
+    CLAIMED_BY NVARCHAR(64),
+    CLAIMED_AT TIMESTAMP,
+    LAST_ERROR NVARCHAR(1000),
+    CREATED_AT TIMESTAMP
+);
+
+
+-- 5. Optional: FAQ categories for the category filter of /api/search and
+--    /joule/faq (faq_search.py). Without the column categories are ignored.
+ALTER TABLE CHATBOT_FAQ_QUESTIONS ADD (CATEGORY NVARCHAR(100));
+
+
+-- 6. Optional: HNSW index for approximate top-k (FAQ_VECTOR_INDEX=auto).
+--    Without it lookups use the exact scan.
+CREATE HNSW VECTOR INDEX CHATBOT_FAQ_QUESTIONS_HNSW
+ON CHATBOT_FAQ_QUESTIONS (QUESTION_VECTOR) SIMILARITY FUNCTION COSINE_SIMILARITY;
+
+
+-- 7. Optional: conversations shared by all instances (SESSION_BACKEND=hana)
+CREATE TABLE CHATBOT_SESSIONS (
+    CONVERSATION_ID NVARCHAR(128) PRIMARY KEY,
+    STATE BLOB,
+    UPDATED_AT TIMESTAMP
+);
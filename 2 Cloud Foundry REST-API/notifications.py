@@ -0,0 +1,172 @@
+import os, threading, time, uuid
+from telemetry import log_event
+
+
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "30"))
+# After a new entry arrives the worker waits this long so a burst becomes one digest
+OUTBOX_BATCH_WINDOW = float(os.getenv("OUTBOX_BATCH_WINDOW", "5"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "30"))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "3600"))
+# Claims older than this belong to a crashed worker and are released again
+OUTBOX_CLAIM_TIMEOUT = 600
+
+
+class NotificationOutbox:
+    """Durable queue of admin notifications, drained by a background worker.
+
+    `enqueue` runs on the caller's cursor so the entry commits together
+    with the question. The worker claims due entries, hands them to
+    `notify(entries)` as one batch and reschedules failures with
+    exponential backoff.
+
+    Schema: migrations/001_faq_schema.sql, section 4.
+    """
+
+    def __init__(self, pool, notify):
+        self.pool = pool
+        self.notify = notify
+        self.worker_id = uuid.uuid4().hex
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.sent = 0
+        self.failed = 0
+        self.batches = 0
+
+    def enqueue(self, cursor, question: str, created_by: str):
+        cursor.execute("""
+            INSERT INTO CHATBOT_NOTIFICATION_OUTBOX
+            (QUESTION, CREATED_BY, STATUS, ATTEMPTS, NEXT_ATTEMPT_AT, CREATED_AT)
+            VALUES (?, ?, 'PENDING', 0, CURRENT_UTCTIMESTAMP, CURRENT_UTCTIMESTAMP)
+        """, (question, created_by))
+
+    def wake(self):
+        """Signals the worker after the enqueuing transaction has committed."""
+        self._wake.set()
+
+    def _claim(self):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE CHATBOT_NOTIFICATION_OUTBOX
+                SET STATUS = 'PENDING', CLAIMED_BY = NULL
+                WHERE STATUS = 'SENDING'
+                  AND CLAIMED_AT < ADD_SECONDS(CURRENT_UTCTIMESTAMP, ?)
+            """, (-OUTBOX_CLAIM_TIMEOUT,))
+            cursor.execute(f"""
+                UPDATE CHATBOT_NOTIFICATION_OUTBOX
+                SET STATUS = 'SENDING', CLAIMED_BY = ?, CLAIMED_AT = CURRENT_UTCTIMESTAMP
+                WHERE ID IN (
+                    SELECT TOP {OUTBOX_BATCH_SIZE} ID
+                    FROM CHATBOT_NOTIFICATION_OUTBOX
+                    WHERE STATUS = 'PENDING'
+                      AND NEXT_ATTEMPT_AT <= CURRENT_UTCTIMESTAMP
+                    ORDER BY ID
+                )
+                  AND STATUS = 'PENDING'
+            """, (self.worker_id,))
+            cursor.execute("""
+                SELECT ID, QUESTION, CREATED_BY, ATTEMPTS
+                FROM CHATBOT_NOTIFICATION_OUTBOX
+                WHERE STATUS = 'SENDING'
+                  AND CLAIMED_BY = ?
+                ORDER BY ID
+            """, (self.worker_id,))
+            rows = cursor.fetchall()
+            conn.commit()
+            cursor.close()
+        return rows
+
+    def _mark_sent(self, ids):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "UPDATE CHATBOT_NOTIFICATION_OUTBOX SET STATUS = 'SENT', LAST_ERROR = NULL WHERE ID = ?",
+                [(i,) for i in ids],
+            )
+            conn.commit()
+            cursor.close()
+
+    def _mark_failed(self, rows, error: str):
+        retry, give_up = [], []
+        for row_id, _, _, attempts in rows:
+            attempts += 1
+            if attempts >= OUTBOX_MAX_ATTEMPTS:
+                give_up.append((attempts, error[:1000], row_id))
+            else:
+                delay = min(OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1), OUTBOX_BACKOFF_MAX)
+                retry.append((attempts, delay, error[:1000], row_id))
+
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            if retry:
+                cursor.executemany("""
+                    UPDATE CHATBOT_NOTIFICATION_OUTBOX
+                    SET STATUS = 'PENDING', CLAIMED_BY = NULL, ATTEMPTS = ?,
+                        NEXT_ATTEMPT_AT = ADD_SECONDS(CURRENT_UTCTIMESTAMP, ?),
+                        LAST_ERROR = ?
+                    WHERE ID = ?
+                """, retry)
+            if give_up:
+                cursor.executemany("""
+                    UPDATE CHATBOT_NOTIFICATION_OUTBOX
+                    SET STATUS = 'FAILED', ATTEMPTS = ?, LAST_ERROR = ?
+                    WHERE ID = ?
+                """, give_up)
+            conn.commit()
+            cursor.close()
+        return len(give_up)
+
+    def drain_once(self) -> int:
+        """Sends every due entry as one batch; returns the number of entries handled."""
+        rows = self._claim()
+        if not rows:
+            return 0
+
+        try:
+            self.notify([(question, created_by) for _, question, created_by, _ in rows])
+        except Exception as e:
+            log_event("admin_notification_failed", level="error", questions=len(rows), error=str(e))
+            self.failed += self._mark_failed(rows, str(e))
+            return len(rows)
+
+        self._mark_sent([row[0] for row in rows])
+        self.sent += len(rows)
+        self.batches += 1
+        log_event("admin_notification_sent", questions=len(rows))
+        return len(rows)
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self._wake.wait(OUTBOX_POLL_SECONDS):
+                self._wake.clear()
+                # Gather the rest of the burst into the same digest
+                self._stop.wait(OUTBOX_BATCH_WINDOW)
+            try:
+                while self.drain_once() >= OUTBOX_BATCH_SIZE:
+                    pass
+            except Exception as e:
+                log_event("outbox_drain_failed", level="error", error=str(e))
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="notification-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "worker_running": bool(self._thread and self._thread.is_alive()),
+            "sent": self.sent,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
@@ -0,0 +1,204 @@
+import os, json, sqlite3, threading, time, zlib
+from langchain_core.messages import messages_from_dict, messages_to_dict
+from caches import LRUCache
+
+
+# "memory" (per process), "sqlite" (local file) or "hana" (shared by all instances)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+# Conversations untouched for longer than this are dropped
+SESSION_MAX_AGE = float(os.getenv("SESSION_MAX_AGE", "3600"))
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "1000"))
+SESSION_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH", "sessions.sqlite3")
+# Expired rows are purged from durable backends every this many writes
+SESSION_PURGE_EVERY = 100
+
+
+def serialize_state(state) -> bytes:
+    payload = {
+        "messages": messages_to_dict(state.get("messages", [])),
+        "pending_question": state.get("pending_question"),
+        "last_user_question": state.get("last_user_question"),
+        "conversation_summary": state.get("conversation_summary"),
+    }
+    return zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+
+def deserialize_state(blob) -> dict:
+    payload = json.loads(zlib.decompress(blob).decode("utf-8"))
+    payload["messages"] = messages_from_dict(payload["messages"])
+    return payload
+
+
+class MemorySessionStore:
+    """Per-process store, bounded by count (LRU) and by age (TTL)."""
+
+    def __init__(self, max_count=SESSION_MAX_COUNT, max_age=SESSION_MAX_AGE):
+        self._cache = LRUCache(max_count, ttl=max_age)
+
+    def get(self, conversation_id):
+        return self._cache.get(conversation_id)
+
+    def put(self, conversation_id, state):
+        self._cache.put(conversation_id, state)
+
+    def stats(self):
+        return {"backend": "memory", **self._cache.stats()}
+
+    def reset_after_fork(self):
+        pass
+
+
+class _DurableSessionStore:
+    """Shared logic of the serialized backends: purge cadence and counters."""
+
+    backend = None
+
+    def __init__(self, max_age=SESSION_MAX_AGE):
+        self.max_age = max_age
+        self._writes = 0
+        self._counter_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, conversation_id):
+        blob = self._load(conversation_id)
+        with self._counter_lock:
+            if blob is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return deserialize_state(blob) if blob is not None else None
+
+    def put(self, conversation_id, state):
+        self._save(conversation_id, serialize_state(state))
+        with self._counter_lock:
+            self._writes += 1
+            purge = self._writes % SESSION_PURGE_EVERY == 0
+        if purge:
+            self._purge()
+
+    def stats(self):
+        return {"backend": self.backend, "max_age": self.max_age,
+                "hits": self.hits, "misses": self.misses, "writes": self._writes}
+
+    def reset_after_fork(self):
+        # A lock inherited through fork may have been held by a thread of the parent
+        self._counter_lock = threading.Lock()
+
+
+class SqliteSessionStore(_DurableSessionStore):
+    """Durable single-instance store; also the local stand-in for HANA."""
+
+    backend = "sqlite"
+
+    def __init__(self, path=SESSION_SQLITE_PATH, max_age=SESSION_MAX_AGE):
+        super().__init__(max_age)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = self._open()
+
+    def _open(self):
+        db = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        # WAL lets several gunicorn workers read and write the same file
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS CHATBOT_SESSIONS (
+                CONVERSATION_ID TEXT PRIMARY KEY,
+                STATE BLOB NOT NULL,
+                UPDATED_AT REAL NOT NULL
+            )
+        """)
+        db.commit()
+        return db
+
+    def reset_after_fork(self):
+        """Opens a connection of this process; one inherited through fork must not be used.
+
+        The parent's connection is abandoned, not closed: closing it here
+        could release file locks the parent still relies on.
+        """
+        super().reset_after_fork()
+        self._lock = threading.Lock()
+        self._db = self._open()
+
+    def _load(self, conversation_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT STATE FROM CHATBOT_SESSIONS WHERE CONVERSATION_ID = ? AND UPDATED_AT > ?",
+                (conversation_id, time.time() - self.max_age),
+            ).fetchone()
+        return row[0] if row else None
+
+    def _save(self, conversation_id, blob):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO CHATBOT_SESSIONS (CONVERSATION_ID, STATE, UPDATED_AT) VALUES (?, ?, ?)",
+                (conversation_id, blob, time.time()),
+            )
+            self._db.commit()
+
+    def _purge(self):
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM CHATBOT_SESSIONS WHERE UPDATED_AT <= ?",
+                (time.time() - self.max_age,),
+            )
+            self._db.commit()
+
+
+class HanaSessionStore(_DurableSessionStore):
+    """Store shared by every app instance.
+
+    Schema: migrations/001_faq_schema.sql, section 7.
+    """
+
+    backend = "hana"
+
+    def __init__(self, pool, max_age=SESSION_MAX_AGE):
+        super().__init__(max_age)
+        self.pool = pool
+
+    def _load(self, conversation_id):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT STATE
+                FROM CHATBOT_SESSIONS
+                WHERE CONVERSATION_ID = ?
+                  AND UPDATED_AT > ADD_SECONDS(CURRENT_UTCTIMESTAMP, ?)
+            """, (conversation_id, -self.max_age))
+            row = cursor.fetchone()
+            blob = None
+            if row:
+                blob = row[0].read() if hasattr(row[0], "read") else row[0]
+            cursor.close()
+        return bytes(blob) if blob is not None else None
+
+    def _save(self, conversation_id, blob):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPSERT CHATBOT_SESSIONS (CONVERSATION_ID, STATE, UPDATED_AT)
+                VALUES (?, ?, CURRENT_UTCTIMESTAMP)
+                WITH PRIMARY KEY
+            """, (conversation_id, blob))
+            conn.commit()
+            cursor.close()
+
+    def _purge(self):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                DELETE FROM CHATBOT_SESSIONS
+                WHERE UPDATED_AT <= ADD_SECONDS(CURRENT_UTCTIMESTAMP, ?)
+            """, (-self.max_age,))
+            conn.commit()
+            cursor.close()
+
+
+def create_session_store(backend=SESSION_BACKEND, pool=None):
+    if backend == "hana":
+        return HanaSessionStore(pool)
+    if backend == "sqlite":
+        return SqliteSessionStore()
+    return MemorySessionStore()
@@ -0,0 +1,116 @@
+import os, threading, time
+from telemetry import log_event
+
+
+# Run the warm-up steps in the background as soon as a worker starts
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+
+
+class Lazy:
+    """Builds a value on first use, exactly once, even when first uses race.
+
+    A failed build is not cached: the next caller tries again.
+    """
+
+    _UNSET = object()
+
+    def __init__(self, build, name):
+        self._build = build
+        self.name = name
+        self._value = self._UNSET
+        self._lock = threading.Lock()
+        self.seconds = None
+
+    def get(self):
+        value = self._value
+        if value is not self._UNSET:
+            return value
+        with self._lock:
+            if self._value is self._UNSET:
+                started = time.monotonic()
+                self._value = self._build()
+                self.seconds = time.monotonic() - started
+                log_event("lazy_init", resource=self.name, ms=round(self.seconds * 1000, 1))
+            return self._value
+
+    @property
+    def initialized(self):
+        return self._value is not self._UNSET
+
+
+class Startup:
+    """Liveness / readiness state of one worker and its optional warm-up.
+
+    Live as soon as the module is imported. Ready once the warm-up steps
+    have run (failures are reported but do not block: every step is
+    retried lazily on first use) and until shutdown begins.
+    """
+
+    def __init__(self, started_at):
+        self.started_at = started_at
+        self.imported_at = None
+        self.ready_at = None
+        self.warmup_seconds = None
+        self.draining = False
+        self.steps = {}
+        self._thread = None
+
+    def imported(self):
+        self.imported_at = time.monotonic()
+
+    @property
+    def import_seconds(self):
+        return self.imported_at - self.started_at if self.imported_at else None
+
+    @property
+    def ready(self):
+        return self.ready_at is not None and not self.draining
+
+    @property
+    def seconds_to_ready(self):
+        return self.ready_at - self.started_at if self.ready_at else None
+
+    def _mark_ready(self):
+        self.ready_at = time.monotonic()
+        log_event(
+            "startup_ready",
+            import_ms=round((self.import_seconds or 0) * 1000, 1),
+            warmup_ms=round(self.warmup_seconds * 1000, 1) if self.warmup_seconds is not None else None,
+            total_ms=round(self.seconds_to_ready * 1000, 1),
+            steps=self.steps,
+        )
+
+    def warm_up(self, steps):
+        started = time.monotonic()
+        for name, step in steps:
+            step_started = time.monotonic()
+            try:
+                step()
+                self.steps[name] = {"ok": True}
+            except Exception as e:
+                self.steps[name] = {"ok": False, "error": str(e)}
+                log_event("warmup_step_failed", level="warning", step=name, error=str(e))
+            self.steps[name]["ms"] = round((time.monotonic() - step_started) * 1000, 1)
+        self.warmup_seconds = time.monotonic() - started
+        self._mark_ready()
+
+    def begin(self, steps, warm=STARTUP_WARMUP):
+        """Marks the worker ready at once, or after running `steps` in a background thread."""
+        if not warm:
+            self._mark_ready()
+            return
+        self._thread = threading.Thread(target=self.warm_up, args=(steps,), name="warmup", daemon=True)
+        self._thread.start()
+
+    def drain(self):
+        self.draining = True
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "draining": self.draining,
+            "import_seconds": self.import_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "seconds_to_ready": self.seconds_to_ready,
+            "steps": self.steps,
+        }
@@ -0,0 +1,313 @@
+import contextvars, json, os, threading, time, uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+# One JSON line per finished request with its span breakdown
+TELEMETRY_LOG_REQUESTS = os.getenv("TELEMETRY_LOG_REQUESTS", "true").lower() == "true"
+# Log lines below this level are dropped: debug, info, warning, error
+TELEMETRY_LOG_LEVEL = os.getenv("TELEMETRY_LOG_LEVEL", "info").lower()
+# Individual spans slower than this are logged on their own line as well
+TELEMETRY_SLOW_SPAN_SECONDS = float(os.getenv("TELEMETRY_SLOW_SPAN_SECONDS", "2"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+LOG_LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+REQUEST_ID_HEADERS = ("X-Request-ID", "X-Vcap-Request-Id", "X-Correlation-ID")
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+
+class Histogram:
+    """Thread-safe Prometheus histogram keyed by a fixed tuple of label names."""
+
+    def __init__(self, name, help_text, labels, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}   # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *label_values):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += seconds
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+
+        for label_values, values in sorted(series.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}le="{bound:g}"}} {cumulative}')
+            cumulative += values[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{labels}le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels.rstrip(',')}}} {values[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{labels.rstrip(',')}}} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Current value read from a callback when /metrics is scraped."""
+
+    def __init__(self, name, help_text, read):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+
+    def render(self):
+        return [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {self.read()}",
+        ]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    return "".join(f'{name}="{_escape(value)}",' for name, value in zip(names, values))
+
+
+REQUEST_SECONDS = Histogram(
+    "btpaiagent_http_request_duration_seconds",
+    "Time from request start until the response body was fully sent.",
+    ("route", "method", "status"),
+)
+SPAN_SECONDS = Histogram(
+    "btpaiagent_span_duration_seconds",
+    "Time spent in one call to HANA, the LLM, a tool or SMTP.",
+    ("span", "detail"),
+)
+
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+METRICS = [
+    REQUEST_SECONDS,
+    SPAN_SECONDS,
+    Gauge("btpaiagent_http_requests_in_flight", "Requests currently being served.", lambda: _in_flight),
+]
+
+
+def register(metric):
+    METRICS.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    """Prometheus text exposition of this worker process."""
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+class Trace:
+    """Spans recorded while serving one request, summed per span name."""
+
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.started = time.monotonic()
+        self.spans = {}   # name -> [count, seconds]
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            entry = self.spans.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def summary(self):
+        with self._lock:
+            return {
+                name: {"count": count, "ms": round(seconds * 1000, 1)}
+                for name, (count, seconds) in sorted(self.spans.items(), key=lambda e: -e[1][1])
+            }
+
+
+def current_request_id():
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+def log_event(event: str, level="info", **fields):
+    """Writes one JSON log line tagged with the current request id."""
+    if LOG_LEVELS.get(level, 20) < LOG_LEVELS.get(TELEMETRY_LOG_LEVEL, 20):
+        return
+    record = {
+        "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "level": level,
+        "event": event,
+    }
+    request_id = current_request_id()
+    if request_id:
+        record["request_id"] = request_id
+    record.update(fields)
+    print(json.dumps(record, ensure_ascii=False, default=str), flush=True)
+
+
+@contextmanager
+def span(name: str, detail=""):
+    """Times a block into SPAN_SECONDS and the current request's trace."""
+    started = time.monotonic()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        seconds = time.monotonic() - started
+        SPAN_SECONDS.observe(seconds, name, detail)
+        trace = _current_trace.get()
+        key = f"{name}:{detail}" if detail else name
+        if trace is not None:
+            trace.add(key, seconds)
+        if seconds >= TELEMETRY_SLOW_SPAN_SECONDS or error:
+            log_event(
+                "span", level="error" if error else "warning",
+                span=key, ms=round(seconds * 1000, 1), error=error,
+            )
+
+
+def traced(name: str, detail=""):
+    """Decorator form of `span`."""
+    def decorate(fn):
+        def wrapper(*args, **kwargs):
+            with span(name, detail):
+                return fn(*args, **kwargs)
+        wrapper.__name__ = fn.__name__
+        wrapper.__doc__ = fn.__doc__
+        wrapper.__wrapped__ = fn
+        return wrapper
+    return decorate
+
+
+def _statement_kind(sql: str):
+    words = sql.split(None, 1)
+    kind = words[0].upper() if words else ""
+    return ("hana.embedding" if "VECTOR_EMBEDDING" in sql else "hana.sql"), kind
+
+
+class TracedCursor:
+    """DB-API cursor whose execute / executemany calls are timed as spans."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, *args, **kwargs):
+        with span(*_statement_kind(sql)):
+            return self._cursor.execute(sql, *args, **kwargs)
+
+    def executemany(self, sql, *args, **kwargs):
+        with span(*_statement_kind(sql)):
+            return self._cursor.executemany(sql, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TracedConnection:
+    """Connection wrapper handing out TracedCursors; everything else is delegated."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return TracedCursor(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def run_in_context(fn):
+    """Binds `fn` to the caller's context, so spans in worker threads join its request."""
+    context = contextvars.copy_context()
+
+    def call(*args, **kwargs):
+        return context.run(fn, *args, **kwargs)
+    return call
+
+
+def instrument_flask(app):
+    """Request ids, per-route latency histograms and one JSON log line per request.
+
+    The id comes from X-Request-ID (or the Cloud Foundry router's
+    X-Vcap-Request-Id) when present and is echoed back. Durations are
+    recorded when the response is closed, so streamed bodies (SSE, JSON
+    arrays) count until their last byte.
+    """
+    from flask import request
+
+    def record(trace, route, method, status):
+        global _in_flight
+        with _in_flight_lock:
+            _in_flight -= 1
+        seconds = time.monotonic() - trace.started
+        REQUEST_SECONDS.observe(seconds, route, method, str(status))
+        if TELEMETRY_LOG_REQUESTS:
+            log_event(
+                "request", level="error" if status >= 500 else "info",
+                route=route, method=method, status=status,
+                ms=round(seconds * 1000, 1), request_id=trace.request_id,
+                spans=trace.summary(),
+            )
+
+    def route_of():
+        return request.url_rule.rule if request.url_rule else "<unmatched>"
+
+    @app.before_request
+    def start_trace():
+        global _in_flight
+        request_id = next(
+            (request.headers[h] for h in REQUEST_ID_HEADERS if request.headers.get(h)),
+            None,
+        ) or uuid.uuid4().hex
+        request.environ["telemetry.trace"] = Trace(request_id[:64])
+        request.environ["telemetry.token"] = _current_trace.set(request.environ["telemetry.trace"])
+        with _in_flight_lock:
+            _in_flight += 1
+
+    @app.after_request
+    def finish_trace(response):
+        trace = request.environ.pop("telemetry.trace", None)
+        if trace is None:
+            return response
+        response.headers["X-Request-ID"] = trace.request_id
+        route, method, status = route_of(), request.method, response.status_code
+        response.call_on_close(lambda: record(trace, route, method, status))
+        return response
+
+    @app.teardown_request
+    def abandon_trace(error=None):
+        # Only left over when the request failed before producing a response
+        trace = request.environ.pop("telemetry.trace", None)
+        if trace is not None:
+            record(trace, route_of(), request.method, 500)
+        # gthread workers reuse the thread: later requests and background work must not inherit the id
+        token = request.environ.pop("telemetry.token", None)
+        if token is not None:
+            try:
+                _current_trace.reset(token)
+            except ValueError:
+                # Torn down in another context than the one the trace was set in
+                _current_trace.set(None)
+
+    return app
@@ -0,0 +1,167 @@
+"""
+Fixtures running the FAQ modules against benchmark.fake_hana, a SQLite
+stand-in for hdbcli. Every test gets its own database file.
+
+    cd "2 Cloud Foundry REST-API" && python -m pytest -q tests
+"""
+import os, re, sqlite3, sys, threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import fake_hana
+from faq_changes import FaqChangeFeed
+from faq_search import EMBEDDING_MODEL_ID, FaqSearchEngine
+from hana_pool import HanaConnectionPool
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "faq.sqlite")
+    fake_hana.configure(path)
+    fake_hana.create_schema(path)
+    fake_hana.set_sequence("CHATBOT_FAQ_AID_SEQ", 1000)
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "INSERT INTO CHATBOT_FAQ_EMBEDDING_STATE (ID, ACTIVE_MODEL, STATUS) VALUES (1, ?, 'IDLE')",
+        (EMBEDDING_MODEL_ID,),
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def sql(db):
+    """Runs one statement directly on the SQLite file; returns the fetched rows."""
+    def run(statement, params=()):
+        conn = sqlite3.connect(db, detect_types=sqlite3.PARSE_DECLTYPES)
+        try:
+            rows = conn.execute(statement, params).fetchall()
+            conn.commit()
+            return rows
+        finally:
+            conn.close()
+    return run
+
+
+@pytest.fixture
+def add_question(sql):
+    """Inserts a question (ACTIVE with an answer, or PENDING) with its vector."""
+    def add(aid, question, status="ACTIVE", answer=None, created_at=None, hits=1, created_by="TEST"):
+        vector = fake_hana.embed(question)
+        sql("""
+            INSERT INTO CHATBOT_FAQ_QUESTIONS
+            (AID, QUESTION, STATUS, CREATED_AT, CREATED_BY, CHANGE_VERSION,
+             QUESTION_VECTOR, EMBEDDING_MODEL, HIT_COUNT, LAST_ASKED_AT)
+            VALUES (?, ?, ?, COALESCE(?, STRFTIME('%Y-%m-%d %H:%M:%f', 'now')), ?, 0, ?, ?, ?, NULL)
+        """, (aid, question, status, created_at, created_by, vector, EMBEDDING_MODEL_ID, hits))
+        if status == "ACTIVE":
+            sql("INSERT INTO CHATBOT_FAQ_ANSWERS (AID, ANSWER) VALUES (?, ?)",
+                (aid, answer or f"Answer to {question}"))
+    return add
+
+
+@pytest.fixture
+def pool(db):
+    pool = HanaConnectionPool(fake_hana.connect)
+    yield pool
+    pool.close_all()
+
+
+@pytest.fixture
+def change_feed(pool):
+    return FaqChangeFeed(pool)
+
+
+@pytest.fixture
+def engine(pool, change_feed):
+    return FaqSearchEngine(pool, 0.8, normalize=lambda text: " ".join(text.lower().split()),
+                           mode="hana", change_feed=change_feed)
+
+
+QUESTION_WRITE = re.compile(r"(UPDATE|MERGE INTO|INSERT INTO|DELETE FROM) CHATBOT_FAQ_QUESTIONS\b")
+
+
+class StatementLog:
+    """(connection, sql) of every statement sent to the fake, plus BEGIN / COMMIT / ROLLBACK."""
+
+    def __init__(self):
+        self.recorded = []
+        self._lock = threading.Lock()
+
+    def add(self, conn, sql):
+        with self._lock:
+            self.recorded.append((id(conn), " ".join(sql.split())))
+
+    def transactions(self):
+        """The statements of each transaction (autocommit off until commit), in commit order."""
+        pending = {}
+        finished = []
+        for conn, sql in self.recorded:
+            if sql == "BEGIN":
+                pending[conn] = []
+            elif sql in ("COMMIT", "ROLLBACK"):
+                if pending.get(conn):
+                    finished.append(pending.pop(conn))
+            elif conn in pending:
+                pending[conn].append(sql)
+        return finished + [s for s in pending.values() if s]
+
+    def assert_lock_order(self):
+        """Every writer locks state row, version row and question rows in that order.
+
+        A transaction may skip the state or the version row, but it takes
+        one of them before writing a question row. Returns how many locked
+        both the state and the version row.
+        """
+        writers = 0
+        for statements in self.transactions():
+            state = [i for i, s in enumerate(statements)
+                     if "CHATBOT_FAQ_EMBEDDING_STATE" in s and s.endswith("FOR UPDATE")]
+            version = [i for i, s in enumerate(statements) if s.startswith("UPDATE CHATBOT_FAQ_VERSION")]
+            rows = [i for i, s in enumerate(statements) if QUESTION_WRITE.match(s)]
+            if state and version:
+                writers += 1
+                assert state[0] < version[0], statements
+            if rows:
+                assert state or version, statements
+                assert max(state[:1] + version[:1]) < rows[0], statements
+        return writers
+
+
+@pytest.fixture
+def statements(monkeypatch):
+    log = StatementLog()
+    execute, executemany = fake_hana.Cursor.execute, fake_hana.Cursor.executemany
+    setautocommit = fake_hana.Connection.setautocommit
+    commit, rollback = fake_hana.Connection.commit, fake_hana.Connection.rollback
+
+    def record_execute(self, sql, params=()):
+        log.add(self._conn, sql)
+        return execute(self, sql, params)
+
+    def record_executemany(self, sql, rows):
+        log.add(self._conn, sql)
+        return executemany(self, sql, rows)
+
+    def record_setautocommit(self, value):
+        if not value:
+            log.add(self, "BEGIN")
+        return setautocommit(self, value)
+
+    def record_commit(self):
+        log.add(self, "COMMIT")
+        return commit(self)
+
+    def record_rollback(self):
+        log.add(self, "ROLLBACK")
+        return rollback(self)
+
+    monkeypatch.setattr(fake_hana.Cursor, "execute", record_execute)
+    monkeypatch.setattr(fake_hana.Cursor, "executemany", record_executemany)
+    monkeypatch.setattr(fake_hana.Connection, "setautocommit", record_setautocommit)
+    monkeypatch.setattr(fake_hana.Connection, "commit", record_commit)
+    monkeypatch.setattr(fake_hana.Connection, "rollback", record_rollback)
+    return log
@@ -0,0 +1,191 @@
+import pytest
+
+import embedding_job
+import faq_search
+from benchmark import fake_hana
+from embedding_job import ReembeddingJob
+from faq_search import EMBEDDING_MODEL_ID, FaqSearchEngine
+
+TARGET = "NEXT_MODEL.2025"
+
+
+def is_spanish(text):
+    return text.startswith("¿")
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    monkeypatch.setattr(embedding_job, "REEMBED_BATCH_SIZE", 3)
+
+
+@pytest.fixture
+def job(pool, engine, change_feed, statements):
+    def translate_many(texts):
+        statements.add(None, "TRANSLATE")
+        return [f"EN {text}" for text in texts]
+    return ReembeddingJob(pool, engine, translate_many=translate_many, needs_translation=is_spanish,
+                          change_feed=change_feed)
+
+
+@pytest.fixture
+def other_worker(pool, change_feed):
+    """Another process: its own engine, which has not seen the switch yet."""
+    return FaqSearchEngine(pool, 0.8, normalize=lambda text: " ".join(text.lower().split()),
+                           mode="hana", change_feed=change_feed)
+
+
+@pytest.fixture
+def corpus(add_question):
+    for aid in range(1, 9):
+        add_question(aid, f"How do I fix problem {aid}")
+    add_question(9, "¿Cómo cambio mi contraseña?")
+    add_question(10, "Where is the cafeteria", status="PENDING")
+
+
+def run_to_end(job, limit=50):
+    for _ in range(limit):
+        if not job.run_batch():
+            return
+    raise AssertionError("re-embedding did not finish")
+
+
+def models(sql):
+    return dict(sql("SELECT AID, EMBEDDING_MODEL FROM CHATBOT_FAQ_QUESTIONS WHERE QUESTION_VECTOR IS NOT NULL"))
+
+
+def test_start_job_validates_and_refuses_a_second_run(job):
+    with pytest.raises(ValueError):
+        job.start_job("bad model'; --")
+    assert job.start_job(EMBEDDING_MODEL_ID) is False
+    assert job.start_job(TARGET) is True
+    assert job.start_job("OTHER_MODEL") is False
+    assert job.status()["total"] == 0
+
+
+def test_full_run_switches_every_vector_to_the_new_model(job, engine, corpus, sql):
+    assert job.start_job(TARGET)
+
+    run_to_end(job)
+
+    assert set(models(sql).values()) == {TARGET}
+    assert sql("SELECT COUNT(*) FROM CHATBOT_FAQ_QUESTIONS WHERE QUESTION_VECTOR_NEXT IS NOT NULL") == [(0,)]
+    assert sql("SELECT QUESTION_VECTOR FROM CHATBOT_FAQ_QUESTIONS WHERE AID = 9") == [
+        (fake_hana.embed("EN ¿Cómo cambio mi contraseña?"),),
+    ]
+    status = job.status()
+    assert (status["status"], status["active_model"], status["processed"]) == ("IDLE", TARGET, 10)
+    assert engine.model_id == TARGET
+
+
+def test_rows_written_during_the_main_pass_are_caught_up(job, corpus, add_question, sql):
+    assert job.start_job(TARGET)
+    assert job.run_batch()   # AIDs 1-3 done
+
+    # An edit re-embeds with the active model and clears the shadow columns
+    sql("UPDATE CHATBOT_FAQ_QUESTIONS SET QUESTION_VECTOR_NEXT = NULL, EMBEDDING_MODEL_NEXT = NULL WHERE AID = 2")
+    add_question(11, "¿Dónde está la impresora?")
+
+    run_to_end(job)
+
+    assert set(models(sql).values()) == {TARGET}
+    assert sql("SELECT QUESTION_VECTOR FROM CHATBOT_FAQ_QUESTIONS WHERE AID = 11") == [
+        (fake_hana.embed("EN ¿Dónde está la impresora?"),),
+    ]
+
+
+def test_switch_never_calls_the_llm_under_the_state_lock(job, corpus, add_question, statements, monkeypatch):
+    assert job.start_job(TARGET)
+    job._claim()
+    catch_up = job._catch_up
+
+    def catch_up_then_new_row(target):
+        done = catch_up(target)
+        # Needs translation and arrives after the unlocked catch-up
+        add_question(12, "¿Cómo pido un portátil?")
+        return done
+    monkeypatch.setattr(job, "_catch_up", catch_up_then_new_row)
+
+    assert job._switch(TARGET) is False
+
+    recorded = statements.recorded
+    locks = [i for i, (_, s) in enumerate(recorded)
+             if s.startswith("SELECT TARGET_MODEL, STATUS, CLAIMED_BY") and s.endswith("FOR UPDATE")]
+    assert locks
+    for lock in locks:
+        conn = recorded[lock][0]
+        end = next(i for i in range(lock, len(recorded)) if recorded[i] in ((conn, "COMMIT"), (conn, "ROLLBACK")))
+        assert (None, "TRANSLATE") not in recorded[lock:end]
+    assert job.status()["active_model"] == TARGET
+
+
+def test_switch_is_retried_when_an_untranslated_row_arrives_under_it(job, corpus, add_question, monkeypatch, sql):
+    assert job.start_job(TARGET)
+    job._claim()
+    job._catch_up(TARGET)
+
+    english = job._english
+
+    def english_then_new_row(rows):
+        result = english(rows)
+        add_question(13, "¿Quién aprueba mis gastos?")
+        monkeypatch.setattr(job, "_english", english)
+        return result
+    monkeypatch.setattr(job, "_english", english_then_new_row)
+
+    assert job._switch(TARGET) is True
+    assert job.status()["status"] == "RUNNING"
+
+    # The next rounds embed the new row without the lock, then switch
+    run_to_end(job)
+    assert job.status()["active_model"] == TARGET
+    assert models(sql)[13] == TARGET
+
+
+def test_writers_during_the_job_keep_the_lock_order(job, engine, change_feed, pool, corpus, statements):
+    assert job.start_job(TARGET)
+    job.run_batch()
+
+    with pool.transaction() as conn:
+        cursor = conn.cursor()
+        assert engine.model_for_write(cursor) == EMBEDDING_MODEL_ID
+        change_feed.bump(cursor)
+        cursor.close()
+    run_to_end(job)
+
+    # The writer above and the switch
+    assert statements.assert_lock_order() == 2
+    # Batches and the catch-up lock the state row before their MERGE, like every writer
+    batches = [t for t in statements.transactions()
+               if any(s.startswith("MERGE INTO CHATBOT_FAQ_QUESTIONS") for s in t)]
+    assert len(batches) >= 4
+    assert all(any(s.startswith("SELECT STATUS FROM CHATBOT_FAQ_EMBEDDING_STATE") for s in t) for t in batches)
+
+
+def test_other_worker_follows_the_switch_on_its_next_sync(job, other_worker, corpus, monkeypatch):
+    monkeypatch.setattr(faq_search, "FAQ_VERSION_CHECK_SECONDS", 0)
+    other_worker.sync()
+    assert other_worker.search("How do I fix problem 4")["best"]["aid"] == 4
+    assert job.start_job(TARGET)
+
+    run_to_end(job)
+
+    # Well within FAQ_MODEL_CHECK_SECONDS of its last check
+    assert other_worker.model_id == EMBEDDING_MODEL_ID
+    other_worker.sync()
+    assert other_worker.model_id == TARGET
+    assert other_worker.search("How do I fix problem 4")["best"]["aid"] == 4
+
+
+def test_search_without_candidates_rechecks_the_model(job, other_worker, corpus, monkeypatch):
+    monkeypatch.setattr(faq_search, "FAQ_VERSION_CHECK_SECONDS", 3600)
+    other_worker.sync()
+    other_worker.search("How do I fix problem 4")
+    assert job.start_job(TARGET)
+
+    run_to_end(job)
+
+    # The version check is not due yet, but the empty candidate list gives the switch away
+    other_worker.sync()
+    assert other_worker.model_id == EMBEDDING_MODEL_ID
+    assert other_worker.search("How do I fix problem 4")["best"]["aid"] == 4
+    assert other_worker.model_id == TARGET
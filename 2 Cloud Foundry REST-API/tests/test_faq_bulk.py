@@ -0,0 +1,172 @@
+import threading
+
+import pytest
+
+from benchmark import fake_hana
+from faq_bulk import BulkInputError, FaqBulkLoader, parse_bulk_rows
+from faq_pending import PendingQuestionQueue
+from faq_search import EMBEDDING_MODEL_ID
+
+
+def is_spanish(text):
+    return text.startswith("¿")
+
+
+@pytest.fixture
+def translated():
+    return []
+
+
+@pytest.fixture
+def written():
+    return []
+
+
+@pytest.fixture
+def loader(pool, engine, change_feed, translated, written):
+    def translate_many(texts):
+        translated.extend(texts)
+        return [f"EN {text}" for text in texts]
+    return FaqBulkLoader(
+        pool, engine.model_for_write, translate_many=translate_many, needs_translation=is_spanish,
+        change_feed=change_feed, on_written=written.extend, chunk_size=2,
+        has_category=engine.has_category,
+    )
+
+
+def rows(*records):
+    return [{"row": n, "data": record} for n, record in enumerate(records, start=1)]
+
+
+def test_parse_bulk_rows_reports_bad_lines():
+    parsed = parse_bulk_rows('{"question": "a"}\n\n[1]\nnot json\n', "jsonl")
+    assert parsed[0] == {"row": 1, "data": {"question": "a"}}
+    assert parsed[1]["error"] == "Each line must be a JSON object"
+    assert parsed[2]["error"].startswith("Invalid JSON")
+    assert parse_bulk_rows("question,answer\nq,a\n", "csv") == [{"row": 1, "data": {"question": "q", "answer": "a"}}]
+    with pytest.raises(BulkInputError):
+        parse_bulk_rows("", "jsonl")
+
+
+def test_import_activates_answered_rows_with_their_embedding(loader, translated, written, sql):
+    report = loader.import_rows(rows(
+        {"question": "How do I reset my password", "answer": "Use the portal.", "category": "IT"},
+        {"question": "Where is the cafeteria"},
+        {"answer": "No question"},
+        {"question": "¿Cómo pido vacaciones?", "answer": "En la app de permisos."},
+    ))
+
+    assert report["succeeded"] == 3 and report["failed"] == 1
+    assert [r.get("question_status") for r in report["results"]] == ["ACTIVE", "PENDING", None, "ACTIVE"]
+    assert report["results"][2]["error"] == "Missing question"
+    assert translated == ["¿Cómo pido vacaciones?"]
+
+    aids = {r["row"]: r["aid"] for r in report["results"] if "aid" in r}
+    assert sorted(written) == sorted(aids.values())
+    stored = dict((aid, (status, vector, model, category)) for aid, status, vector, model, category in sql(
+        "SELECT AID, STATUS, QUESTION_VECTOR, EMBEDDING_MODEL, CATEGORY FROM CHATBOT_FAQ_QUESTIONS"
+    ))
+    assert stored[aids[1]] == ("ACTIVE", fake_hana.embed("How do I reset my password"), EMBEDDING_MODEL_ID, "IT")
+    assert stored[aids[2]] == ("PENDING", None, None, None)
+    # Spanish questions are embedded in English, like the rest of the corpus
+    assert stored[aids[4]][1] == fake_hana.embed("EN ¿Cómo pido vacaciones?")
+    assert sql("SELECT COUNT(*) FROM CHATBOT_FAQ_ANSWERS") == [(2,)]
+
+
+def test_failed_chunk_is_rolled_back_alone(loader, change_feed, monkeypatch, sql):
+    bump = change_feed.bump
+    calls = []
+
+    def bump_failing_second_chunk(cursor):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("lost connection")
+        return bump(cursor)
+    monkeypatch.setattr(change_feed, "bump", bump_failing_second_chunk)
+
+    report = loader.import_rows(rows(*({"question": f"Question {n}", "answer": "A"} for n in range(1, 6))))
+
+    statuses = [r["status"] for r in report["results"]]
+    assert statuses == ["imported", "imported", "error", "error", "imported"]
+    assert report["results"][2]["error"] == "Chunk rolled back: lost connection"
+    assert sql("SELECT COUNT(*) FROM CHATBOT_FAQ_QUESTIONS") == [(3,)]
+    assert sql("SELECT COUNT(*) FROM CHATBOT_FAQ_ANSWERS") == [(3,)]
+
+
+def test_answer_rows_activate_pending_questions(loader, add_question, written, sql):
+    add_question(10, "Where is the cafeteria", status="PENDING")
+    add_question(11, "¿Dónde está el parking?", status="PENDING")
+
+    report = loader.answer_rows(rows(
+        {"aid": 10, "answer": "First draft"},
+        {"aid": 11, "answer": "Planta -1."},
+        {"aid": 10, "answer": "Ground floor, building B."},
+        {"aid": 99, "answer": "Nobody asked"},
+        {"aid": "x", "answer": "Bad aid"},
+    ))
+
+    assert [r["status"] for r in report["results"]] == ["skipped", "answered", "answered", "error", "error"]
+    assert report["results"][0]["error"] == "Superseded by row 3"
+    assert report["results"][3]["error"] == "Question not found"
+    assert sql("SELECT AID, ANSWER FROM CHATBOT_FAQ_ANSWERS ORDER BY AID") == [
+        (10, "Ground floor, building B."), (11, "Planta -1."),
+    ]
+    assert sql("SELECT AID, STATUS, QUESTION_VECTOR FROM CHATBOT_FAQ_QUESTIONS ORDER BY AID") == [
+        (10, "ACTIVE", fake_hana.embed("Where is the cafeteria")),
+        (11, "ACTIVE", fake_hana.embed("EN ¿Dónde está el parking?")),
+    ]
+    assert sorted(set(written)) == [10, 11]
+
+
+def test_bulk_writes_lock_the_state_row_before_the_version_row(loader, add_question, statements):
+    add_question(10, "Where is the cafeteria", status="PENDING")
+
+    loader.import_rows(rows(*({"question": f"Question {n}", "answer": "A"} for n in range(1, 6))))
+    loader.answer_rows(rows({"aid": 10, "answer": "Ground floor."}))
+
+    # Three import chunks and one answer chunk
+    assert statements.assert_lock_order() == 4
+
+
+def test_concurrent_writers_all_commit_with_distinct_versions(
+        loader, pool, engine, change_feed, add_question, statements, sql):
+    for aid in range(10, 20):
+        add_question(aid, f"Pending question {aid}", status="PENDING")
+
+    class Outbox:
+        def enqueue(self, cursor, question, created_by):
+            pass
+
+        def wake(self):
+            pass
+    queue = PendingQuestionQueue(pool, engine, change_feed, Outbox(), english=lambda text: text)
+
+    errors = []
+    start = threading.Barrier(3)
+
+    def run(work):
+        try:
+            start.wait()
+            work()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [
+        threading.Thread(target=run, args=(lambda: loader.import_rows(
+            rows(*({"question": f"Imported {n}", "answer": "A"} for n in range(8)))),)),
+        threading.Thread(target=run, args=(lambda: loader.answer_rows(
+            rows(*({"aid": aid, "answer": "A"} for aid in range(10, 20)))),)),
+        threading.Thread(target=run, args=(lambda: [
+            queue.register(f"Brand new question number {n}", "USER") for n in range(6)],)),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    # 4 import chunks, 5 answer chunks, 6 registrations
+    assert sql("SELECT VERSION FROM CHATBOT_FAQ_VERSION") == [(15,)]
+    assert sql("SELECT COUNT(DISTINCT CHANGE_VERSION) FROM CHATBOT_FAQ_QUESTIONS WHERE CHANGE_VERSION > 0") == [(15,)]
+    assert sql("SELECT COUNT(*) FROM CHATBOT_FAQ_QUESTIONS WHERE STATUS = 'ACTIVE'") == [(18,)]
+    assert statements.assert_lock_order() == 15
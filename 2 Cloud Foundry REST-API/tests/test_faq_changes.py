@@ -0,0 +1,33 @@
+import threading
+
+import faq_changes
+from faq_changes import FaqChangeFeed
+
+
+def test_wait_returns_once_another_writer_bumps(pool, change_feed):
+    def write():
+        with pool.transaction() as conn:
+            cursor = conn.cursor()
+            change_feed.bump(cursor)
+            cursor.close()
+        change_feed.notify()
+    timer = threading.Timer(0.1, write)
+    timer.start()
+
+    assert change_feed.wait_for_change(0, 5) == (1, None)
+    timer.join()
+
+
+def test_poll_without_a_free_slot_is_told_to_back_off(pool, monkeypatch):
+    monkeypatch.setattr(faq_changes, "FAQ_CHANGES_MAX_WAITERS", 1)
+    feed = FaqChangeFeed(pool)
+    assert feed._waiters.acquire(blocking=False)
+
+    assert feed.wait_for_change(0, 5) == (0, faq_changes.FAQ_CHANGES_RETRY_AFTER)
+    assert feed.stats()["turned_away"] == 1
+    # A change is still handed out at once, with nothing to back off from
+    with pool.transaction() as conn:
+        cursor = conn.cursor()
+        feed.bump(cursor)
+        cursor.close()
+    assert feed.wait_for_change(0, 5) == (1, None)
@@ -0,0 +1,106 @@
+from datetime import datetime
+
+import pytest
+
+import faq_lists
+from faq_lists import (
+    ListQueryError, ORDER_BY_DEMAND, ORDER_NEWEST_FIRST, count_questions, decode_cursor,
+    encode_cursor, iter_questions, parse_fields, parse_limit,
+)
+
+
+def format_date(value):
+    return value.isoformat()
+
+
+def test_cursor_round_trip_keeps_timestamps():
+    values = [datetime(2024, 5, 1, 12, 30, 15, 250000), 42]
+    assert decode_cursor(encode_cursor(values), size=2) == values
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", encode_cursor([1])[:-2], "e30="])
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(ListQueryError):
+        decode_cursor(cursor, size=2)
+
+
+def test_decode_cursor_rejects_cursor_of_other_order():
+    with pytest.raises(ListQueryError):
+        decode_cursor(encode_cursor([3, "2024-01-01", 7]), size=2)
+
+
+def test_parse_fields_and_limit():
+    assert parse_fields(None) is None
+    assert parse_fields("aid, question") == ["aid", "question"]
+    with pytest.raises(ListQueryError):
+        parse_fields("aid,password")
+    assert parse_limit("") is None
+    assert parse_limit("25") == 25
+    for bad in ("0", "abc", "100000"):
+        with pytest.raises(ListQueryError):
+            parse_limit(bad)
+
+
+def pages(pool, status, order, limit, **options):
+    """Walks a list page by page; returns the pages of AIDs."""
+    result, after = [], None
+    while True:
+        page = {}
+        items = list(iter_questions(pool, status, order, format_date, fields=["aid"],
+                                    after=after, limit=limit, page=page, **options))
+        result.append([item["aid"] for item in items])
+        after = page.get("next")
+        if after is None:
+            return result
+
+
+def test_keyset_pages_cover_the_list_once_with_tied_timestamps(pool, add_question):
+    # Groups of three share a CREATED_AT: only the AID tie-breaker keeps the order total
+    for aid in range(1, 24):
+        add_question(aid, f"Pending question {aid}", status="PENDING",
+                     created_at=f"2024-01-{aid // 3 + 1:02d} 10:00:00.000")
+    add_question(99, "An answered one", status="ACTIVE")
+
+    walked = pages(pool, "PENDING", ORDER_NEWEST_FIRST, limit=5)
+
+    assert [len(page) for page in walked] == [5, 5, 5, 5, 3]
+    flat = [aid for page in walked for aid in page]
+    everything = [item["aid"] for item in iter_questions(pool, "PENDING", ORDER_NEWEST_FIRST, format_date)]
+    assert flat == everything
+    assert sorted(flat) == list(range(1, 24))
+    assert count_questions(pool, "PENDING") == 23
+
+
+def test_pagination_by_demand_and_text_filter(pool, add_question):
+    for aid in range(1, 11):
+        add_question(aid, f"{'Printer' if aid % 2 else 'Laptop'} issue {aid}", status="PENDING",
+                     hits=aid % 4, created_at=f"2024-02-{aid:02d} 08:00:00.000")
+
+    walked = pages(pool, "PENDING", ORDER_BY_DEMAND, limit=2, q="printer")
+
+    flat = [aid for page in walked for aid in page]
+    assert flat == [3, 7, 1, 5, 9]
+    assert count_questions(pool, "PENDING", q="printer") == 5
+
+
+def test_last_page_has_no_next_cursor(pool, add_question):
+    for aid in range(1, 5):
+        add_question(aid, f"Question {aid}", status="PENDING")
+    page = {}
+    items = list(iter_questions(pool, "PENDING", ORDER_NEWEST_FIRST, format_date, limit=4, page=page))
+    assert len(items) == 4
+    assert "next" not in page
+    assert set(items[0]) == {"aid", "question", "created_at", "created_by", "hits"}
+
+
+def test_stream_holds_no_connection_between_pages(pool, add_question, monkeypatch):
+    monkeypatch.setattr(faq_lists, "FETCH_BATCH_SIZE", 5)
+    for aid in range(1, 13):
+        add_question(aid, f"Question {aid}", status="PENDING", created_at=f"2024-03-{aid:02d} 09:00:00.000")
+
+    items = iter_questions(pool, "PENDING", ORDER_NEWEST_FIRST, format_date, fields=["aid"])
+    first = [next(items)["aid"] for _ in range(7)]
+    # A slow client is halfway through the second page: the pool has every connection back
+    assert pool.stats()["in_use"] == 0
+
+    assert first + [item["aid"] for item in items] == list(range(12, 0, -1))
@@ -0,0 +1,133 @@
+import threading
+
+import pytest
+
+from faq_pending import PendingQuestionQueue
+
+
+class RecordingOutbox:
+    def __init__(self):
+        self.enqueued = []
+        self.wakes = 0
+
+    def enqueue(self, cursor, question, created_by):
+        self.enqueued.append(question)
+
+    def wake(self):
+        self.wakes += 1
+
+
+@pytest.fixture
+def outbox():
+    return RecordingOutbox()
+
+
+@pytest.fixture
+def translations():
+    return []
+
+
+@pytest.fixture
+def queue(pool, engine, change_feed, outbox, translations):
+    def english(text):
+        translations.append(text)
+        return text
+    return PendingQuestionQueue(pool, engine, change_feed, outbox, english=english)
+
+
+def pending_rows(sql):
+    return sql("SELECT AID, HIT_COUNT FROM CHATBOT_FAQ_QUESTIONS WHERE STATUS = 'PENDING' ORDER BY AID")
+
+
+def test_near_duplicate_is_folded_into_the_pending_row(queue, outbox, sql):
+    first = queue.register("How do I order a new laptop", "ANA")
+    second = queue.register("How do I order a new laptop?", "LUIS")
+
+    assert first["duplicate"] is False
+    assert second == {"aid": first["aid"], "duplicate": True, "score": pytest.approx(1.0)}
+    assert pending_rows(sql) == [(first["aid"], 2)]
+    assert sql("SELECT QUESTION, CREATED_BY FROM CHATBOT_FAQ_QUESTION_HITS") == [
+        ("How do I order a new laptop?", "LUIS"),
+    ]
+    # Only the new question notifies the admin
+    assert outbox.enqueued == ["How do I order a new laptop"]
+    assert queue.stats()["folded"] == 1
+
+
+def test_different_question_gets_its_own_row(queue, outbox, sql):
+    queue.register("How do I order a new laptop", "ANA")
+    other = queue.register("Where can I see my payslip", "ANA")
+
+    assert other["duplicate"] is False
+    assert len(pending_rows(sql)) == 2
+    assert len(outbox.enqueued) == 2
+
+
+def test_english_of_the_caller_is_reused(queue, translations, sql):
+    first = queue.register("¿Cómo pido un portátil nuevo?", "ANA", english="How do I order a new laptop")
+    folded = queue.register("How do I order a new laptop", "LUIS")
+
+    assert translations == ["How do I order a new laptop"]
+    assert folded["aid"] == first["aid"]
+
+
+def test_burst_of_the_same_question_ends_up_as_one_row(queue, outbox, sql):
+    results = []
+    start = threading.Barrier(8)
+
+    def ask():
+        start.wait()
+        results.append(queue.register("Where is the cafeteria menu", "USER"))
+
+    threads = [threading.Thread(target=ask) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(r["duplicate"] for r in results) == [False] + [True] * 7
+    assert len({r["aid"] for r in results}) == 1
+    assert pending_rows(sql) == [(results[0]["aid"], 8)]
+    assert len(outbox.enqueued) == 1
+
+
+def test_question_answered_meanwhile_is_not_folded_into(queue, engine, monkeypatch, sql):
+    first = queue.register("How do I order a new laptop", "ANA")
+    nearest = queue._nearest
+
+    def nearest_then_answered(question, english):
+        found = nearest(question, english)
+        sql("UPDATE CHATBOT_FAQ_QUESTIONS SET STATUS = 'ACTIVE' WHERE AID = ?", (first["aid"],))
+        return found
+
+    monkeypatch.setattr(queue, "_nearest", nearest_then_answered)
+    second = queue.register("How do I order a new laptop", "LUIS")
+
+    assert second["duplicate"] is False
+    assert second["aid"] != first["aid"]
+    assert sql("SELECT HIT_COUNT FROM CHATBOT_FAQ_QUESTIONS WHERE AID = ?", (first["aid"],)) == [(1,)]
+
+
+def test_duplicate_check_runs_outside_the_state_lock(queue, statements):
+    queue.register("How do I order a new laptop", "ANA")
+    queue.register("How do I order a new laptop", "LUIS")
+
+    insert, fold = statements.transactions()
+    assert statements.assert_lock_order() == 1
+    # The fold only bumps the version: it never waits for the embedding state row
+    assert not any("CHATBOT_FAQ_EMBEDDING_STATE" in s for s in fold)
+    assert not any("VECTOR_EMBEDDING" in s for s in fold)
+    assert not any("VECTOR_EMBEDDING" in s for s in insert)
+
+
+def test_embedding_failure_still_registers_the_question(queue, outbox, monkeypatch, sql):
+    def broken(text):
+        raise RuntimeError("LLM down")
+    monkeypatch.setattr(queue, "english", broken)
+
+    result = queue.register("Necesito ayuda con SAP", "ANA")
+
+    assert result["duplicate"] is False
+    assert sql("SELECT QUESTION_VECTOR, EMBEDDING_MODEL FROM CHATBOT_FAQ_QUESTIONS WHERE AID = ?",
+               (result["aid"],)) == [(None, None)]
+    assert outbox.enqueued == ["Necesito ayuda con SAP"]
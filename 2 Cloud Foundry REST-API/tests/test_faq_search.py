@@ -0,0 +1,172 @@
+import pytest
+
+import btpaiagent
+import faq_search
+from faq_search import FaqSearchEngine
+
+
+def normalize(text):
+    return " ".join(text.lower().split())
+
+
+@pytest.fixture(autouse=True)
+def check_version_on_every_lookup(monkeypatch):
+    """Writes of other workers show up on the next lookup, not FAQ_VERSION_CHECK_SECONDS later."""
+    monkeypatch.setattr(faq_search, "FAQ_VERSION_CHECK_SECONDS", 0)
+
+
+@pytest.fixture
+def make_engine(pool, change_feed):
+    """A second worker: its own engine and caches over the same database."""
+    def make(mode="hana"):
+        return FaqSearchEngine(pool, 0.8, normalize=normalize, mode=mode, change_feed=change_feed)
+    return make
+
+
+@pytest.fixture
+def write(sql):
+    """Commits a change to one question the way another worker's writer does."""
+    def run(aid, status):
+        sql("UPDATE CHATBOT_FAQ_VERSION SET VERSION = VERSION + 1 WHERE ID = 1")
+        sql("""
+            UPDATE CHATBOT_FAQ_QUESTIONS
+            SET STATUS = ?, CHANGE_VERSION = (SELECT VERSION FROM CHATBOT_FAQ_VERSION WHERE ID = 1)
+            WHERE AID = ?
+        """, (status, aid))
+    return run
+
+
+@pytest.fixture
+def lookup(engine, pool, monkeypatch):
+    """btpaiagent.faq_lookup on the test database; returns (result, served from the result cache)."""
+    monkeypatch.setattr(btpaiagent, "hana_pool", pool)
+
+    def run(question, on=engine):
+        monkeypatch.setattr(btpaiagent, "faq_engine", on)
+        hits = on.result_cache.hits
+        result = btpaiagent.faq_lookup(question)
+        return result, on.result_cache.hits > hits
+    return run
+
+
+def best_aid(result):
+    return result["candidates"][0]["aid"] if result["found"] else None
+
+
+@pytest.fixture
+def corpus(add_question):
+    add_question(1, "How do I reset my SAP password", answer="Use the self-service portal.")
+    add_question(2, "How do I request vacation days", answer="Open the leave request app.")
+    add_question(3, "How do I order a new laptop", status="PENDING")
+
+
+def test_repeat_is_served_from_the_result_cache(lookup, engine, corpus):
+    first, cached = lookup("How do I reset my SAP password")
+    again, cached_again = lookup("how do i  reset my SAP password")
+
+    assert not cached and cached_again
+    assert again == first
+    assert again["answer"] == "Use the self-service portal."
+    assert engine.stats()["version"] == 0
+
+
+def test_cache_hit_within_the_staleness_bound_skips_hana(lookup, corpus, statements, monkeypatch):
+    monkeypatch.setattr(faq_search, "FAQ_VERSION_CHECK_SECONDS", 60)
+    lookup("How do I reset my SAP password")
+    del statements.recorded[:]
+
+    _, cached = lookup("How do I reset my SAP password")
+
+    assert cached
+    assert statements.recorded == []
+
+
+def test_answer_written_by_another_worker_invalidates(lookup, engine, corpus, write, sql):
+    result, _ = lookup("How do I order a new laptop")
+    assert not result["found"]
+
+    sql("INSERT INTO CHATBOT_FAQ_ANSWERS (AID, ANSWER) VALUES (3, 'Ask IT through the portal.')")
+    write(3, "ACTIVE")
+
+    result, cached = lookup("How do I order a new laptop")
+    assert not cached
+    assert best_aid(result) == 3
+    assert result["answer"] == "Ask IT through the portal."
+    assert engine.invalidations == 2   # first sync + the answer
+    assert engine.version == 1
+
+
+def test_pending_change_nobody_was_served_keeps_the_cache(lookup, engine, corpus, write, add_question):
+    lookup("How do I reset my SAP password")
+    add_question(4, "Where is the cafeteria menu", status="PENDING")
+    write(4, "PENDING")
+
+    _, cached = lookup("How do I reset my SAP password")
+    assert cached
+    assert engine.invalidations == 1
+    assert engine.version == 1
+
+
+def test_deleting_a_served_question_invalidates(lookup, corpus, write):
+    result, _ = lookup("How do I request vacation days")
+    assert best_aid(result) == 2
+
+    write(2, "DELETED")
+
+    result, cached = lookup("How do I request vacation days")
+    assert not cached
+    assert all(c["aid"] != 2 for c in result["candidates"])
+
+
+def test_result_computed_across_an_invalidation_is_not_cached(engine, corpus):
+    engine.sync()
+    generation = engine.generation
+    result = engine.search("How do I reset my SAP password")
+    engine.refresh(1)
+    engine.cache_result(("how do i reset my sap password", None), result, generation)
+
+    assert len(engine.result_cache) == 0
+
+
+def test_unreadable_version_drops_everything(lookup, engine, corpus, change_feed, monkeypatch):
+    lookup("How do I reset my SAP password")
+
+    def broken(cursor=None):
+        raise RuntimeError("HANA unavailable")
+    monkeypatch.setattr(change_feed, "current_version", broken)
+    engine.sync()
+
+    assert engine.version is None
+    assert len(engine.result_cache) == 0
+
+
+def test_local_index_follows_writes_of_other_workers(lookup, make_engine, corpus, write, sql):
+    local = make_engine(mode="local")
+    local.load_index()
+    assert local.stats()["local_index_size"] == 2
+
+    sql("INSERT INTO CHATBOT_FAQ_ANSWERS (AID, ANSWER) VALUES (3, 'Ask IT through the portal.')")
+    write(3, "ACTIVE")
+    write(1, "DELETED")
+
+    result, _ = lookup("How do I order a new laptop", on=local)
+    assert best_aid(result) == 3
+    assert local.stats()["local_index_size"] == 2
+    result, _ = lookup("How do I reset my SAP password", on=local)
+    assert all(c["aid"] != 1 for c in result["candidates"])
+
+
+def test_local_lookups_within_the_staleness_bound_issue_no_sql(make_engine, corpus, statements, monkeypatch):
+    monkeypatch.setattr(faq_search, "FAQ_VERSION_CHECK_SECONDS", 60)
+    local = make_engine(mode="local")
+    local.load_index()
+    # Computes the query embedding and reads the active model once
+    local.search("How do I reset my SAP password")
+    del statements.recorded[:]
+
+    for _ in range(3):
+        local.sync()
+        result = local.search("How do I reset my SAP password")
+
+    assert result["best"]["aid"] == 1
+    assert statements.recorded == []
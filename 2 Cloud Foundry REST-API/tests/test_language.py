@@ -0,0 +1,37 @@
+import pytest
+
+from language import TranslationMemo, detect_language, is_english
+
+
+@pytest.mark.parametrize("text", [
+    "How do I reset my SAP password",
+    "Where can I see the status of my purchase order?",
+    "What is SAP",
+    "SAP",
+])
+def test_english_and_very_short_text_stay_untranslated(text):
+    assert is_english(text)
+
+
+@pytest.mark.parametrize("text, lang", [
+    ("¿Cómo cambio mi contraseña?", "es"),
+    ("Wie erstelle ich eine Rechnung?", "de"),
+    ("Comment créer une facture?", "fr"),
+])
+def test_other_languages_are_recognized(text, lang):
+    assert detect_language(text)[0] == lang
+    assert not is_english(text)
+
+
+def test_short_text_without_a_clear_english_win_is_translated():
+    assert not is_english("es SAP gratis")
+
+
+def test_translation_memo_opens_its_file_on_first_use(tmp_path):
+    path = tmp_path / "memo.sqlite3"
+    memo = TranslationMemo(path=str(path))
+    assert not path.exists()
+
+    memo.put("hola", "hello")
+    assert path.exists()
+    assert TranslationMemo(path=str(path)).get("hola") == "hello"
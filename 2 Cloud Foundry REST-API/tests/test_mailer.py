@@ -0,0 +1,40 @@
+import pytest
+
+from benchmark.smtp_sink import SmtpSink
+from mailer import SmtpSessionManager
+
+
+@pytest.fixture
+def sink():
+    sink = SmtpSink().start()
+    yield sink
+    sink.stop()
+
+
+@pytest.fixture
+def sessions(sink):
+    manager = SmtpSessionManager(sink.host, sink.port, starttls=False, timeout=5)
+    yield manager
+    manager.close()
+
+
+def message(n):
+    return f"Subject: Digest {n}\r\n\r\nBody {n}\r\n"
+
+
+def test_send_many_pipelines_every_message_over_one_connection(sink, sessions):
+    results = sessions.send_many(
+        ("bot@example.com", [f"admin{n}@example.com"], message(n)) for n in range(5)
+    )
+
+    assert results == [None] * 5
+    assert sink.stats() == {"messages": 5, "sessions": 1}
+    assert [rcpt for _, rcpt, _ in sink.messages] == [[f"<admin{n}@example.com>"] for n in range(5)]
+    assert sessions.stats()["connects"] == 1
+
+
+def test_later_sends_reuse_the_session(sink, sessions):
+    sessions.send("bot@example.com", ["admin@example.com"], message(0))
+    sessions.send_many([("bot@example.com", ["admin@example.com"], message(n)) for n in (1, 2)])
+
+    assert sink.stats() == {"messages": 3, "sessions": 1}
@@ -0,0 +1,25 @@
+from flask import Flask
+
+from telemetry import current_request_id, instrument_flask
+
+
+def test_request_id_does_not_outlive_its_request():
+    app = instrument_flask(Flask(__name__))
+
+    @app.route("/id")
+    def request_id():
+        return current_request_id()
+
+    @app.route("/fail")
+    def fail():
+        raise RuntimeError("boom")
+
+    client = app.test_client()
+    response = client.get("/id", headers={"X-Request-ID": "abc123"})
+    assert response.get_data(as_text=True) == "abc123"
+    assert response.headers["X-Request-ID"] == "abc123"
+    # Same thread, next piece of work: no id left behind
+    assert current_request_id() is None
+
+    assert client.get("/fail", headers={"X-Request-ID": "def456"}).status_code == 500
+    assert current_request_id() is None
@@ -0,0 +1,183 @@
+import os, re, json, time, codecs, hashlib, threading, tempfile
+from html.parser import HTMLParser
+import requests
+from requests.adapters import HTTPAdapter
+
+
+FETCH_CACHE_DIR = os.getenv("FETCH_CACHE_DIR", os.path.join(tempfile.gettempdir(), "btpaiagent-fetch"))
+FETCH_CACHE_TTL = float(os.getenv("FETCH_CACHE_TTL", "3600"))
+FETCH_CACHE_MAX_FILES = int(os.getenv("FETCH_CACHE_MAX_FILES", "500"))
+# Downloads stop after this many bytes even if the text limit was not reached
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(2 * 1024 * 1024)))
+FETCH_CHUNK_SIZE = 16 * 1024
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36"
+    ),
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+SKIPPED_TAGS = {"script", "style", "noscript"}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class TextExtractor(HTMLParser):
+    """Incremental HTML-to-text extractor that reports when it has enough text."""
+
+    def __init__(self, max_chars: int):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self._parts = []
+        self._length = 0
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if self._skip_depth or self.done:
+            return
+        words = data.split()
+        if words:
+            chunk = " ".join(words)
+            self._parts.append(chunk)
+            self._length += len(chunk) + 1
+
+    @property
+    def done(self) -> bool:
+        return self._length >= self.max_chars
+
+    def text(self) -> str:
+        return _WHITESPACE_RE.sub(" ", " ".join(self._parts)).strip()[:self.max_chars]
+
+
+def _response_encoding(response) -> str:
+    # Without an explicit charset requests would assume ISO-8859-1 for text/html
+    if "charset=" in response.headers.get("Content-Type", "").lower() and response.encoding:
+        return response.encoding
+    return "utf-8"
+
+
+class PageFetcher:
+    """Fetches readable text from web pages with connection reuse and a disk cache.
+
+    Cached entries hold the extracted text plus ETag / Last-Modified; once
+    they expire the page is revalidated with a conditional request, so an
+    unchanged page costs a 304 instead of a download.
+    """
+
+    def __init__(self, cache_dir=FETCH_CACHE_DIR, ttl=FETCH_CACHE_TTL,
+                 max_bytes=FETCH_MAX_BYTES, timeout=15):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self.stats = {"cache_hits": 0, "revalidated": 0, "downloads": 0, "truncated": 0}
+
+    def _path(self, url: str, max_chars: int) -> str:
+        key = hashlib.sha256(f"{max_chars}:{url}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def _read_cache(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, path, entry):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        self._prune()
+
+    def _prune(self):
+        try:
+            files = [os.path.join(self.cache_dir, n) for n in os.listdir(self.cache_dir) if n.endswith(".json")]
+            if len(files) <= FETCH_CACHE_MAX_FILES:
+                return
+            files.sort(key=os.path.getmtime)
+            for path in files[:len(files) - FETCH_CACHE_MAX_FILES]:
+                os.remove(path)
+        except OSError:
+            pass
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def fetch_text(self, url: str, max_chars: int = 8000) -> str:
+        path = self._path(url, max_chars)
+        entry = self._read_cache(path)
+
+        if entry and time.time() - entry["fetched_at"] < self.ttl:
+            self._count("cache_hits")
+            return entry["text"]
+
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            if response.status_code == 304 and entry:
+                self._count("revalidated")
+                entry["fetched_at"] = time.time()
+                self._write_cache(path, entry)
+                return entry["text"]
+
+            response.raise_for_status()
+            text = self._extract(response, max_chars)
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+
+        self._count("downloads")
+        self._write_cache(path, {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time(),
+            "text": text,
+        })
+        return text
+
+    def _extract(self, response, max_chars: int) -> str:
+        """Parses the body as it streams in and stops once enough text was found."""
+        extractor = TextExtractor(max_chars)
+        decoder = codecs.getincrementaldecoder(_response_encoding(response))(errors="replace")
+        received = 0
+
+        for chunk in response.iter_content(FETCH_CHUNK_SIZE):
+            received += len(chunk)
+            extractor.feed(decoder.decode(chunk))
+            if extractor.done:
+                break
+            if received >= self.max_bytes:
+                self._count("truncated")
+                break
+        else:
+            extractor.feed(decoder.decode(b"", final=True))
+
+        extractor.close()
+        return extractor.text()
@@ -1,4 +1,4 @@
-import requests, urllib3
+import json, requests, urllib3
 import streamlit as st
 
 # This example uses unverified HTTPS rquests for simplicity. However, note that these are strongly discouraged.
@@ -23,26 +23,50 @@ def initial_setup():
 if "chat_history" not in st.session_state:
     initial_setup()
   
-# Process user input (add to the session, get response, add response to the session)
+# Read Server-Sent Events from the api as (event, data) pairs
+def read_events(response):
+    event, data = "message", []
+    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+# Stream the answer token by token; tool steps update the status box, the final result lands in `result`
+def stream_answer(user_input, status, result):
+    paylod = {'user_input': user_input, 'stream': True}
+    headers = {'Accept' : 'text/event-stream', 'Content-Type' : 'application/json'}
+    streamed = False
+    with requests.post(backend_api, json=paylod, headers=headers, verify=False, stream=True) as r:
+        for event, data in read_events(r):
+            if event == "token":
+                streamed = True
+                yield data["text"]
+            elif event == "step":
+                status.update(label=f"{data['tool']} {data['status']}...")
+            elif event == "done":
+                result.update(data)
+                # Answers that skip the LLM (e.g. FAQ hits) arrive only in the final event
+                if not streamed:
+                    yield data["btpaiagent_response"]
+            elif event == "error":
+                result["btpaiagent_response_log"] = data["error"]
+                yield "Sorry, something went wrong."
+    status.update(label="Done", state="complete")
+
+# Process user input (add to the session, the response is streamed below)
 def chat_actions():   
 
     # Add user input to session
     st.session_state["chat_history"].append({"role": "user", "content": st.session_state["chat_input"]})
     st.session_state["chat_history_debuglog"].append({"role": "user", "content": st.session_state["chat_input"]})
-
-    # Get answer from api
-    with st.spinner('Hold on...'):
-        user_input = st.session_state["chat_input"]
-        paylod = {'user_input': user_input}
-        headers = {'Accept' : 'application/json', 'Content-Type' : 'application/json'}
-        r = requests.post(backend_api, json=paylod, headers=headers, verify=False)
-        response = r.json()
-        faq_response = response['btpaiagent_response']
-        faq_response_log = response['btpaiagent_response_log']
-
-    # Add api response to the sessions
-    st.session_state["chat_history"].append({"role": "assistant", "content": faq_response})
-    st.session_state["chat_history_debuglog"].append({"role": "assistant", "content": faq_response_log})
+    st.session_state["pending_input"] = st.session_state["chat_input"]
 
 # Get input from user
 st.chat_input("Enter your message", on_submit=chat_actions, key="chat_input")
@@ -54,6 +78,20 @@ for i in st.session_state["chat_history"]:
     else:
         st.chat_message(name=i["role"], avatar="😃").write(i["content"])
 
+# Get answer from api, rendered while it streams in
+if st.session_state.get("pending_input"):
+    user_input = st.session_state.pop("pending_input")
+    result = {}
+    with st.chat_message(name="assistant", avatar="🤖"):
+        status = st.status('Hold on...')
+        streamed_response = st.write_stream(stream_answer(user_input, status, result))
+    faq_response = result.get('btpaiagent_response', streamed_response)
+    faq_response_log = result.get('btpaiagent_response_log', '')
+
+    # Add api response to the sessions
+    st.session_state["chat_history"].append({"role": "assistant", "content": faq_response})
+    st.session_state["chat_history_debuglog"].append({"role": "assistant", "content": faq_response_log})
+
 # Display the conversation'a more detailed log on the side panel
 for i in st.session_state["chat_history_debuglog"]:
     if i["role"] == 'assistant':
@@ -20,9 +20,16 @@ sap.ui.define([
             this._oDateRange = null;
             this._currentTab = "PENDING";
 
-            this._loadPending();
-            this._loadActive();
-            this._loadDeleted();
+            // Versión de los datos cargados; /faq/changes devuelve solo lo posterior
+            this._iVersion = null;
+            this._bPolling = false;
+            this._bStopped = false;
+
+            this._loadDashboard().then(() => this._pollChanges());
+        },
+
+        onExit: function () {
+            this._bStopped = true;
         },
 
         _getBackendUrl: function(sEndpoint) {
@@ -52,45 +59,137 @@ sap.ui.define([
             return null;
         },
 
-        _loadPending: async function () {
-            // USAMOS LA NUEVA FUNCIÓN
-            const sUrl = this._getBackendUrl("/faq/pending");
-            
+        _loadDashboard: async function () {
+            const sUrl = this._getBackendUrl("/faq/dashboard");
+
             try {
                 const r = await fetch(sUrl, {
                     headers: { "X-User-Role": "ADMIN" }
                 });
-                
+
                 if (!r.ok) throw new Error("Error en fetch");
-                
-                this.getView().getModel("pending").setData({ items: await r.json() });
+
+                const oData = await r.json();
+                this.getView().getModel("pending").setData({ items: oData.pending });
+                this.getView().getModel("active").setData({ items: oData.active });
+                this.getView().getModel("deleted").setData({ items: oData.deleted });
+                this._iVersion = oData.version;
             } catch (e) {
-                console.error("Error cargando pending:", e);
+                console.error("Error cargando dashboard:", e);
             }
         },
 
-        _loadActive: async function () {
-             const sUrl = this._getBackendUrl("/faq/active");
-             const r = await fetch(sUrl, { headers: { "X-User-Role": "ADMIN" } });
-             this.getView().getModel("active").setData({ items: await r.json() });
+        _fetchChanges: async function (iWait) {
+            if (this._iVersion === null) {
+                await this._loadDashboard();
+                if (this._iVersion === null) throw new Error("Dashboard no disponible");
+                return;
+            }
+
+            const sUrl = this._getBackendUrl("/faq/changes?since=" + this._iVersion + "&wait=" + iWait);
+            const r = await fetch(sUrl, { headers: { "X-User-Role": "ADMIN" } });
+            if (!r.ok) throw new Error("Error en fetch");
+
+            const oData = await r.json();
+            if (oData.reset) {
+                return this._loadDashboard();
+            }
+            if (oData.version < this._iVersion) {
+                // Respuesta adelantada por otra más reciente
+                return;
+            }
+            this._applyChanges(oData.changes);
+            this._iVersion = oData.version;
+            return oData;
+        },
+
+        _applyChanges: function (aChanges) {
+            if (!aChanges || !aChanges.length) {
+                return;
+            }
+
+            const mModels = {
+                PENDING: this.getView().getModel("pending"),
+                ACTIVE: this.getView().getModel("active"),
+                DELETED: this.getView().getModel("deleted")
+            };
+            const mItems = {};
+            Object.keys(mModels).forEach((sStatus) => {
+                mItems[sStatus] = mModels[sStatus].getProperty("/items") || [];
+            });
+
+            const mPrevious = {};
+            mItems.PENDING.forEach((oItem) => {
+                mPrevious[oItem.aid] = oItem;
+            });
+
+            aChanges.forEach((oChange) => {
+                Object.keys(mItems).forEach((sStatus) => {
+                    mItems[sStatus] = mItems[sStatus].filter((oItem) => oItem.aid !== oChange.aid);
+                });
+                if (mItems[oChange.status]) {
+                    const { status, ...oItem } = oChange;
+                    // El delta no trae las variantes: se conservan las ya cargadas
+                    const oPrevious = mPrevious[oChange.aid];
+                    mItems[oChange.status].push({ variants: [], ...(oPrevious || {}), ...oItem });
+                }
+            });
+
+            // Mismo orden que el backend: pendientes por demanda (y las más antiguas primero), el resto las más recientes
+            Object.keys(mModels).forEach((sStatus) => {
+                const iDir = sStatus === "PENDING" ? 1 : -1;
+                mItems[sStatus].sort((a, b) =>
+                    (sStatus === "PENDING" ? (b.hits || 1) - (a.hits || 1) : 0) ||
+                    iDir * ((new Date(a.created_at) - new Date(b.created_at)) || (a.aid - b.aid))
+                );
+                mModels[sStatus].setData({ items: mItems[sStatus] });
+            });
+
+            this._applyFilters();
+        },
+
+        _pollChanges: async function () {
+            if (this._bPolling) {
+                return;
+            }
+            this._bPolling = true;
+
+            const iWait = 25;
+            let iBackoff = 0;
+            while (!this._bStopped) {
+                const iStarted = Date.now();
+                let iPause = 0;
+                try {
+                    const oData = await this._fetchChanges(iWait);
+                    if (oData && oData.retry_after) {
+                        // El servidor no tiene hueco para otro long-poll
+                        iPause = oData.retry_after * 1000;
+                    } else if (oData && !oData.changes.length && Date.now() - iStarted < iWait * 500) {
+                        // Volvió sin cambios mucho antes de tiempo: se espera más en cada vuelta
+                        iBackoff = Math.min(iBackoff ? iBackoff * 2 : 1000, 30000);
+                        iPause = iBackoff;
+                    } else {
+                        iBackoff = 0;
+                    }
+                } catch (e) {
+                    console.error("Error consultando cambios:", e);
+                    iPause = 5000;
+                }
+                if (iPause) {
+                    await new Promise((resolve) => setTimeout(resolve, iPause));
+                }
+            }
+            this._bPolling = false;
         },
 
-        _loadDeleted: async function () {
-             const sUrl = this._getBackendUrl("/faq/deleted");
-             const r = await fetch(sUrl, { headers: { "X-User-Role": "ADMIN" } });
-             this.getView().getModel("deleted").setData({ items: await r.json() });
+        _refresh: function () {
+            // Trae los cambios propios sin esperar a la siguiente vuelta del long-poll
+            return this._fetchChanges(0).catch((e) => console.error("Error consultando cambios:", e));
         },
 
         onTabSelect: function (oEvent) {
             this._currentTab = oEvent.getParameter("key");
-
-            if (this._currentTab === "PENDING") {
-                this._loadPending();
-            } else if (this._currentTab === "ACTIVE") {
-                this._loadActive();
-            } else if (this._currentTab === "DELETED") {
-                this._loadDeleted();
-            }
+            this._applyFilters();
         },
 
         onSearch: function (oEvent) {
@@ -216,9 +315,7 @@ sap.ui.define([
                             body: JSON.stringify({ aid: oItem.aid })
                         }).then(() => {
                             MessageToast.show("Pregunta eliminada");
-                            this.onTabSelect({
-                                getParameter: () => this._currentTab || "PENDING"
-                            });
+                            this._refresh();
                         });
                     }
                 }
@@ -256,7 +353,7 @@ sap.ui.define([
 
                 MessageToast.show("Respuesta guardada");
                 this._oDialog.close();
-                this._loadPending();
+                this._refresh();
 
             } catch (error) {
                 console.error("Error saving answer:", error);
@@ -316,7 +413,7 @@ sap.ui.define([
 
                 MessageToast.show("Pregunta actualizada");
                 this._oEditDialog.close();
-                this._loadPending();
+                this._refresh();
 
             } catch (error) {
                 console.error("Error updating:", error);
@@ -353,8 +450,7 @@ sap.ui.define([
                             body: JSON.stringify({ aid: oItem.aid })
                         }).then(() => {
                             MessageToast.show("Pregunta restaurada");
-                            this._loadDeleted();
-                            this._loadPending(); // vuelve a pendientes
+                            this._refresh(); // vuelve a pendientes
                         });
                     }
                 }
@@ -373,6 +469,15 @@ sap.ui.define([
             }).format(oDate);
         },
 
+        formatVariants: function (aVariants) {
+            if (!aVariants || !aVariants.length) {
+                return "";
+            }
+
+            // Últimas formulaciones agrupadas en la pregunta, la más reciente primero
+            return aVariants.map((oVariant) => oVariant.question).join("\n");
+        },
+
         onCloseDialog: function () {
             if (this._oDialog) {
                 this._oDialog.setModel(null);